@@ -1,12 +1,37 @@
-from fastapi import FastAPI, HTTPException, Query, Depends
+from fastapi import FastAPI, HTTPException, Query, Depends, Request
 import json
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, NamedTuple
 import psycopg2
-from psycopg2 import pool, extras
+from psycopg2 import extras
 import os
-from datetime import datetime, timedelta
+import sys
+import re
+import time
+import asyncio
+import itertools
+import contextlib
+import contextvars
+import decimal
+import functools
+import io
+import csv
+import uuid
+import math
+import base64
+import hashlib
+import hmac
+import email.utils
+import tempfile
+import threading
+import select
+from collections import OrderedDict, deque
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time as dt_time, timedelta, timezone
 from dotenv import load_dotenv
 from openai import OpenAI
 
@@ -20,15 +45,97 @@ DB_USER = os.getenv("DB_USER", "drugsafety_admin")
 DB_PASS = os.getenv("DB_PASS", "sociallistner001")
 DB_PORT = os.getenv("DB_PORT", "5432")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o")
+# Offline development/testing: answer LLM calls with FakeOpenAIClient instead of the API
+OPENAI_FAKE = os.getenv("OPENAI_FAKE", "false").lower() in ("1", "true", "yes")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+class FakeOpenAIClient:
+    """
+    Minimal stand-in for openai.OpenAI that answers chat.completions.create locally.
+    Read/generic prompts get a fixed recent-mentions query, \\Process prompts echo the input ids.
+    Every call is recorded in .calls so tests can assert how often the LLM was hit.
+    """
+
+    DEFAULT_QUERY = (
+        "SELECT id, author, content, sentiment, received_at, keyword, url FROM kwatch_alert_results "
+        "WHERE author != 'AutoModerator' ORDER BY received_at DESC NULLS LAST LIMIT 50"
+    )
+
+    def __init__(self, responses: Optional[List[Dict]] = None):
+        self.calls = []
+        self._responses = list(responses or [])
+        self.chat = self
+        self.completions = self
+
+    def create(self, model: str, messages: List[Dict], **kwargs):
+        self.calls.append({"model": model, "messages": messages, **kwargs})
+        if self._responses:
+            payload = self._responses.pop(0)
+        else:
+            system, user = messages[0]["content"], messages[-1]["content"]
+            if '"result"' in system:
+                data = user[user.find("["):user.rfind("]") + 1] or "[]"
+                payload = {"result": [{"id": item.get("id")} for item in json.loads(data) if isinstance(item, dict)]}
+            elif '"type": "sql"' in system:
+                payload = {"type": "sql", "query": self.DEFAULT_QUERY, "explanation": "Most recent mentions (offline fake)."}
+            else:
+                payload = {"query": self.DEFAULT_QUERY, "explanation": "Most recent mentions (offline fake)."}
+        message = type("Message", (), {"content": json.dumps(payload)})()
+        choice = type("Choice", (), {"message": message})()
+        return type("Completion", (), {"choices": [choice]})()
+
+# Built on first use (see llm_client) so importing the module never depends on OpenAI settings
+client = None
+_client_lock = threading.Lock()
+
+def llm_client():
+    """The OpenAI (or fake) client, created on first use; None when no API key is configured."""
+    global client
+    if client is None:
+        with _client_lock:
+            if client is None:
+                if OPENAI_FAKE:
+                    client = FakeOpenAIClient()
+                elif OPENAI_API_KEY:
+                    client = OpenAI(api_key=OPENAI_API_KEY)
+    return client
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    """
+    Startup returns immediately: the pool is connected (and retried while the database is down),
+    migrated and handed to the rollup worker by a background thread. /api/ready reports when
+    that is done; /api/health only reports that the process is alive.
+    """
+    state = db_state
+    state.stop.clear()
+    startup = threading.Thread(target=_db_startup_loop, args=(state,), name="db-startup", daemon=True)
+    startup.start()
+    if DB_REPLICA_DSN:
+        threading.Thread(target=_replica_monitor_loop, name="replica-monitor", daemon=True).start()
+    async_task = asyncio.create_task(_start_async_engine()) if async_engine else None
+    try:
+        yield
+    finally:
+        state.stop.set()
+        # A connect attempt in flight finishes within DB_CONNECT_TIMEOUT; migrations may not, so don't wait on them
+        await asyncio.to_thread(startup.join, DB_CONNECT_TIMEOUT + 1)
+        if async_task:
+            async_task.cancel()
+        if async_engine:
+            await async_engine.close()
+        if db_pool:
+            db_pool.closeall()
+        if replica_pool:
+            replica_pool.closeall()
 
 app = FastAPI(
     title="Drug Experience Explorer API",
     description="Backend services for analyzing drug mentions and sentiment from social media and clinical sources.",
     version="1.1.0",
     docs_url="/api/docs",
-    openapi_url="/api/openapi.json"
+    openapi_url="/api/openapi.json",
+    lifespan=lifespan
 )
 
 # --- CORS ---
@@ -40,31 +147,752 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# --- Database ---
+# --- Metrics ---
+# In-process counters and histograms rendered in the Prometheus text format at /api/metrics.
+# Request timing comes from the middleware below, SQL timing from MetricsConnection's cursors,
+# LLM timing from call_llm and pool wait from BoundedConnectionPool.getconn.
+METRICS_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+METRICS_MAX_QUERIES = int(os.getenv("METRICS_MAX_QUERIES", "200"))  # distinct SQL fingerprints tracked
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))  # 0 disables the slow-query log
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "100"))
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class MetricsRegistry:
+    """Label-keyed counters and cumulative histograms; thread-safe, no external dependency."""
+
+    def __init__(self, buckets=METRICS_LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._help: Dict[str, tuple] = {}
+        self._counters: Dict[tuple, float] = {}
+        self._histograms: Dict[tuple, list] = {}  # key -> [bucket counts..., sum, count]
+
+    def describe(self, name: str, kind: str, text: str):
+        self._help[name] = (kind, text)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    h[i] += 1
+            h[-2] += value
+            h[-1] += 1
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    @staticmethod
+    def _labels(pairs) -> str:
+        if not pairs:
+            return ""
+        escaped = (f'{k}="{_escape_label(v)}"' for k, v in pairs)
+        return "{" + ",".join(escaped) + "}"
+
+    def render(self, gauges=()) -> str:
+        """Prometheus text exposition; gauges are (name, labels dict, value) computed at scrape time."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+        lines, seen = [], set()
+
+        def header(name):
+            if name not in seen and name in self._help:
+                seen.add(name)
+                kind, text = self._help[name]
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, pairs), value in sorted(counters.items()):
+            header(name)
+            lines.append(f"{name}{self._labels(pairs)} {value:g}")
+        for (name, pairs), h in sorted(histograms.items()):
+            header(name)
+            for bound, n in zip(self.buckets, h):
+                lines.append(f"{name}_bucket{self._labels(pairs + (('le', f'{bound:g}'),))} {n}")
+            lines.append(f"{name}_bucket{self._labels(pairs + (('le', '+Inf'),))} {h[-1]}")
+            lines.append(f"{name}_sum{self._labels(pairs)} {h[-2]:.6f}")
+            lines.append(f"{name}_count{self._labels(pairs)} {h[-1]}")
+        for name, labels, value in gauges:
+            header(name)
+            lines.append(f"{name}{self._labels(tuple(sorted(labels.items())))} {value:g}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+metrics.describe("kwatch_http_requests_total", "counter", "HTTP requests by route, method and status.")
+metrics.describe("kwatch_http_request_duration_seconds", "histogram", "Request latency by route (until the response starts).")
+metrics.describe("kwatch_request_phase_seconds", "histogram", "Per-request time spent in db, llm, pool_wait, serialize and other code.")
+metrics.describe("kwatch_db_query_duration_seconds", "histogram", "SQL execute + fetch time by statement fingerprint.")
+metrics.describe("kwatch_db_rows_total", "counter", "Rows fetched by statement fingerprint.")
+metrics.describe("kwatch_db_query_info", "gauge", "Normalized SQL for each statement fingerprint.")
+metrics.describe("kwatch_db_pool_wait_seconds", "histogram", "Time spent waiting for a pooled connection.")
+metrics.describe("kwatch_db_pool_connections", "gauge", "Connection pool gauges.")
+metrics.describe("kwatch_llm_request_duration_seconds", "histogram", "OpenAI chat completion latency.")
+metrics.describe("kwatch_slow_queries_total", "counter", "Statements slower than SLOW_QUERY_MS.")
+
+# Phase totals of the request being served; shared with threads via contextvars.copy_context
+_request_phases: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("request_phases", default=None)
+
+def record_phase(phase: str, seconds: float):
+    phases = _request_phases.get()
+    if phases is not None:
+        phases[phase] = phases.get(phase, 0.0) + seconds
+
+def submit_in_context(executor, fn, *args, **kwargs):
+    """executor.submit that keeps the caller's request context, so worker time is attributed to it."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_query_fingerprints: Dict[str, str] = {}
+_query_fingerprints_lock = threading.Lock()
+slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+def normalize_sql(query) -> str:
+    """Collapse whitespace and replace inline literals with ?, so LLM-generated variants group together."""
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    elif not isinstance(query, str):
+        query = str(query)  # psycopg2.sql.Composed
+    return _SQL_LITERALS.sub("?", " ".join(query.split()))
+
+def query_fingerprint(normalized: str) -> str:
+    fp = hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:12]
+    with _query_fingerprints_lock:
+        if fp in _query_fingerprints:
+            return fp
+        if len(_query_fingerprints) >= METRICS_MAX_QUERIES:
+            return "other"
+        _query_fingerprints[fp] = normalized[:500]
+    return fp
+
+def record_query(query, params, seconds: float, rows: int = 0):
+    normalized = normalize_sql(query)
+    fp = query_fingerprint(normalized)
+    metrics.observe("kwatch_db_query_duration_seconds", seconds, query=fp)
+    if rows:
+        metrics.inc("kwatch_db_rows_total", rows, query=fp)
+    record_phase("db", seconds)
+    if SLOW_QUERY_MS and seconds * 1000 >= SLOW_QUERY_MS:
+        metrics.inc("kwatch_slow_queries_total", query=fp)
+        entry = {
+            "at": datetime.now().isoformat(),
+            "ms": round(seconds * 1000, 1),
+            "query": fp,
+            "sql": normalized,
+            "params": repr(params)[:1000] if params is not None else None,
+        }
+        slow_queries.append(entry)
+        print(f"Slow query ({entry['ms']}ms) {entry['sql'][:300]} params={entry['params']}")
+
+class TimedCursorMixin:
+    """Times execute and fetches; rows are counted as they are fetched, which also covers named cursors."""
+
+    def execute(self, query, vars=None):
+        self._timed_query, self._timed_params = query, vars
+        t0 = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            # Client-side cursors have every row buffered once execute returns
+            rows = self.rowcount if self.name is None and self.description is not None and self.rowcount > 0 else 0
+            record_query(query, vars, time.perf_counter() - t0, rows)
+
+    def _timed_fetch(self, method, *args):
+        t0 = time.perf_counter()
+        result = method(*args)
+        if self.name is not None:
+            rows = len(result) if isinstance(result, list) else int(result is not None)
+            record_query(self._timed_query, self._timed_params, time.perf_counter() - t0, rows)
+        return result
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, *([] if size is None else [size]))
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+_timed_cursor_classes: Dict[type, type] = {}
+
+def timed_cursor_class(factory: type) -> type:
+    cls = _timed_cursor_classes.get(factory)
+    if cls is None:
+        cls = _timed_cursor_classes[factory] = type(f"Timed{factory.__name__}", (TimedCursorMixin, factory), {})
+    return cls
+
+class MetricsConnection(psycopg2.extensions.connection):
+    """Connection whose cursors, whatever cursor_factory callers pass, report to the metrics registry."""
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get("cursor_factory") or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs["cursor_factory"] = timed_cursor_class(factory)
+        return super().cursor(*args, **kwargs)
+
+class TimedJSONResponse(JSONResponse):
+    """Default response class; attributes JSON rendering to the 'serialize' phase."""
+
+    def render(self, content) -> bytes:
+        t0 = time.perf_counter()
+        try:
+            return super().render(content)
+        finally:
+            record_phase("serialize", time.perf_counter() - t0)
+
+app.router.default_response_class = TimedJSONResponse
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    phases: Dict[str, float] = {}
+    token = _request_phases.set(phases)
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - t0
+        _request_phases.reset(token)
+        # Route template rather than the raw path, so /api/mentions/{mention_id} stays one series
+        route = request.scope.get("route")
+        path = getattr(route, "path", None) or "unmatched"
+        metrics.inc("kwatch_http_requests_total", route=path, method=request.method, status=str(status))
+        metrics.observe("kwatch_http_request_duration_seconds", elapsed, route=path, method=request.method)
+        accounted = 0.0
+        for phase in ("db", "llm", "pool_wait", "serialize"):
+            seconds = phases.get(phase, 0.0)
+            accounted += seconds
+            metrics.observe("kwatch_request_phase_seconds", seconds, route=path, phase=phase)
+        # Parallel panels/batches can account more than wall time; 'other' never goes negative
+        metrics.observe("kwatch_request_phase_seconds", max(0.0, elapsed - accounted), route=path, phase="other")
+
+# --- Fast JSON Path ---
+# Hot endpoints return FastJSONResponse: rows are encoded straight from their Python values
+# (datetimes included) by orjson when installed, skipping jsonable_encoder's recursive walk and
+# response_model re-validation of rows we built ourselves. FAST_JSON=0 restores the default path.
+FAST_JSON = os.getenv("FAST_JSON", "1") == "1"
+
 try:
-    db_pool = psycopg2.pool.SimpleConnectionPool(
-        1, 10,
+    import orjson
+except ImportError:
+    orjson = None
+
+def _json_default(value):
+    if isinstance(value, decimal.Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps_json(content) -> bytes:
+        return orjson.dumps(content, default=_json_default, option=_ORJSON_OPTIONS)
+else:
+    def dumps_json(content) -> bytes:
+        return json.dumps(content, default=_json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(TimedJSONResponse):
+    def render(self, content) -> bytes:
+        t0 = time.perf_counter()
+        try:
+            return dumps_json(content)
+        finally:
+            record_phase("serialize", time.perf_counter() - t0)
+
+def fast_json(endpoint):
+    """
+    Return the endpoint's value as a FastJSONResponse. The undecorated function stays reachable
+    as __wrapped__ (FastAPI reads its signature from there) for callers that want the data, e.g. the dashboard.
+    """
+    if not FAST_JSON:
+        return endpoint
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        return FastJSONResponse(endpoint(*args, **kwargs))
+    return wrapper
+
+# --- Database ---
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))  # seconds a request may wait for a connection
+DB_POOL_VALIDATE_AFTER = float(os.getenv("DB_POOL_VALIDATE_AFTER", "30"))  # idle seconds before a ping on checkout
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+DB_ASYNC_ENABLED = os.getenv("DB_ASYNC_ENABLED", "false").lower() in ("1", "true", "yes")
+
+class PoolTimeout(Exception):
+    """Raised when no connection frees up within the acquire timeout."""
+
+class BoundedConnectionPool:
+    """
+    Thread-safe replacement for psycopg2's SimpleConnectionPool.
+    Waits at most acquire_timeout for a connection, pings connections that sat idle
+    longer than validate_after (stale sockets after an RDS failover) and rolls back or
+    discards connections returned mid-transaction.
+    """
+
+    def __init__(self, minconn: int, maxconn: int, acquire_timeout: float = DB_POOL_TIMEOUT,
+                 validate_after: float = DB_POOL_VALIDATE_AFTER, name: str = "primary", **dsn):
+        self.name = name  # metrics label
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.acquire_timeout = acquire_timeout
+        self.validate_after = validate_after
+        self._dsn = dsn
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, returned_at), most recently used on the right
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self.timeouts = 0
+        self.created = 0
+        self.discarded = 0
+        self.closed = False
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        conn = psycopg2.connect(connection_factory=MetricsConnection, **self._dsn)
+        self.created += 1
+        return conn
+
+    def _discard(self, conn):
+        self.discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_usable(self, conn, returned_at: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.validate_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def getconn(self, timeout: Optional[float] = None):
+        started = time.monotonic()
+        deadline = started + (self.acquire_timeout if timeout is None else timeout)
+        conn, returned_at = None, None
+        with self._cond:
+            if self.closed:
+                raise PoolTimeout("Connection pool is closed")
+            self._waiting += 1
+            try:
+                while True:
+                    if self._idle:
+                        conn, returned_at = self._idle.pop()
+                        break
+                    if self._size < self.maxconn:
+                        # Reserve the slot now, open the socket outside the lock
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(f"No database connection available within {self.acquire_timeout}s")
+                    self._cond.wait(remaining)
+                self._in_use += 1
+            finally:
+                self._waiting -= 1
+                waited = time.monotonic() - started
+                metrics.observe("kwatch_db_pool_wait_seconds", waited, pool=self.name)
+                record_phase("pool_wait", waited)
+
+        try:
+            if conn is not None and not self._is_usable(conn, returned_at):
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+            return conn
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def putconn(self, conn, close: bool = False):
+        if not close and not conn.closed:
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    close = True
+        with self._cond:
+            self._in_use -= 1
+            if close or conn.closed or self.closed:
+                self._size -= 1
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self.closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._size -= 1
+                self._discard(conn)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "min": self.minconn,
+                "max": self.maxconn,
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "timeouts": self.timeouts,
+                "created": self.created,
+                "discarded": self.discarded,
+            }
+
+DB_RETRY_INITIAL = float(os.getenv("DB_RETRY_INITIAL", "1"))  # seconds before the first reconnect attempt
+DB_RETRY_MAX = float(os.getenv("DB_RETRY_MAX", "30"))  # backoff ceiling
+
+def create_db_pool() -> BoundedConnectionPool:
+    return BoundedConnectionPool(
+        DB_POOL_MIN, DB_POOL_MAX,
         host=DB_HOST,
         database=DB_NAME,
         user=DB_USER,
         password=DB_PASS,
-        port=DB_PORT
+        port=DB_PORT,
+        connect_timeout=DB_CONNECT_TIMEOUT,
+        # Detect half-open sockets (e.g. after an RDS failover) instead of hanging on them
+        keepalives=1,
+        keepalives_idle=30,
+        keepalives_interval=10,
+        keepalives_count=3
     )
-    print("Database connection pool created.")
-except Exception as e:
-    print(f"Error creating connection pool: {e}")
-    db_pool = None
+
+class DatabaseState:
+    """Connection attempts and startup progress of the shared pool, as reported by /api/ready."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.attempts = 0
+        self.error: Optional[str] = None
+        self.next_attempt = 0.0
+        self.backoff = DB_RETRY_INITIAL
+        self.migrations = "pending"  # pending | running | done | failed | disabled
+
+db_pool: Optional[BoundedConnectionPool] = None
+db_state = DatabaseState()
+
+def ensure_db_pool() -> Optional[BoundedConnectionPool]:
+    """
+    Return the shared pool, creating it if it doesn't exist yet and the retry backoff allows.
+    Only one caller connects at a time; concurrent callers get None instead of queueing behind it.
+    """
+    global db_pool
+    if db_pool is not None:
+        return db_pool
+    state = db_state  # one object for acquire and release, even if the global is replaced meanwhile
+    if time.monotonic() < state.next_attempt or not state.lock.acquire(blocking=False):
+        return None
+    try:
+        if db_pool is None:
+            state.attempts += 1
+            try:
+                db_pool = create_db_pool()
+                state.error = None
+                state.backoff = DB_RETRY_INITIAL
+                print("Database connection pool created.")
+            except Exception as e:
+                state.error = str(e).strip()
+                state.next_attempt = time.monotonic() + state.backoff
+                print(f"Error creating connection pool (retrying in {state.backoff:.0f}s): {state.error}")
+                state.backoff = min(state.backoff * 2, DB_RETRY_MAX)
+        return db_pool
+    finally:
+        state.lock.release()
+
+def _db_startup_loop(state: DatabaseState):
+    """Background half of the lifespan: connect (with backoff), migrate, then start the rollup worker."""
+    while not state.stop.is_set():
+        if ensure_db_pool():
+            break
+        state.stop.wait(max(0.1, state.next_attempt - time.monotonic()))
+    if state.stop.is_set():
+        return
+
+    if DB_MIGRATE_ON_STARTUP:
+        state.migrations = "running"
+        state.migrations = "done" if init_db() else "failed"
+    else:
+        state.migrations = "disabled"
+    # Rollups read tables the migrations create, so they start afterwards
+    threading.Thread(target=_rollup_refresh_loop, name="rollup-refresh", daemon=True).start()
+
+@contextlib.contextmanager
+def pooled_connection():
+    """Check a connection out of db_pool for the duration of a with-block, mapping pool failures to HTTP errors."""
+    pool = ensure_db_pool()
+    if not pool:
+        raise HTTPException(status_code=503, detail="Database unavailable", headers={"Retry-After": "5"})
+    try:
+        conn = pool.getconn()
+    except PoolTimeout:
+        raise HTTPException(status_code=503, detail="Database is busy, please retry", headers={"Retry-After": "1"})
+    except psycopg2.OperationalError as e:
+        print(f"Database connect error: {e}")
+        raise HTTPException(status_code=503, detail="Database unavailable", headers={"Retry-After": "5"})
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
 
 def get_db_connection():
-    if not db_pool:
-        # For demo purposes if DB falls over, don't crash hard but valid DB is needed
-        # In prod, this should definitely raise 500
-        raise HTTPException(status_code=500, detail="Database connection failed")
-    conn = db_pool.getconn()
+    with pooled_connection() as conn:
+        yield conn
+
+def get_connector():
+    """pooled_connection as a dependency, for handlers that check out a connection per step rather than per request."""
+    return pooled_connection
+
+# --- Read Replica ---
+# With DB_REPLICA_DSN set, read-only endpoints and rule SQL check out connections from a second
+# pool on a streaming replica, leaving the primary to writes (rules CRUD, ingestion, rollups,
+# migrations). A monitor thread measures replication lag every DB_REPLICA_CHECK_INTERVAL seconds;
+# while the replica is unreachable or more than DB_REPLICA_MAX_LAG seconds behind, reads go to
+# the primary.
+DB_REPLICA_DSN = os.getenv("DB_REPLICA_DSN")  # libpq DSN or postgresql:// URL
+DB_REPLICA_POOL_MAX = int(os.getenv("DB_REPLICA_POOL_MAX", str(DB_POOL_MAX)))
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "10"))
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))
+
+metrics.describe("kwatch_db_reads_total", "counter", "Read-only connection checkouts by the pool that served them.")
+metrics.describe("kwatch_db_replica_lag_seconds", "gauge", "Replication lag measured by the last replica check.")
+metrics.describe("kwatch_db_replica_healthy", "gauge", "1 while reads are routed to the replica.")
+
+# Zero when replay has caught up with what was received: pg_last_xact_replay_timestamp() only
+# advances with new writes, so on an idle primary it would report a growing, phantom lag. A server
+# that isn't in recovery (e.g. a second standalone instance in development) counts as current.
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+def create_replica_pool() -> BoundedConnectionPool:
+    # minconn 0: creating the pool never blocks on an unreachable replica, the monitor finds out
+    return BoundedConnectionPool(
+        0, DB_REPLICA_POOL_MAX,
+        name="replica",
+        dsn=DB_REPLICA_DSN,
+        connect_timeout=DB_CONNECT_TIMEOUT,
+        keepalives=1,
+        keepalives_idle=30,
+        keepalives_interval=10,
+        keepalives_count=3
+    )
+
+class ReplicaState:
+    """Outcome of the last replica lag check; reads use the replica only while healthy."""
+
+    def __init__(self):
+        self.healthy = False
+        self.lag: Optional[float] = None
+        self.error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+
+    def snapshot(self) -> Dict:
+        return {
+            "configured": bool(DB_REPLICA_DSN),
+            "healthy": self.healthy,
+            "lag_seconds": self.lag,
+            "max_lag_seconds": DB_REPLICA_MAX_LAG,
+            "error": self.error,
+            "checked_seconds_ago": round(time.monotonic() - self.checked_at, 1) if self.checked_at else None,
+        }
+
+replica_pool: Optional[BoundedConnectionPool] = None
+replica_state = ReplicaState()
+
+def check_replica() -> bool:
+    """Measure replication lag and decide whether reads may use the replica."""
+    conn = None
+    healthy, lag, error = False, None, None
+    try:
+        conn = replica_pool.getconn(timeout=READY_DB_TIMEOUT)
+        with conn.cursor() as cur:
+            cur.execute(REPLICA_LAG_QUERY)
+            lag = float(cur.fetchone()[0])
+        conn.rollback()
+        healthy = lag <= DB_REPLICA_MAX_LAG
+        if not healthy:
+            error = f"Replica is {lag:.1f}s behind (limit {DB_REPLICA_MAX_LAG:.0f}s)"
+    except Exception as e:
+        error = str(e).strip() or type(e).__name__
+    finally:
+        if conn is not None:
+            replica_pool.putconn(conn, close=error is not None and lag is None)
+
+    if healthy != replica_state.healthy:
+        print("Reads routed to the replica." if healthy else f"Reads routed to the primary: {error}")
+    replica_state.healthy, replica_state.lag, replica_state.error = healthy, lag, error
+    replica_state.checked_at = time.monotonic()
+    return healthy
+
+def _replica_monitor_loop():
+    global replica_pool
+    if replica_pool is None:
+        replica_pool = create_replica_pool()
+    while not db_state.stop.is_set():
+        check_replica()
+        db_state.stop.wait(DB_REPLICA_CHECK_INTERVAL)
+
+@contextlib.contextmanager
+def read_connection():
+    """
+    pooled_connection for read-only work: a replica connection while the replica is healthy,
+    otherwise (or if checking one out fails) a primary one.
+    """
+    pool = replica_pool if replica_state.healthy else None
+    conn = None
+    if pool is not None:
+        try:
+            conn = pool.getconn()
+        except psycopg2.OperationalError as e:
+            # Went down between lag checks; stay on the primary until the next check succeeds
+            replica_state.healthy = False
+            replica_state.error = str(e).strip()
+            print(f"Reads routed to the primary: {replica_state.error}")
+        except PoolTimeout:
+            pass  # replica saturated: this request spills over to the primary
+    if conn is None:
+        metrics.inc("kwatch_db_reads_total", pool="primary")
+        with pooled_connection() as conn:
+            yield conn
+        return
+    metrics.inc("kwatch_db_reads_total", pool="replica")
     try:
         yield conn
     finally:
-        db_pool.putconn(conn)
+        pool.putconn(conn)
+
+def get_read_connection():
+    with read_connection() as conn:
+        yield conn
+
+def get_read_connector():
+    """read_connection as a dependency (see get_connector)."""
+    return read_connection
+
+# --- Async Database (optional) ---
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+class AsyncEngine:
+    """
+    Optional asyncpg pool so async endpoints can await queries without holding a
+    threadpool slot. Enabled with DB_ASYNC_ENABLED=true when asyncpg is installed.
+    """
+
+    def __init__(self):
+        self._pool = None
+
+    @property
+    def ready(self) -> bool:
+        return self._pool is not None
+
+    async def start(self):
+        self._pool = await asyncpg.create_pool(
+            host=DB_HOST, database=DB_NAME, user=DB_USER, password=DB_PASS, port=int(DB_PORT),
+            min_size=DB_POOL_MIN, max_size=DB_POOL_MAX, timeout=DB_CONNECT_TIMEOUT
+        )
+        print("Async database pool created.")
+
+    async def close(self):
+        if self._pool:
+            await self._pool.close()
+            self._pool = None
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        try:
+            conn = await self._pool.acquire(timeout=DB_POOL_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="Database is busy, please retry", headers={"Retry-After": "1"})
+        try:
+            yield conn
+        finally:
+            await self._pool.release(conn)
+
+    async def fetch(self, query: str, params=()):
+        """Run a psycopg2-style (%s) query and return a list of dicts."""
+        async with self.acquire() as conn:
+            t0 = time.perf_counter()
+            rows = await conn.fetch(to_asyncpg_sql(query), *params)
+            record_query(query, params, time.perf_counter() - t0, len(rows))
+            return [dict(r) for r in rows]
+
+    def stats(self):
+        if not self._pool:
+            return None
+        size = self._pool.get_size()
+        idle = self._pool.get_idle_size()
+        return {"size": size, "in_use": size - idle, "idle": idle, "max": self._pool.get_max_size()}
+
+def to_asyncpg_sql(query: str) -> str:
+    """Rewrite %s placeholders to asyncpg's $1..$n (a literal %% becomes %)."""
+    counter = itertools.count(1)
+    return re.sub(r"%%|%s", lambda m: "%" if m.group(0) == "%%" else f"${next(counter)}", query)
+
+async_engine = AsyncEngine() if (DB_ASYNC_ENABLED and asyncpg) else None
+
+async def _start_async_engine():
+    """Started by the lifespan as a task; retries with the same backoff as the sync pool."""
+    delay = DB_RETRY_INITIAL
+    while True:
+        try:
+            await async_engine.start()
+            return
+        except Exception as e:
+            print(f"Error creating async database pool (retrying in {delay:.0f}s): {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, DB_RETRY_MAX)
 
 # --- Models ---
 class KeywordStats(BaseModel):
@@ -85,6 +913,7 @@ class CountByDay(BaseModel):
     date: str
     count: int
     sentiment: Optional[str] = None
+    keyword: Optional[str] = None
 
 class AuthorStat(BaseModel):
     author: str
@@ -106,9 +935,22 @@ class Rule(RuleCreate):
 class RuleExecuteRequest(BaseModel):
     rule_id: int
     previous_result: Optional[Dict] = None
+    # Handle of a stored earlier result (see ResultStore); avoids posting previous_result back
+    previous_handle: Optional[str] = None
+    keywords: Optional[List[str]] = ["All"]
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    # Keep the result server-side and return its handle, for a following step to chain from
+    keep_result: bool = False
+
+class RuleChainRequest(BaseModel):
+    rule_ids: List[int]
+    previous_handle: Optional[str] = None
     keywords: Optional[List[str]] = ["All"]
     start_date: Optional[str] = None
     end_date: Optional[str] = None
+    offset: int = 0
+    limit: int = 200
 
 class ExecutionResult(BaseModel):
     status: str
@@ -116,51 +958,892 @@ class ExecutionResult(BaseModel):
     message: Optional[str] = None
     sql: Optional[str] = None
 
-# --- Database Initialization ---
-def init_db():
-    """Initialize database tables if they don't exist."""
-    conn = get_db_connection_sync() # Helper to get single conn
-    if not conn:
+# --- Analytics Rollup ---
+ROLLUP_REFRESH_INTERVAL = float(os.getenv("ROLLUP_REFRESH_INTERVAL", "30"))
+ROLLUP_BATCH_SIZE = int(os.getenv("ROLLUP_BATCH_SIZE", "50000"))
+ROLLUP_LOCK_ID = 7310001  # pg advisory lock key, keeps concurrent workers from double counting
+ROLLUP_GAP_TTL = int(os.getenv("ROLLUP_GAP_TTL", "3600"))  # seconds a skipped id may still commit
+
+# Ids are drawn from a sequence when a row is inserted, not when it commits: a writer can commit id
+# 101 while id 100 is still in flight, and a watermark at 101 would then never see 100. Each fold
+# records the ids it found missing below its new watermark, and later refreshes fold the ones that
+# turned up. Ids that never do (rolled back, or burned by ON CONFLICT) expire after ROLLUP_GAP_TTL.
+def note_id_gaps(cur, name: str, last_id: int, upper_id: int, noted_at: Optional[datetime] = None):
+    """Record the ids in (last_id, upper_id] with no visible row as ranges in rollup_gaps."""
+    cur.execute("""
+        INSERT INTO rollup_gaps (name, lo, hi, noted_at)
+        SELECT %s, prev + 1, id - 1, COALESCE(%s::timestamp, CURRENT_TIMESTAMP) FROM (
+            SELECT id, LAG(id, 1, %s::bigint) OVER (ORDER BY id) AS prev FROM (
+                SELECT id FROM kwatch_alert_results WHERE id > %s AND id <= %s
+                UNION ALL SELECT %s::bigint + 1
+            ) ids
+        ) steps
+        WHERE id > prev + 1
+    """, (name, noted_at, last_id, last_id, upper_id, upper_id))
+
+def fold_id_gaps(cur, name: str, fold):
+    """Fold rows that have since committed into the named rollup's gaps, and expire stale gaps."""
+    cur.execute(
+        "DELETE FROM rollup_gaps WHERE name = %s AND noted_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second'",
+        (name, ROLLUP_GAP_TTL)
+    )
+    cur.execute("""
+        DELETE FROM rollup_gaps g
+        WHERE g.name = %s AND EXISTS (SELECT 1 FROM kwatch_alert_results a WHERE a.id BETWEEN g.lo AND g.hi)
+        RETURNING lo, hi, noted_at
+    """, (name,))
+    filled = cur.fetchall()
+    for lo, hi, noted_at in filled:
+        fold(cur, lo - 1, hi)
+        # Whatever is still missing keeps its original deadline
+        note_id_gaps(cur, name, lo - 1, hi, noted_at)
+    if filled:
+        # last_id doesn't move, so this is what tells the response cache the rollup changed
+        cur.execute("UPDATE rollup_watermarks SET updated_at = CURRENT_TIMESTAMP WHERE name = %s", (name,))
+
+def fold_alert_batches(conn, name: str, fold, batch_size: int = ROLLUP_BATCH_SIZE) -> int:
+    """
+    Advance the named high-water mark over kwatch_alert_results, calling fold(cur, last_id, upper_id)
+    for each id batch in the same transaction as the watermark update, then folding any late rows
+    into the gaps left by earlier batches (see note_id_gaps).
+    Works in id batches so the first run over a large table never holds one huge transaction.
+    Returns the number of raw rows scanned.
+    """
+    scanned = 0
+    while True:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (ROLLUP_LOCK_ID,))
+            if not cur.fetchone()[0]:
+                # Another worker is refreshing; its result is as good as ours
+                conn.rollback()
+                return scanned
+
+            cur.execute("SELECT last_id FROM rollup_watermarks WHERE name = %s FOR UPDATE", (name,))
+            last_id = cur.fetchone()[0]
+            cur.execute("""
+                SELECT MAX(id), COUNT(*) FROM (
+                    SELECT id FROM kwatch_alert_results WHERE id > %s ORDER BY id LIMIT %s
+                ) batch
+            """, (last_id, batch_size))
+            upper_id, batch_rows = cur.fetchone()
+            if upper_id is not None:
+                fold(cur, last_id, upper_id)
+                note_id_gaps(cur, name, last_id, upper_id)
+                cur.execute(
+                    "UPDATE rollup_watermarks SET last_id = %s, updated_at = CURRENT_TIMESTAMP WHERE name = %s",
+                    (upper_id, name)
+                )
+            if batch_rows < batch_size:
+                fold_id_gaps(cur, name, fold)
+        conn.commit()
+        scanned += batch_rows
+        if batch_rows < batch_size:
+            return scanned
+
+def _fold_daily_counts(cur, last_id: int, upper_id: int):
+    cur.execute("""
+        INSERT INTO kwatch_daily_rollup (keyword, day, sentiment, count)
+        SELECT COALESCE(keyword, ''), COALESCE(DATE(received_at), '-infinity'::date), COALESCE(sentiment, ''), COUNT(*)
+        FROM kwatch_alert_results
+        WHERE id > %s AND id <= %s AND author != 'AutoModerator'
+        GROUP BY 1, 2, 3
+        ON CONFLICT (keyword, day, sentiment)
+        DO UPDATE SET count = kwatch_daily_rollup.count + EXCLUDED.count
+    """, (last_id, upper_id))
+
+def refresh_daily_rollup(conn, batch_size: int = ROLLUP_BATCH_SIZE) -> int:
+    """Fold alert rows above the 'daily' high-water mark into kwatch_daily_rollup."""
+    return fold_alert_batches(conn, "daily", _fold_daily_counts, batch_size)
+
+def _fold_hourly_counts(cur, last_id: int, upper_id: int):
+    cur.execute("""
+        INSERT INTO kwatch_hourly_rollup (keyword, hour, sentiment, count)
+        SELECT COALESCE(keyword, ''), COALESCE(date_trunc('hour', received_at), '-infinity'::timestamp),
+               COALESCE(sentiment, ''), COUNT(*)
+        FROM kwatch_alert_results
+        WHERE id > %s AND id <= %s AND author != 'AutoModerator'
+        GROUP BY 1, 2, 3
+        ON CONFLICT (keyword, hour, sentiment)
+        DO UPDATE SET count = kwatch_hourly_rollup.count + EXCLUDED.count
+    """, (last_id, upper_id))
+
+def refresh_hourly_rollup(conn, batch_size: int = ROLLUP_BATCH_SIZE) -> int:
+    """Fold alert rows above the 'hourly' high-water mark into kwatch_hourly_rollup."""
+    return fold_alert_batches(conn, "hourly", _fold_hourly_counts, batch_size)
+
+# --- Author Sketches ---
+# HyperLogLog with 2^HLL_PRECISION registers. Each register is stored as a HLL_RANK_BITS-wide
+# bitmap of the ranks seen rather than just the max rank, so two sketches merge with a plain
+# bitwise OR: in SQL that's bit_or() over any (keyword, day) range, done inside Postgres.
+HLL_PRECISION = 11
+HLL_REGISTERS = 1 << HLL_PRECISION
+HLL_RANK_BITS = 32
+HLL_SKETCH_BITS = HLL_REGISTERS * HLL_RANK_BITS
+
+def hll_position(author: str) -> int:
+    """Bit offset within a sketch for one author: register * HLL_RANK_BITS + (rank - 1)."""
+    h = int.from_bytes(hashlib.blake2b(author.encode("utf-8"), digest_size=8).digest(), "big")
+    register = h & (HLL_REGISTERS - 1)
+    w = h >> HLL_PRECISION
+    # Rank = 1-based position of the lowest set bit in the remaining hash bits
+    rank = min((w & -w).bit_length(), HLL_RANK_BITS) if w else HLL_RANK_BITS
+    return register * HLL_RANK_BITS + rank - 1
+
+def hll_sketch(authors) -> str:
+    """Build a sketch as a '0'/'1' string, the text form Postgres accepts for bit(n)."""
+    bits = bytearray(b"0" * HLL_SKETCH_BITS)
+    for author in authors:
+        bits[hll_position(author)] = 49  # ord('1')
+    return bits.decode("ascii")
+
+def hll_estimate(sketch: Optional[str]) -> int:
+    """Cardinality estimate for a (possibly merged) sketch, with linear counting for small ranges."""
+    if not sketch:
+        return 0
+    m = HLL_REGISTERS
+    harmonic = 0.0
+    zeros = 0
+    for offset in range(0, HLL_SKETCH_BITS, HLL_RANK_BITS):
+        rank = sketch.rfind("1", offset, offset + HLL_RANK_BITS) + 1
+        if rank:
+            rank -= offset
+        else:
+            zeros += 1
+        harmonic += 2.0 ** -rank
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / harmonic
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * math.log(m / zeros)
+    return int(round(estimate))
+
+def _fold_author_sketches(cur, last_id: int, upper_id: int):
+    cur.execute("""
+        SELECT COALESCE(keyword, ''), COALESCE(DATE(received_at), '-infinity'::date), author
+        FROM kwatch_alert_results
+        WHERE id > %s AND id <= %s AND author != 'AutoModerator'
+        GROUP BY 1, 2, 3
+    """, (last_id, upper_id))
+    groups: Dict[tuple, list] = {}
+    for keyword, day, author in cur.fetchall():
+        groups.setdefault((keyword, day), []).append(author)
+    if not groups:
         return
+    extras.execute_values(cur, """
+        INSERT INTO kwatch_author_sketches (keyword, day, sketch)
+        VALUES %s
+        ON CONFLICT (keyword, day)
+        DO UPDATE SET sketch = kwatch_author_sketches.sketch | EXCLUDED.sketch
+    """, [(keyword, day, hll_sketch(authors)) for (keyword, day), authors in groups.items()],
+        template=f"(%s, %s, %s::bit({HLL_SKETCH_BITS}))")
+
+def refresh_author_sketches(conn, batch_size: int = ROLLUP_BATCH_SIZE) -> int:
+    """Fold alert rows above the 'author_sketch' high-water mark into kwatch_author_sketches."""
+    return fold_alert_batches(conn, "author_sketch", _fold_author_sketches, batch_size)
+
+def estimate_unique_authors(cur, keywords: List[str], start: Optional[str], end: Optional[str]) -> int:
+    """Merge the per-(keyword, day) sketches covering the filters and estimate distinct authors."""
+    query = "SELECT bit_or(sketch)::text AS sketch FROM kwatch_author_sketches WHERE TRUE"
+    kw_sql, kw_params = build_keyword_filter(keywords)
+    date_sql, date_params = build_rollup_date_filter(start, end)
+    cur.execute(query + kw_sql + date_sql, tuple(kw_params) + tuple(date_params))
+    row = cur.fetchone()
+    if not row:
+        return 0
+    return hll_estimate(row["sketch"] if isinstance(row, dict) else row[0])
+
+# --- Author Leaderboard ---
+# Mention counts per (keyword, day, author) serve date ranges; per (keyword, author) totals serve
+# the all-time list, with every keyword summed under AUTHOR_TOTALS_ALL so the default view is a
+# keyset walk down one index instead of a GROUP BY over the raw table.
+AUTHOR_TOTALS_ALL = "*"
+
+def _fold_author_counts(cur, last_id: int, upper_id: int):
+    cur.execute("""
+        WITH batch AS (
+            SELECT COALESCE(keyword, '') AS keyword, COALESCE(DATE(received_at), '-infinity'::date) AS day,
+                   author, COUNT(*) AS count
+            FROM kwatch_alert_results
+            WHERE id > %s AND id <= %s AND author != 'AutoModerator'
+            GROUP BY 1, 2, 3
+        ), daily AS (
+            INSERT INTO kwatch_author_daily (keyword, day, author, count)
+            SELECT keyword, day, author, count FROM batch
+            ON CONFLICT (keyword, day, author)
+            DO UPDATE SET count = kwatch_author_daily.count + EXCLUDED.count
+        )
+        INSERT INTO kwatch_author_totals (keyword, author, count)
+        SELECT keyword, author, SUM(count)::bigint FROM batch GROUP BY keyword, author
+        UNION ALL
+        SELECT %s, author, SUM(count)::bigint FROM batch GROUP BY author
+        ON CONFLICT (keyword, author)
+        DO UPDATE SET count = kwatch_author_totals.count + EXCLUDED.count
+    """, (last_id, upper_id, AUTHOR_TOTALS_ALL))
+
+def refresh_author_counts(conn, batch_size: int = ROLLUP_BATCH_SIZE) -> int:
+    """Fold alert rows above the 'author_counts' high-water mark into the author leaderboard tables."""
+    return fold_alert_batches(conn, "author_counts", _fold_author_counts, batch_size)
+
+def author_ranking_query(keywords: List[str], start: Optional[str], end: Optional[str]):
+    """
+    (sql, params) selecting (author, count) for every author under the filters, ranked by
+    ORDER BY count DESC, author DESC. A single keyword (or All) over all time reads the totals
+    index directly; ranges and keyword sets sum the pre-aggregated rows, never the raw table.
+    """
+    kw_sql, kw_params = build_keyword_filter(keywords)
+    selected = kw_params[0] if kw_params else ()
+    if not start and not end and len(selected) <= 1:
+        keyword = selected[0] if selected else AUTHOR_TOTALS_ALL
+        return "SELECT author, count FROM kwatch_author_totals WHERE keyword = %s", [keyword]
+    if not start and not end:
+        return ("SELECT author, SUM(count)::bigint AS count FROM kwatch_author_totals WHERE TRUE"
+                + kw_sql + " GROUP BY author", list(kw_params))
+    date_sql, date_params = build_rollup_date_filter(start, end)
+    return ("SELECT author, SUM(count)::bigint AS count FROM kwatch_author_daily WHERE TRUE"
+            + kw_sql + date_sql + " GROUP BY author", list(kw_params) + date_params)
+
+SEARCH_TS_CONFIG = "english"
+
+def _fold_search_vectors(cur, last_id: int, upper_id: int):
+    # New rows are covered by the trigger; this only backfills rows that predate it
+    cur.execute(f"""
+        UPDATE kwatch_alert_results
+        SET content_tsv = to_tsvector('{SEARCH_TS_CONFIG}', COALESCE(content, ''))
+        WHERE id > %s AND id <= %s AND content_tsv IS NULL
+    """, (last_id, upper_id))
+
+def refresh_search_vectors(conn, batch_size: int = ROLLUP_BATCH_SIZE) -> int:
+    """Backfill content_tsv for rows above the 'search_tsv' high-water mark."""
+    return fold_alert_batches(conn, "search_tsv", _fold_search_vectors, batch_size)
+
+ROLLUPS = [
+    ("daily", refresh_daily_rollup),
+    ("hourly", refresh_hourly_rollup),
+    ("author_sketch", refresh_author_sketches),
+    ("author_counts", refresh_author_counts),
+    ("search_tsv", refresh_search_vectors),
+]
+
+# Fold step behind each rollup, for writers that advance the watermarks in their own transaction
+ROLLUP_FOLDS = {
+    "daily": _fold_daily_counts,
+    "hourly": _fold_hourly_counts,
+    "author_sketch": _fold_author_sketches,
+    "author_counts": _fold_author_counts,
+    "search_tsv": _fold_search_vectors,
+}
+
+def _rollup_refresh_loop():
+    while not db_state.stop.is_set():
+        for name, refresh in ROLLUPS:
+            conn = None
+            try:
+                conn = db_pool.getconn()
+                scanned = refresh(conn)
+                if scanned:
+                    print(f"Rollup '{name}' refreshed: {scanned} new alert rows folded in.")
+            except Exception as e:
+                print(f"Rollup '{name}' refresh error: {e}")
+                if conn:
+                    conn.rollback()
+            finally:
+                if conn:
+                    db_pool.putconn(conn)
+        db_state.stop.wait(ROLLUP_REFRESH_INTERVAL)
+
+def build_rollup_date_filter(start: Optional[str], end: Optional[str]):
+    """Day-granular date range over kwatch_daily_rollup (time of day in start/end is ignored)."""
+    sql, params = "", []
+    if start:
+        sql += " AND day >= %s::date"
+        params.append(start)
+    if end:
+        sql += " AND day <= %s::date"
+        params.append(end)
+    return sql, params
+
+def build_hourly_date_filter(start: Optional[str], end: Optional[str]):
+    """Hour-granular range over kwatch_hourly_rollup; a bare end date includes that whole day."""
+    sql, params = "", []
+    if start:
+        sql += " AND hour >= date_trunc('hour', %s::timestamp)"
+        params.append(start)
+    if end:
+        sql += " AND hour < %s::date + 1" if len(end) == 10 else " AND hour <= %s::timestamp"
+        params.append(end)
+    return sql, params
+
+
+# --- Schema Migrations ---
+# Applied in version order and recorded in schema_migrations, so each runs once per database.
+# Run with `python api_service.py migrate` (also on startup unless DB_MIGRATE_ON_STARTUP=0);
+# `python api_service.py explain` reports the planner's choice for each hot endpoint query.
+DB_MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "1") == "1"
+MIGRATION_LOCK_ID = 7310002  # pg advisory lock key, one migrator at a time across app instances
+
+class IndexBuild(NamedTuple):
+    """A CREATE INDEX CONCURRENTLY step; it can't share a transaction with anything else."""
+    name: str
+    definition: str
+
+MIGRATIONS = [
+    (1, "saved_rules", [
+        """
+        CREATE TABLE IF NOT EXISTS saved_rules (
+            id SERIAL PRIMARY KEY,
+            title TEXT NOT NULL,
+            instruction TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        "ALTER TABLE saved_rules ADD COLUMN IF NOT EXISTS is_chaining BOOLEAN DEFAULT FALSE;",
+    ]),
+    # Daily analytics rollup, folded forward from kwatch_alert_results by refresh_daily_rollup.
+    # NULL keyword/sentiment are stored as '' and undated rows under '-infinity' so they fit the key.
+    (2, "daily_rollup", [
+        """
+        CREATE TABLE IF NOT EXISTS kwatch_daily_rollup (
+            keyword TEXT NOT NULL,
+            day DATE NOT NULL,
+            sentiment TEXT NOT NULL,
+            count BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (keyword, day, sentiment)
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS rollup_watermarks (
+            name TEXT PRIMARY KEY,
+            last_id BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        "INSERT INTO rollup_watermarks (name) VALUES ('daily') ON CONFLICT (name) DO NOTHING;",
+    ]),
+    # Mergeable HyperLogLog sketch of authors per (keyword, day), see hll_sketch
+    (3, "author_sketches", [
+        f"""
+        CREATE TABLE IF NOT EXISTS kwatch_author_sketches (
+            keyword TEXT NOT NULL,
+            day DATE NOT NULL,
+            sketch BIT({HLL_SKETCH_BITS}) NOT NULL,
+            PRIMARY KEY (keyword, day)
+        );
+        """,
+        "INSERT INTO rollup_watermarks (name) VALUES ('author_sketch') ON CONFLICT (name) DO NOTHING;",
+    ]),
+    # LLM instruction -> SQL translations, see translate_instruction
+    (4, "llm_translation_cache", [
+        """
+        CREATE TABLE IF NOT EXISTS llm_translation_cache (
+            cache_key TEXT PRIMARY KEY,
+            rule_id INTEGER,
+            mode TEXT NOT NULL,
+            model TEXT NOT NULL,
+            prompt_version TEXT NOT NULL,
+            response JSONB NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_llm_translation_cache_rule_id ON llm_translation_cache (rule_id);",
+    ]),
+    # Trigger-maintained tsvector for /api/search. Added without a default (no table rewrite);
+    # existing rows are filled in batches by the 'search_tsv' rollup.
+    (5, "search_tsv_column", [
+        "ALTER TABLE kwatch_alert_results ADD COLUMN IF NOT EXISTS content_tsv tsvector;",
+        f"""
+        CREATE OR REPLACE FUNCTION kwatch_alert_results_tsv() RETURNS trigger AS $$
+        BEGIN
+            NEW.content_tsv := to_tsvector('{SEARCH_TS_CONFIG}', COALESCE(NEW.content, ''));
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql;
+        """,
+        "DROP TRIGGER IF EXISTS kwatch_alert_results_tsv ON kwatch_alert_results;",
+        """
+        CREATE TRIGGER kwatch_alert_results_tsv
+        BEFORE INSERT OR UPDATE OF content ON kwatch_alert_results
+        FOR EACH ROW EXECUTE PROCEDURE kwatch_alert_results_tsv();
+        """,
+        "INSERT INTO rollup_watermarks (name) VALUES ('search_tsv') ON CONFLICT (name) DO NOTHING;",
+    ]),
+    (6, "search_tsv_index", IndexBuild(
+        "idx_kwatch_alert_results_content_tsv",
+        "ON kwatch_alert_results USING GIN (content_tsv)")),
+    # Hot-path indexes. The partial predicate matches the author != 'AutoModerator' filter every
+    # endpoint applies, so bot rows never take space in them.
+    # /api/mentions, export: newest-first keyset scan over all keywords, undated rows last
+    (7, "mentions_by_date_index", IndexBuild(
+        "idx_kwatch_alert_results_received_id",
+        "ON kwatch_alert_results (received_at DESC NULLS LAST, id DESC) WHERE author <> 'AutoModerator'")),
+    # /api/mentions with a keyword filter: keyset page and date-bounded totals
+    (8, "mentions_by_keyword_date_index", IndexBuild(
+        "idx_kwatch_alert_results_keyword_received_id",
+        "ON kwatch_alert_results (keyword, received_at DESC NULLS LAST, id DESC) WHERE author <> 'AutoModerator'")),
+    # /api/stats/authors and exact unique-authors: index-only GROUP BY / COUNT(DISTINCT) per keyword
+    (9, "authors_by_keyword_index", IndexBuild(
+        "idx_kwatch_alert_results_keyword_author",
+        "ON kwatch_alert_results (keyword, author) WHERE author <> 'AutoModerator'")),
+    # counts-by-day, sentiment and keywords over a date range without a keyword filter;
+    # the primary key leads with keyword and can't serve those
+    (10, "daily_rollup_by_day_index", IndexBuild(
+        "idx_kwatch_daily_rollup_day",
+        "ON kwatch_daily_rollup (day, keyword, sentiment, count)")),
+    # Author leaderboard aggregates, folded forward by refresh_author_counts (same '' / '-infinity'
+    # conventions as the daily rollup; AUTHOR_TOTALS_ALL rows sum every keyword)
+    (11, "author_leaderboard", [
+        """
+        CREATE TABLE IF NOT EXISTS kwatch_author_daily (
+            keyword TEXT NOT NULL,
+            day DATE NOT NULL,
+            author TEXT NOT NULL,
+            count BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (keyword, day, author)
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS kwatch_author_totals (
+            keyword TEXT NOT NULL,
+            author TEXT NOT NULL,
+            count BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (keyword, author)
+        );
+        """,
+        "INSERT INTO rollup_watermarks (name) VALUES ('author_counts') ON CONFLICT (name) DO NOTHING;",
+    ]),
+    # /api/stats/authors all-time pages: (count, author) < cursor is an index range scan per keyword
+    (12, "author_totals_rank_index", IndexBuild(
+        "idx_kwatch_author_totals_rank",
+        "ON kwatch_author_totals (keyword, count, author)")),
+    # Leaderboard over a date range without a keyword filter
+    (13, "author_daily_by_day_index", IndexBuild(
+        "idx_kwatch_author_daily_day",
+        "ON kwatch_author_daily (day, keyword, author, count)")),
+    # /api/ingest dedup: NOT EXISTS probe per staged url. Not unique, since existing rows may repeat a url.
+    (14, "alerts_by_url_index", IndexBuild(
+        "idx_kwatch_alert_results_url",
+        "ON kwatch_alert_results (url)")),
+    # Checkpoint for backfill_sentiment
+    (15, "sentiment_backfill", [
+        "INSERT INTO rollup_watermarks (name) VALUES ('sentiment_backfill') ON CONFLICT (name) DO NOTHING;",
+    ]),
+    # backfill_sentiment's keyset scan over unlabeled rows; shrinks as labels are written
+    (16, "unlabeled_sentiment_index", IndexBuild(
+        "idx_kwatch_alert_results_unlabeled",
+        "ON kwatch_alert_results (id) WHERE sentiment IS NULL")),
+    # Hour buckets for /api/stats/counts-by-day, folded forward by refresh_hourly_rollup
+    # (undated rows under '-infinity' like the daily rollup)
+    (17, "hourly_rollup", [
+        """
+        CREATE TABLE IF NOT EXISTS kwatch_hourly_rollup (
+            keyword TEXT NOT NULL,
+            hour TIMESTAMP NOT NULL,
+            sentiment TEXT NOT NULL,
+            count BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (keyword, hour, sentiment)
+        );
+        """,
+        "INSERT INTO rollup_watermarks (name) VALUES ('hourly') ON CONFLICT (name) DO NOTHING;",
+    ]),
+    (18, "hourly_rollup_by_hour_index", IndexBuild(
+        "idx_kwatch_hourly_rollup_hour",
+        "ON kwatch_hourly_rollup (hour, keyword, sentiment, count)")),
+    # One NOTIFY per INSERT statement (not per row) wakes the /api/mentions/stream listeners;
+    # the payload is only a hint, listeners re-read by id
+    (19, "alert_insert_notify", [
+        """
+        CREATE OR REPLACE FUNCTION kwatch_alert_results_notify() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('kwatch_alerts', (SELECT MAX(id)::text FROM inserted));
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+        """,
+        "DROP TRIGGER IF EXISTS kwatch_alert_results_notify ON kwatch_alert_results;",
+        """
+        CREATE TRIGGER kwatch_alert_results_notify AFTER INSERT ON kwatch_alert_results
+        REFERENCING NEW TABLE AS inserted
+        FOR EACH STATEMENT EXECUTE PROCEDURE kwatch_alert_results_notify();
+        """,
+    ]),
+    # Single-row change counter behind the /api/rules ETag, bumped by any write to saved_rules
+    (20, "saved_rules_version", [
+        """
+        CREATE TABLE IF NOT EXISTS saved_rules_version (
+            singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+            version BIGINT NOT NULL DEFAULT 0,
+            changed_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+        );
+        """,
+        "INSERT INTO saved_rules_version DEFAULT VALUES ON CONFLICT DO NOTHING;",
+        """
+        CREATE OR REPLACE FUNCTION saved_rules_bump_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE saved_rules_version SET version = version + 1, changed_at = now() AT TIME ZONE 'utc';
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+        """,
+        "DROP TRIGGER IF EXISTS saved_rules_bump_version ON saved_rules;",
+        """
+        CREATE TRIGGER saved_rules_bump_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON saved_rules
+        FOR EACH STATEMENT EXECUTE PROCEDURE saved_rules_bump_version();
+        """,
+    ]),
+    # Id ranges a rollup's watermark skipped over, see note_id_gaps
+    (21, "rollup_gaps", [
+        """
+        CREATE TABLE IF NOT EXISTS rollup_gaps (
+            name TEXT NOT NULL,
+            lo BIGINT NOT NULL,
+            hi BIGINT NOT NULL,
+            noted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (name, lo)
+        );
+        """,
+    ]),
+]
+
+def build_index_concurrently(conn, index: IndexBuild):
+    """CREATE INDEX CONCURRENTLY so writers never block; runs outside any transaction block."""
+    conn.commit()
+    conn.autocommit = True
     try:
         with conn.cursor() as cur:
-            # Create table if not exists
+            # A previously interrupted concurrent build leaves an INVALID index that IF NOT EXISTS would keep
             cur.execute("""
-                CREATE TABLE IF NOT EXISTS saved_rules (
-                    id SERIAL PRIMARY KEY,
-                    title TEXT NOT NULL,
-                    instruction TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-            
-            # Add is_chaining column if it doesn't exist (Migration)
+                SELECT i.indisvalid FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE c.relname = %s
+            """, (index.name,))
+            row = cur.fetchone()
+            if row and not row[0]:
+                cur.execute(f"DROP INDEX CONCURRENTLY {index.name};")
+            cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index.name} {index.definition};")
+    finally:
+        conn.autocommit = False
+
+def run_migrations(conn, target: Optional[int] = None) -> List[int]:
+    """Apply pending MIGRATIONS (up to target) in version order; returns the versions applied."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        conn.commit()
+    # Session-level lock: held across the per-migration commits and concurrent index builds. It is
+    # waited for outside any transaction: a waiter holding a snapshot would stall the holder's
+    # CONCURRENTLY steps, which wait out every older snapshot, and the two would deadlock.
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+    finally:
+        conn.autocommit = False
+    applied = []
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT version FROM schema_migrations")
+            done = {r[0] for r in cur.fetchall()}
+        conn.commit()
+
+        for version, name, step in MIGRATIONS:
+            if version in done or (target is not None and version > target):
+                continue
+            started = time.monotonic()
             try:
-                cur.execute("ALTER TABLE saved_rules ADD COLUMN is_chaining BOOLEAN DEFAULT FALSE;")
-            except Exception:
-                conn.rollback() # Column likely exists or other error
-            else:
+                if isinstance(step, IndexBuild):
+                    build_index_concurrently(conn, step)
+                    statements = []
+                else:
+                    statements = step
+                with conn.cursor() as cur:
+                    for statement in statements:
+                        cur.execute(statement)
+                    cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
                 conn.commit()
-                print("Added column 'is_chaining' to saved_rules.")
+            except Exception:
+                conn.rollback()
+                raise
+            applied.append(version)
+            print(f"Migration {version:03d} '{name}' applied in {time.monotonic() - started:.1f}s.")
+    finally:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        finally:
+            conn.autocommit = False
+    return applied
 
-            conn.commit()
-            print("Table 'saved_rules' checked/created.")
+def init_db() -> bool:
+    """Bring the schema up to date; errors are logged so the API still serves what it can."""
+    pool = ensure_db_pool()
+    if not pool:
+        return False
+    conn = pool.getconn()
+    try:
+        applied = run_migrations(conn)
+        print(f"Schema up to date ({len(applied)} migration(s) applied).")
+        return True
     except Exception as e:
         print(f"DB Init Error: {e}")
+        return False
     finally:
-        conn.close()
+        pool.putconn(conn)
+
+def hot_path_queries(keyword: str) -> List[tuple]:
+    """(name, sql, params) for the queries behind the main read endpoints, filtered to one keyword."""
+    kw_sql, kw_params = build_keyword_filter([keyword])
+    mentions = "SELECT id, author, content, received_at, url, sentiment, keyword FROM kwatch_alert_results WHERE author != 'AutoModerator'"
+    return [
+        ("mentions:first_page", mentions + MENTION_ORDER + " LIMIT 50", []),
+        ("mentions:keyword_page", mentions + kw_sql + MENTION_ORDER + " LIMIT 50", kw_params),
+        ("mentions:keyword_cursor",
+         mentions + kw_sql + " AND (received_at, id) < (%s, %s)" + MENTION_ORDER + " LIMIT 50",
+         kw_params + [datetime.now(), 2 ** 62]),
+        ("mentions:keyword_total",
+         "SELECT COUNT(*) AS count FROM kwatch_alert_results WHERE author != 'AutoModerator'" + kw_sql + " AND received_at >= %s",
+         kw_params + [datetime.now() - timedelta(days=30)]),
+        ("authors:keyword_cursor",
+         "SELECT author, count FROM kwatch_author_totals WHERE keyword = %s"
+         " AND (count, author) < (%s, %s) ORDER BY count DESC, author DESC LIMIT 50", [keyword, 10, "m"]),
+        ("authors:range_page",
+         "SELECT author, SUM(count)::bigint AS count FROM kwatch_author_daily WHERE TRUE" + kw_sql
+         + " AND day >= %s::date GROUP BY author ORDER BY count DESC, author DESC LIMIT 50",
+         kw_params + [date.today() - timedelta(days=30)]),
+        ("unique_authors:exact",
+         "SELECT COUNT(DISTINCT author) as count FROM kwatch_alert_results WHERE author != 'AutoModerator'" + kw_sql, kw_params),
+        ("counts_by_day:all_keywords",
+         "SELECT day as date, SUM(count)::bigint as count FROM kwatch_daily_rollup WHERE day != '-infinity'::date"
+         " AND day >= %s::date GROUP BY day ORDER BY day ASC", [date.today() - timedelta(days=30)]),
+        ("counts_by_day:keyword",
+         "SELECT day as date, SUM(count)::bigint as count FROM kwatch_daily_rollup WHERE day != '-infinity'::date"
+         + kw_sql + " GROUP BY day ORDER BY day ASC", kw_params),
+        ("counts_by_hour:by_sentiment",
+         "SELECT hour AS date, COALESCE(NULLIF(sentiment, ''), 'unknown') AS series, SUM(count)::bigint AS count"
+         " FROM kwatch_hourly_rollup WHERE hour != '-infinity'::timestamp AND hour >= date_trunc('hour', %s::timestamp)"
+         " GROUP BY 1, 2 ORDER BY 1, 2", [datetime.now() - timedelta(days=7)]),
+        ("sentiment:all_keywords",
+         "SELECT NULLIF(sentiment, '') as sentiment, SUM(count)::bigint as count FROM kwatch_daily_rollup WHERE TRUE"
+         " AND day >= %s::date GROUP BY sentiment", [date.today() - timedelta(days=30)]),
+        ("sentiment:keyword",
+         "SELECT NULLIF(sentiment, '') as sentiment, SUM(count)::bigint as count FROM kwatch_daily_rollup WHERE TRUE"
+         + kw_sql + " GROUP BY sentiment", kw_params),
+    ]
+
+def _plan_nodes(node: Dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
 
-def get_db_connection_sync():
-    """Helper for startup initialization independent of request scope."""
-    if not db_pool: return None
-    return db_pool.getconn()
+def explain_hot_paths(conn, keyword: Optional[str] = None) -> List[Dict]:
+    """
+    EXPLAIN (not ANALYZE) each hot endpoint query and summarize the plan: cost, indexes used and
+    any sequential scan of the raw alert table, which is what the index set above exists to prevent.
+    """
+    with conn.cursor() as cur:
+        if keyword is None:
+            cur.execute("SELECT keyword FROM kwatch_daily_rollup WHERE keyword != '' GROUP BY keyword ORDER BY SUM(count) DESC LIMIT 1")
+            row = cur.fetchone()
+            keyword = row[0] if row else "All"
+        report = []
+        for name, sql, params in hot_path_queries(keyword):
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, tuple(params))
+            plan = cur.fetchone()[0][0]["Plan"]
+            nodes = list(_plan_nodes(plan))
+            report.append({
+                "query": name,
+                "total_cost": plan.get("Total Cost"),
+                "plan_rows": plan.get("Plan Rows"),
+                "indexes": sorted({n["Index Name"] for n in nodes if n.get("Index Name")}),
+                "seq_scans": sorted({n["Relation Name"] for n in nodes if n.get("Node Type") == "Seq Scan"}),
+                "nodes": [n["Node Type"] for n in nodes],
+            })
+    conn.rollback()
+    return report
 
-# Initialize on startup
-# (In a real app, use @app.on_event("startup"))
-# For this script, we'll call it if pool exists.
-if db_pool:
-    init_db()
 
+# --- Response Cache ---
+CACHE_TTL = float(os.getenv("CACHE_TTL", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+CACHE_WATERMARK_INTERVAL = float(os.getenv("CACHE_WATERMARK_INTERVAL", "2"))
+
+class ResponseCache:
+    """
+    In-process TTL + LRU cache for analytics responses.
+    Every entry is tagged with the data watermark it was computed under; when the
+    watermark moves (new alerts, rollup advanced) the whole cache is dropped.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL,
+                 watermark_interval: float = CACHE_WATERMARK_INTERVAL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.watermark_interval = watermark_interval
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._watermark = None
+        self._watermark_checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def fresh_watermark(self):
+        """The last watermark read, if that was less than watermark_interval ago; else None."""
+        with self._lock:
+            if self._watermark is not None and time.monotonic() - self._watermark_checked_at < self.watermark_interval:
+                return self._watermark
+        return None
+
+    def current_watermark(self, conn):
+        """Max id / received_at of the alert table plus the rollup marks, re-read at most every watermark_interval."""
+        watermark = self.fresh_watermark()
+        if watermark is not None:
+            return watermark
+        now = time.monotonic()
+
+        with conn.cursor() as cur:
+            # Each term is an index probe: MAX(id) on the primary key, MAX(received_at) on the partial
+            # (received_at DESC NULLS LAST, id DESC) index, whose predicate the author filter has to repeat
+            cur.execute("""
+                SELECT (SELECT MAX(id) FROM kwatch_alert_results),
+                       (SELECT MAX(received_at) FROM kwatch_alert_results WHERE author <> 'AutoModerator'),
+                       (SELECT SUM(last_id) FROM rollup_watermarks),
+                       (SELECT MAX(updated_at) FROM rollup_watermarks)
+            """)
+            watermark = tuple(cur.fetchone())
+
+        with self._lock:
+            if watermark != self._watermark:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._watermark = watermark
+            self._watermark_checked_at = now
+        return watermark
+
+    def lookup(self, conn, key: tuple):
+        """Returns (value or None, watermark). Pass the watermark back to store()."""
+        watermark = self.current_watermark(conn)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == watermark and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2], watermark
+            if entry:
+                del self._entries[key]
+            self.misses += 1
+        return None, watermark
+
+    def store(self, key: tuple, watermark, value):
+        with self._lock:
+            # Don't cache under a watermark that has already been superseded
+            if watermark == self._watermark:
+                self._entries[key] = (watermark, time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._watermark = None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+analytics_cache = ResponseCache()
+
+def cache_key(endpoint: str, keywords: List[str], *args) -> tuple:
+    """Key on the normalized keyword filter so order/duplicates/'All' spellings share an entry."""
+    kw_sql, kw_params = build_keyword_filter(keywords)
+    return (endpoint, kw_sql, tuple(kw_params)) + args
+
+
+# --- Conditional GET ---
+# Read endpoints carry a weak ETag derived from the data they are computed from (the response cache
+# watermark, or saved_rules_version for /api/rules) plus the route and normalized query string. The
+# validator is checked in a dependency, before the endpoint body runs, so a matching If-None-Match
+# is answered with a bare 304 and none of the endpoint's SQL.
+HTTP_MAX_AGE = int(os.getenv("HTTP_MAX_AGE", "2"))  # seconds browsers/nginx may reuse a data response unchecked
+
+class NotModified(Exception):
+    def __init__(self, headers: Dict[str, str]):
+        self.headers = headers
+
+@app.exception_handler(NotModified)
+async def not_modified_handler(request: Request, exc: NotModified):
+    return Response(status_code=304, headers=exc.headers)
+
+@app.middleware("http")
+async def add_validators(request: Request, call_next):
+    response = await call_next(request)
+    validators = getattr(request.state, "validators", None)
+    if validators and response.status_code == 200:
+        response.headers.update(validators)
+    return response
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison (RFC 9110 13.1.2) against an If-None-Match list."""
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+def check_validators(request: Request, source: str, version, modified: Optional[datetime], cache_control: str):
+    """Raise NotModified if the client holds the current representation, else stage the headers for the 200."""
+    # Keyword lists are filters (order and repeats don't matter), so params are compared as a set
+    params = sorted(set(request.query_params.multi_items()))
+    digest = hashlib.sha1(repr((app.version, source, version, request.url.path, params)).encode("utf-8")).hexdigest()
+    headers = {"ETag": f'W/"{digest[:24]}"', "Cache-Control": cache_control}
+    if modified is not None:
+        headers["Last-Modified"] = email.utils.format_datetime(modified.replace(tzinfo=timezone.utc), usegmt=True)
+    if _etag_matches(request.headers.get("if-none-match", ""), headers["ETag"]):
+        metrics.inc("kwatch_http_not_modified_total", route=request.url.path)
+        raise NotModified(headers)
+    request.state.validators = headers
+
+metrics.describe("kwatch_http_not_modified_total", "counter", "Conditional GETs answered with 304 Not Modified.")
+
+# Validators check a connection out only for their own query and return it before the endpoint
+# runs, so a request never holds one connection while waiting for another (dashboard panels).
+def data_validators(request: Request, connect=Depends(get_read_connector)):
+    """For endpoints computed from kwatch_alert_results and its rollups."""
+    watermark = analytics_cache.fresh_watermark()
+    if watermark is None:
+        with connect() as conn:
+            watermark = analytics_cache.current_watermark(conn)
+            conn.rollback()
+    check_validators(request, "data", watermark, watermark[1], f"public, max-age={HTTP_MAX_AGE}")
+
+def rules_validators(request: Request, connect=Depends(get_connector)):
+    """For /api/rules: saved_rules_version is bumped by a trigger on every write, so never reuse unchecked."""
+    with connect() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT version, changed_at FROM saved_rules_version")
+            version, changed_at = cur.fetchone()
+        conn.rollback()
+    check_validators(request, "rules", version, changed_at, "no-cache")
 
 # --- Endpoints ---
 
@@ -169,22 +1852,100 @@ def health_check():
     """Verify that the API service is alive and healthy."""
     return {"status": "ok"}
 
+READY_DB_TIMEOUT = float(os.getenv("READY_DB_TIMEOUT", "1"))
+
+@app.get("/api/ready", tags=["Core"], summary="Readiness Probe")
+def readiness_check():
+    """
+    Whether this worker can serve traffic: 200 once the database answers and startup migrations
+    have finished, 503 before that. LLM and replica readiness are reported but don't gate the
+    status, since analytics keep working without them.
+    """
+    db = {"ready": False, "migrations": db_state.migrations, "attempts": db_state.attempts, "error": db_state.error}
+    pool = db_pool
+    if pool:
+        conn = None
+        try:
+            conn = pool.getconn(timeout=READY_DB_TIMEOUT)
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            db["ready"] = db_state.migrations not in ("pending", "running")
+        except Exception as e:
+            db["error"] = str(e).strip() or type(e).__name__
+        finally:
+            if conn is not None:
+                pool.putconn(conn)
+
+    llm = {"ready": llm_client() is not None, "mode": "fake" if OPENAI_FAKE else "openai", "model": OPENAI_MODEL}
+    if not llm["ready"]:
+        llm["error"] = "OPENAI_API_KEY is not set"
+    body = {"ready": db["ready"], "db": db, "llm": llm}
+    if DB_REPLICA_DSN:
+        # Reported only: reads fall back to the primary, so a lagging replica doesn't gate traffic
+        body["replica"] = replica_state.snapshot()
+    return JSONResponse(body, status_code=200 if db["ready"] else 503)
+
+@app.get("/api/pool/stats", tags=["Core"], summary="Connection Pool Stats")
+def pool_stats():
+    """In-use, idle and waiting gauges for the database connection pool(s)."""
+    return {
+        "sync": db_pool.stats() if db_pool else None,
+        "replica": dict(replica_state.snapshot(), pool=replica_pool.stats() if replica_pool else None),
+        "async": async_engine.stats() if async_engine else None,
+    }
+
+@app.get("/api/metrics", tags=["Core"], summary="Prometheus Metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Request, SQL, LLM and pool metrics in the Prometheus text exposition format."""
+    gauges = [("kwatch_db_query_info", {"query": fp, "sql": sql}, 1) for fp, sql in list(_query_fingerprints.items())]
+    for pool in (db_pool, replica_pool):
+        if pool:
+            gauges += [("kwatch_db_pool_connections", {"pool": pool.name, "state": k}, v) for k, v in pool.stats().items()]
+    if DB_REPLICA_DSN:
+        gauges.append(("kwatch_db_replica_healthy", {}, int(replica_state.healthy)))
+        if replica_state.lag is not None:
+            gauges.append(("kwatch_db_replica_lag_seconds", {}, replica_state.lag))
+    gauges += [("kwatch_feed_listener", {"state": k}, v) for k, v in mention_feed.stats().items()]
+    return PlainTextResponse(metrics.render(gauges), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/metrics/slow-queries", tags=["Core"], summary="Slow Query Log")
+def get_slow_queries():
+    """Most recent statements slower than SLOW_QUERY_MS, newest first, with normalized SQL and parameters."""
+    return {"threshold_ms": SLOW_QUERY_MS, "queries": list(reversed(slow_queries))}
+
+@app.get("/api/cache/stats", tags=["Core"], summary="Response Cache Stats")
+def cache_stats():
+    """Hit/miss/eviction counters for the analytics response cache."""
+    return analytics_cache.stats()
+
 # ... (Existing /api/keywords) ...
 
-@app.get("/api/keywords", response_model=List[KeywordStats], tags=["Analytics"], summary="Get Keywords")
-def get_keywords(conn=Depends(get_db_connection)):
+@app.get("/api/keywords", response_model=List[KeywordStats], tags=["Analytics"], summary="Get Keywords", dependencies=[Depends(data_validators)])
+@fast_json
+def get_keywords(
+    start: Optional[str] = Query(None, description="Start date (ISO 8601, day granularity)"),
+    end: Optional[str] = Query(None, description="End date (ISO 8601, day granularity)"),
+    conn=Depends(get_read_connection)
+):
     """
     Fetch all monitored drug keywords and their mention counts.
     Returns a list of keywords sorted by frequency, including a special 'All' entry for aggregation.
     """
+    key = cache_key("keywords", ["All"], start, end)
+    cached, watermark = analytics_cache.lookup(conn, key)
+    if cached is not None:
+        return cached
+
+    date_sql, date_params = build_rollup_date_filter(start, end)
     with conn.cursor(cursor_factory=extras.RealDictCursor) as cur:
         cur.execute("""
-            SELECT keyword, COUNT(*) as count 
-            FROM kwatch_alert_results 
-            WHERE keyword IS NOT NULL AND author != 'AutoModerator'
+            SELECT keyword, SUM(count)::bigint as count 
+            FROM kwatch_daily_rollup 
+            WHERE keyword != ''""" + date_sql + """
             GROUP BY keyword 
             ORDER BY count DESC
-        """)
+        """, tuple(date_params))
         results = cur.fetchall()
         
         # Add "All" option
@@ -192,15 +1953,16 @@ def get_keywords(conn=Depends(get_db_connection)):
         response = [{"keyword": "All", "count": total}]
         # Map DB results
         response.extend([{"keyword": r['keyword'], "count": r['count']} for r in results])
-        return response
+        return analytics_cache.store(key, watermark, response)
 
 def build_keyword_filter(keywords: List[str]):
     """Helper to build SQL and params for keyword filtering."""
     if "All" in keywords or not keywords:
         return "", []
     
-    # Filter keywords (exclude 'All' if it's there but others are too)
-    clean_keywords = [k for k in keywords if k != "All"]
+    # Filter keywords (exclude 'All' if it's there but others are too).
+    # Sorted and de-duplicated so equivalent selections produce identical SQL params.
+    clean_keywords = sorted(set(k for k in keywords if k != "All"))
     if not clean_keywords:
         return "", []
 
@@ -208,64 +1970,1137 @@ def build_keyword_filter(keywords: List[str]):
     params = [tuple(clean_keywords)]
     return sql, params
 
-@app.get("/api/mentions", tags=["Data"], summary="Get Mentions")
+# --- Mention Pagination ---
+MENTIONS_TOTAL_TTL = int(os.getenv("MENTIONS_TOTAL_TTL", "300"))
+
+# (keywords, start, end) -> (expires_at, total). Shared by every page of a scroll session.
+_mention_totals: Dict[tuple, tuple] = {}
+_mention_totals_lock = threading.Lock()
+
+def encode_cursor(sort_key, tiebreak) -> str:
+    """
+    Build an opaque keyset cursor from the last row of a page: sort key is received_at (None for an
+    undated mention), a search rank or an author's mention count; the tiebreak is the mention id or
+    the author name.
+    """
+    if isinstance(sort_key, datetime):
+        sort_key = sort_key.isoformat()
+    raw = json.dumps([sort_key, tiebreak]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, kind: str = "date"):
+    """Inverse of encode_cursor. Raises 400 on tampered or malformed cursors."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_key, tiebreak = json.loads(base64.urlsafe_b64decode(padded))
+        if kind == "count":
+            if not isinstance(tiebreak, str):
+                raise ValueError("author cursor without an author")
+            return int(sort_key), tiebreak
+        if kind == "rank":
+            sort_key = float(sort_key)
+        elif sort_key is not None:
+            sort_key = datetime.fromisoformat(sort_key)
+        return sort_key, int(tiebreak)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# Newest first, undated mentions last; matches the (received_at DESC NULLS LAST, id DESC) indexes
+MENTION_ORDER = " ORDER BY received_at DESC NULLS LAST, id DESC"
+
+def mentions_after_cursor(select_sql: str, params: List, cursor: str, limit: int):
+    """
+    Narrow select_sql (a SELECT over kwatch_alert_results ending in its WHERE filters) to the rows
+    after a date cursor; the caller appends MENTION_ORDER and the LIMIT. Past a dated row the rest
+    of the dated rows and the undated ones are read as two index ranges of at most limit rows each,
+    since one OR over both would stop the index from serving the order.
+    """
+    last_received_at, last_id = decode_cursor(cursor)
+    if last_received_at is None:
+        return select_sql + " AND received_at IS NULL AND id < %s", list(params) + [last_id]
+    sql = (
+        f"SELECT * FROM (({select_sql} AND (received_at, id) < (%s, %s){MENTION_ORDER} LIMIT %s)"
+        f" UNION ALL ({select_sql} AND received_at IS NULL{MENTION_ORDER} LIMIT %s)) after_cursor"
+    )
+    return sql, list(params) + [last_received_at, last_id, limit] + list(params) + [limit]
+
+def build_mention_filters(keywords: List[str], start: Optional[str], end: Optional[str]):
+    """Keyword + date range WHERE fragment shared by the mention page and total queries."""
+    sql, params = build_keyword_filter(keywords)
+    params = list(params)
+    if start:
+        sql += " AND received_at >= %s"
+        params.append(start)
+    if end:
+        sql += " AND received_at <= %s"
+        params.append(end)
+    return sql, params
+
+def count_mentions(cur, filter_sql: str, filter_params: List, mode: str = "exact"):
+    """
+    Total rows for a mention filter set.
+    'exact' is computed once per (keywords, start, end) and reused for MENTIONS_TOTAL_TTL seconds,
+    'approximate' reads the planner's row estimate, 'none' skips counting.
+    """
+    if mode == "none":
+        return None
+
+    count_query = "SELECT COUNT(*) AS count FROM kwatch_alert_results WHERE author != 'AutoModerator'" + filter_sql
+    if mode == "approximate":
+        cur.execute("EXPLAIN (FORMAT JSON) " + count_query, tuple(filter_params))
+        plan = cur.fetchone()
+        plan = plan["QUERY PLAN"] if isinstance(plan, dict) else plan[0]
+        # The Aggregate node always estimates 1 row; its child carries the filtered row estimate.
+        node = plan[0]["Plan"]
+        while node.get("Plans") and node.get("Node Type") == "Aggregate":
+            node = node["Plans"][0]
+        return int(node.get("Plan Rows", 0))
+
+    key = (filter_sql, tuple(filter_params))
+    now = time.monotonic()
+    with _mention_totals_lock:
+        cached = _mention_totals.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+    cur.execute(count_query, tuple(filter_params))
+    row = cur.fetchone()
+    total = row["count"] if isinstance(row, dict) else row[0]
+
+    with _mention_totals_lock:
+        _mention_totals[key] = (now + MENTIONS_TOTAL_TTL, total)
+        # Expired entries are only dropped here so the cache cannot grow unbounded
+        for k in [k for k, (exp, _) in _mention_totals.items() if exp <= now]:
+            del _mention_totals[k]
+    return total
+
+@app.get("/api/mentions", tags=["Data"], summary="Get Mentions", dependencies=[Depends(data_validators)])
+@fast_json
 def get_mentions(
     keyword: List[str] = Query(["All"], description="Filter by one or more keywords"),
     start: str = Query(None, description="Start date (ISO 8601)"),
     end: str = Query(None, description="End date (ISO 8601)"),
     limit: int = Query(50, ge=1, le=200, description="Paginated page size"),
-    offset: int = Query(0, ge=0, description="Pagination offset"),
+    offset: int = Query(0, ge=0, description="Pagination offset (ignored when cursor is provided)"),
+    cursor: Optional[str] = Query(None, description="Opaque keyset cursor returned as next_cursor by the previous page"),
+    count: str = Query("exact", pattern="^(exact|approximate|none)$", description="Total mode: exact (cached per filter set), approximate (planner estimate) or none"),
     include_raw: bool = Query(False, description="Whether to include raw payload in response"),
-    conn=Depends(get_db_connection)
+    conn=Depends(get_read_connection)
 ):
     """
     Retrieve a paginated list of social media mentions filtered by keyword and date range.
     Automatically excludes 'AutoModerator' and other bot content.
+    Pass the returned next_cursor back as cursor to page in constant time regardless of depth.
     """
-    query = "SELECT id, author, content, received_at, url, sentiment, keyword FROM kwatch_alert_results WHERE author != 'AutoModerator'"
-    params = []
+    # Only the first page is cached; deeper pages are cheap under keyset pagination anyway
+    first_page = not cursor and offset == 0
+    if first_page:
+        key = cache_key("mentions", keyword, start, end, limit, count)
+        cached, watermark = analytics_cache.lookup(conn, key)
+        if cached is not None:
+            return cached
 
-    kw_sql, kw_params = build_keyword_filter(keyword)
-    query += kw_sql
-    params.extend(kw_params)
-    
-    if start:
-        query += " AND received_at >= %s"
-        params.append(start)
-    if end:
-        query += " AND received_at <= %s"
-        params.append(end)
+    filter_sql, filter_params = build_mention_filters(keyword, start, end)
 
-    query += " ORDER BY received_at DESC LIMIT %s OFFSET %s"
-    params.extend([limit, offset])
+    query = "SELECT id, author, content, received_at, url, sentiment, keyword FROM kwatch_alert_results WHERE author != 'AutoModerator'"
+    query += filter_sql
+    params = list(filter_params)
 
-    with conn.cursor(cursor_factory=extras.RealDictCursor) as cur:
+    if cursor:
+        query, params = mentions_after_cursor(query, params, cursor, limit)
+        query += MENTION_ORDER + " LIMIT %s"
+        params.append(limit)
+    else:
+        query += MENTION_ORDER + " LIMIT %s OFFSET %s"
+        params.extend([limit, offset])
+
+    with conn.cursor() as cur:
         # Get total count for these filters
-        count_query = "SELECT COUNT(*) FROM kwatch_alert_results WHERE author != 'AutoModerator'" + kw_sql
-        cur.execute(count_query, tuple(kw_params))
-        total_count = cur.fetchone()['count']
+        total_count = count_mentions(cur, filter_sql, filter_params, count)
 
-        # Get actual mentions
+        # Get actual mentions; plain tuples, dates are left for the JSON encoder
         cur.execute(query, tuple(params))
         rows = cur.fetchall()
-        
-        results = []
-        for row in rows:
-            results.append({
-                "id": row['id'],
-                "author": row['author'],
-                "content": row['content'],
-                "date": row['received_at'].isoformat() if row['received_at'] else None,
-                "url": row['url'],
-                "sentiment": row['sentiment'] or 'neutral',
-                "keyword": row['keyword'],
+        results = [
+            {
+                "id": r[0],
+                "author": r[1],
+                "content": r[2],
+                "date": r[3],
+                "url": r[4],
+                "sentiment": r[5] or 'neutral',
+                "keyword": r[6],
                 "source": "Reddit"
-            })
-            
-        return {"total": total_count, "page": offset // limit, "mentions": results}
+            }
+            for r in rows
+        ]
+
+        next_cursor = None
+        if len(rows) == limit:
+            next_cursor = encode_cursor(rows[-1][3], rows[-1][0])
+
+        response = {
+            "total": total_count,
+            "page": None if cursor else offset // limit,
+            "mentions": results,
+            "next_cursor": next_cursor
+        }
+        if first_page:
+            analytics_cache.store(key, watermark, response)
+        return response
+
+# --- Search ---
+@app.get("/api/search", tags=["Data"], summary="Search Mentions", dependencies=[Depends(data_validators)])
+@fast_json
+def search_mentions(
+    q: str = Query(..., min_length=1, description="Search text (web search syntax: quotes, OR, -exclude)"),
+    keyword: List[str] = Query(["All"], description="Filter by one or more keywords"),
+    start: Optional[str] = Query(None, description="Start date (ISO 8601)"),
+    end: Optional[str] = Query(None, description="End date (ISO 8601)"),
+    sort: str = Query("relevance", pattern="^(relevance|recent)$", description="relevance (ts_rank) or recent (received_at)"),
+    limit: int = Query(50, ge=1, le=200, description="Paginated page size"),
+    cursor: Optional[str] = Query(None, description="Opaque keyset cursor returned as next_cursor by the previous page"),
+    count: str = Query("exact", pattern="^(exact|approximate|none)$", description="Total mode, as for /api/mentions"),
+    conn=Depends(get_read_connection)
+):
+    """
+    Full-text search over mention content using the GIN-indexed content_tsv column,
+    combined with the usual keyword/date filters. Results carry a rank and a
+    highlighted snippet (<mark>...</mark>) and page with the same keyset cursors as /api/mentions.
+    """
+    filter_sql, filter_params = build_mention_filters(keyword, start, end)
+    filter_sql = f" AND content_tsv @@ websearch_to_tsquery('{SEARCH_TS_CONFIG}', %s)" + filter_sql
+    filter_params = [q] + filter_params
+
+    rank_sql = f"ts_rank_cd(content_tsv, websearch_to_tsquery('{SEARCH_TS_CONFIG}', %s))::float8"
+    page_query = (
+        f"SELECT id, author, content, received_at, url, sentiment, keyword, {rank_sql} AS rank "
+        "FROM kwatch_alert_results WHERE author != 'AutoModerator'" + filter_sql
+    )
+    params = [q] + filter_params
+
+    if sort == "relevance":
+        order = " ORDER BY rank DESC, id DESC"
+        if cursor:
+            last_rank, last_id = decode_cursor(cursor, "rank")
+            page_query += f" AND ({rank_sql}, id) < (%s, %s)"
+            params.extend([q, last_rank, last_id])
+    else:
+        order = MENTION_ORDER
+        if cursor:
+            page_query, params = mentions_after_cursor(page_query, params, cursor, limit)
+    page_query += order + " LIMIT %s"
+    params.append(limit)
+
+    # Snippets are only generated for the rows on the page
+    query = f"""
+        SELECT id, author, content, received_at, url, sentiment, keyword, rank,
+               ts_headline('{SEARCH_TS_CONFIG}', COALESCE(content, ''), websearch_to_tsquery('{SEARCH_TS_CONFIG}', %s),
+                           'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=30, MinWords=10') AS snippet
+        FROM ({page_query}) page
+    """ + order
+    params = [q] + params
+
+    with conn.cursor() as cur:
+        total_count = count_mentions(cur, filter_sql, filter_params, count)
+        cur.execute(query, tuple(params))
+        rows = cur.fetchall()
+        results = [
+            {
+                "id": r[0],
+                "author": r[1],
+                "content": r[2],
+                "date": r[3],
+                "url": r[4],
+                "sentiment": r[5] or 'neutral',
+                "keyword": r[6],
+                "source": "Reddit",
+                "rank": r[7],
+                "snippet": r[8]
+            }
+            for r in rows
+        ]
+
+        next_cursor = None
+        if len(rows) == limit:
+            last = rows[-1]
+            if sort == "relevance":
+                next_cursor = encode_cursor(last[7], last[0])
+            else:
+                next_cursor = encode_cursor(last[3], last[0])
+
+        return {"total": total_count, "results": results, "next_cursor": next_cursor}
+
+# --- Bulk Export ---
+EXPORT_ITERSIZE = int(os.getenv("EXPORT_ITERSIZE", "5000"))
+EXPORT_COLUMNS = ["id", "author", "content", "date", "url", "sentiment", "keyword", "source"]
+
+def _export_chunks(query: str, params: tuple, fmt: str):
+    """
+    Yield one encoded chunk per server-side cursor batch. The connection is checked out on the first
+    step and released when the generator finishes or is closed, so nothing is held before it runs.
+    """
+    with read_connection() as conn:
+        with conn.cursor(name=f"export_{uuid.uuid4().hex}") as cur:
+            cur.itersize = EXPORT_ITERSIZE
+            cur.execute(query, params)
+            if fmt == "csv":
+                buf = io.StringIO()
+                writer = csv.writer(buf)
+                writer.writerow(EXPORT_COLUMNS)
+                yield buf.getvalue()
+            while True:
+                rows = cur.fetchmany(EXPORT_ITERSIZE)
+                if not rows:
+                    break
+                if fmt == "csv":
+                    buf = io.StringIO()
+                    writer = csv.writer(buf)
+                    for r in rows:
+                        writer.writerow([r[0], r[1], r[2], r[3].isoformat() if r[3] else None, r[4], r[5] or 'neutral', r[6], "Reddit"])
+                    yield buf.getvalue()
+                else:
+                    yield b"".join(
+                        dumps_json({
+                            "id": r[0],
+                            "author": r[1],
+                            "content": r[2],
+                            "date": r[3],
+                            "url": r[4],
+                            "sentiment": r[5] or 'neutral',
+                            "keyword": r[6],
+                            "source": "Reddit"
+                        }) + b"\n"
+                        for r in rows
+                    )
+
+@app.get("/api/mentions/export", tags=["Data"], summary="Export Mentions")
+def export_mentions(
+    keyword: List[str] = Query(["All"], description="Filter by one or more keywords"),
+    start: Optional[str] = Query(None, description="Start date (ISO 8601)"),
+    end: Optional[str] = Query(None, description="End date (ISO 8601)"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="ndjson or csv"),
+):
+    """
+    Stream every mention matching the filters as NDJSON or CSV.
+    Rows are read through a named server-side cursor in EXPORT_ITERSIZE batches,
+    so memory use is the same for 1k or 10M rows.
+    """
+    filter_sql, filter_params = build_mention_filters(keyword, start, end)
+    query = (
+        "SELECT id, author, content, received_at, url, sentiment, keyword FROM kwatch_alert_results WHERE author != 'AutoModerator'"
+        + filter_sql
+        + MENTION_ORDER
+    )
+
+    # The first chunk is read here, so a busy pool (503) or a failing query surfaces before any bytes
+    # are sent; from then on the generator owns the connection. Closing it once the response is over
+    # releases the connection even if the client went away mid-stream.
+    chunks = _export_chunks(query, tuple(filter_params), format)
+    first = next(chunks, None)
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"mentions-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{format}"
+    return StreamingResponse(
+        itertools.chain([] if first is None else [first], chunks),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        background=BackgroundTask(chunks.close)
+    )
+
+# --- Bulk Ingestion ---
+# Batches are COPY'd into a temp staging table and merged with one INSERT ... SELECT, so a backfill
+# costs one round trip per batch instead of one INSERT per alert. Run from the shell with
+# `python api_service.py ingest alerts.ndjson` (streams files of any size) or POST to /api/ingest.
+INGEST_COLUMNS = ("id", "date_text", "author", "url", "content", "sentiment", "received_at", "kwatch_query", "keyword")
+INGEST_MAX_BYTES = int(os.getenv("INGEST_MAX_BYTES", str(256 * 1024 * 1024)))  # per HTTP request
+INGEST_TOKEN = os.getenv("INGEST_TOKEN")  # /api/ingest requires a matching X-Ingest-Token header, and is off while unset
+INGEST_SPOOL_BYTES = 8 * 1024 * 1024  # request bodies past this are spooled to a temp file, not held in memory
+INGEST_LOCK_ID = 7310003  # pg advisory lock key, one merge at a time so two batches can't both insert a url
+
+metrics.describe("kwatch_ingest_rows_total", "counter", "Ingested alert rows by outcome (inserted, duplicate, rejected).")
+
+INGEST_STAGING_TABLE = """
+    CREATE TEMP TABLE kwatch_ingest_staging (
+        id BIGINT,
+        date_text TEXT,
+        author TEXT,
+        url TEXT,
+        content TEXT,
+        sentiment TEXT,
+        received_at TIMESTAMP,
+        kwatch_query TEXT,
+        keyword TEXT
+    ) ON COMMIT DROP
+"""
+
+# Staged rows whose url (and id, when given) isn't stored yet, first occurrence per url. Ids from the
+# input are only matched against: new rows take fresh serial ids, so they always land above the
+# rollup watermarks, and are inserted oldest first to keep id order close to received_at order.
+INGEST_MERGE = """
+    WITH fresh AS (
+        SELECT DISTINCT ON (s.url) s.*
+        FROM kwatch_ingest_staging s
+        WHERE s.url IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM kwatch_alert_results a WHERE a.url = s.url)
+          AND (s.id IS NULL OR NOT EXISTS (SELECT 1 FROM kwatch_alert_results a WHERE a.id = s.id))
+        ORDER BY s.url, s.received_at
+    ), inserted AS (
+        INSERT INTO kwatch_alert_results (date_text, author, url, content, sentiment, received_at, kwatch_query, keyword)
+        SELECT date_text, author, url, content, sentiment, received_at, kwatch_query, keyword
+        FROM fresh
+        ORDER BY received_at, url
+        RETURNING id
+    )
+    SELECT (SELECT COUNT(*) FROM kwatch_ingest_staging),
+           (SELECT COUNT(*) FROM kwatch_ingest_staging WHERE url IS NULL),
+           COUNT(*), MAX(id)
+    FROM inserted
+"""
+
+class IngestError(ValueError):
+    """A malformed batch; the endpoint reports it as a 400."""
+
+class NdjsonCopySource:
+    """File-like view of NDJSON lines as COPY csv text, converted chunk by chunk as copy_expert reads."""
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self._out = io.StringIO()
+        self._writer = csv.writer(self._out)
+        self.line_no = 0
+
+    @staticmethod
+    def _field(value):
+        # Unquoted empty fields load as NULL
+        if value is None:
+            return ""
+        if isinstance(value, (dict, list)):
+            return dumps_json(value).decode("utf-8")
+        return value
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or self._out.tell() < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self.line_no += 1
+            if not line.strip():
+                continue
+            try:
+                doc = json.loads(line)
+            except ValueError:
+                raise IngestError(f"line {self.line_no}: invalid JSON")
+            if not isinstance(doc, dict):
+                raise IngestError(f"line {self.line_no}: expected a JSON object")
+            self._writer.writerow([self._field(doc.get(c)) for c in INGEST_COLUMNS])
+        chunk = self._out.getvalue()
+        self._out.seek(0)
+        self._out.truncate()
+        return chunk
+
+def csv_copy_columns(stream) -> List[str]:
+    """Consume and validate the CSV header line; the rest of the stream is handed to COPY as-is."""
+    header = stream.readline()
+    if isinstance(header, bytes):
+        header = header.decode("utf-8-sig")
+    columns = [c.strip() for c in next(csv.reader([header]), [])]
+    unknown = [c for c in columns if c not in INGEST_COLUMNS]
+    if not columns or unknown or len(set(columns)) != len(columns):
+        raise IngestError(f"CSV header must name distinct columns from: {', '.join(INGEST_COLUMNS)}")
+    if "url" not in columns:
+        raise IngestError("CSV header must include url (used for deduplication)")
+    return columns
+
+def fold_ingested_rows(cur, upper_id: int, inserted: int) -> Dict[str, int]:
+    """
+    Advance the rollups over the ids just inserted, inside the caller's transaction, so the read
+    endpoints see the batch as soon as it commits. A rollup already further behind than one
+    refresh batch is left to the refresh loop rather than growing this transaction.
+    """
+    cur.execute("SELECT pg_advisory_xact_lock(%s)", (ROLLUP_LOCK_ID,))
+    advanced = {}
+    for name, fold in ROLLUP_FOLDS.items():
+        cur.execute("SELECT last_id FROM rollup_watermarks WHERE name = %s FOR UPDATE", (name,))
+        row = cur.fetchone()
+        if row is None or upper_id - row[0] > inserted + ROLLUP_BATCH_SIZE:
+            continue
+        fold(cur, row[0], upper_id)
+        note_id_gaps(cur, name, row[0], upper_id)
+        cur.execute(
+            "UPDATE rollup_watermarks SET last_id = %s, updated_at = CURRENT_TIMESTAMP WHERE name = %s",
+            (upper_id, name)
+        )
+        advanced[name] = upper_id
+    return advanced
+
+def ingest_alerts(conn, stream, fmt: str = "ndjson") -> Dict:
+    """
+    Load one NDJSON or CSV batch into kwatch_alert_results in a single transaction:
+    COPY into staging, one dedup merge on url/id, then the rollup watermarks.
+    """
+    started = time.perf_counter()
+    if fmt == "csv":
+        columns, source = csv_copy_columns(stream), stream
+    else:
+        columns, source = INGEST_COLUMNS, NdjsonCopySource(stream)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (INGEST_LOCK_ID,))
+            cur.execute(INGEST_STAGING_TABLE)
+            cur.copy_expert(f"COPY kwatch_ingest_staging ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", source)
+            cur.execute("ANALYZE kwatch_ingest_staging")
+            cur.execute(INGEST_MERGE)
+            received, rejected, inserted, upper_id = cur.fetchone()
+            rollups = fold_ingested_rows(cur, upper_id, inserted) if inserted else {}
+        conn.commit()
+    except psycopg2.DataError as e:
+        conn.rollback()
+        raise IngestError(str(e).strip().splitlines()[0])
+    except Exception:
+        conn.rollback()
+        raise
+
+    elapsed = time.perf_counter() - started
+    duplicates = received - inserted - rejected
+    for outcome, n in (("inserted", inserted), ("duplicate", duplicates), ("rejected", rejected)):
+        if n:
+            metrics.inc("kwatch_ingest_rows_total", n, outcome=outcome)
+    return {
+        "format": fmt,
+        "received": received,
+        "inserted": inserted,
+        "duplicates": duplicates,
+        "rejected": rejected,  # rows without a url
+        "seconds": round(elapsed, 3),
+        "rows_per_s": round(received / elapsed) if elapsed else None,
+        "rollups": rollups,
+    }
+
+@app.post("/api/ingest", tags=["Data"], summary="Bulk Ingest Alerts")
+async def ingest_batch(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$", description="Batch format; defaults to csv for a text/csv body, else ndjson"),
+):
+    """
+    Bulk-load alerts from an NDJSON or CSV (with header) request body. Rows already stored under
+    the same url or id are skipped; the response reports counts and rows per second.
+    Requires an X-Ingest-Token header matching INGEST_TOKEN; returns 403 while none is configured.
+    """
+    # Fail closed: without a configured token this would be an anonymous write path
+    if not INGEST_TOKEN:
+        raise HTTPException(status_code=403, detail="HTTP ingestion is disabled; set INGEST_TOKEN or use the CLI")
+    if not hmac.compare_digest(request.headers.get("x-ingest-token", ""), INGEST_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid ingest token")
+    if int(request.headers.get("content-length") or 0) > INGEST_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {INGEST_MAX_BYTES} bytes; split it or use the CLI")
+    fmt = format or ("csv" if "csv" in request.headers.get("content-type", "") else "ndjson")
+
+    with tempfile.SpooledTemporaryFile(max_size=INGEST_SPOOL_BYTES) as body:
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > INGEST_MAX_BYTES:
+                raise HTTPException(status_code=413, detail=f"Batch exceeds {INGEST_MAX_BYTES} bytes; split it or use the CLI")
+            body.write(chunk)
+        body.seek(0)
+
+        def load():
+            with pooled_connection() as conn:
+                return ingest_alerts(conn, body, fmt)
+
+        try:
+            return await asyncio.to_thread(load)
+        except IngestError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+# --- Sentiment Backfill ---
+# Offline labels for rows kwatch delivered without a sentiment: a drug-domain lexicon scored over
+# the tokenized content, vectorized with NumPy when it is installed (pure Python otherwise, same
+# labels). Run with `python api_service.py backfill-sentiment [--workers N]`; it resumes from the
+# 'sentiment_backfill' checkpoint in rollup_watermarks.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SENTIMENT_CHUNK_SIZE = int(os.getenv("SENTIMENT_CHUNK_SIZE", "20000"))  # rows read, scored and written per transaction
+SENTIMENT_WRITE_PAGE = 5000  # rows per UPDATE ... FROM (VALUES ...) statement
+SENTIMENT_THRESHOLD = 1.0  # |score| at or above this is positive/negative, anything smaller is neutral
+SENTIMENT_NEGATION_WINDOW = 3  # a negator flips lexicon terms up to this many tokens after it
+
+SENTIMENT_LEXICON = {
+    # Outcomes and experience
+    "great": 2, "amazing": 2, "love": 2, "best": 1.5, "happy": 1.5, "excited": 1.5, "grateful": 1.5,
+    "thankful": 1.5, "success": 1.5, "improved": 1.5, "improvement": 1.5, "helped": 1.5, "effective": 1.5,
+    "nsv": 1.5, "better": 1, "glad": 1, "works": 1, "working": 1, "helps": 1, "helping": 1, "progress": 1,
+    "recommend": 1, "confident": 1, "easier": 1, "relief": 1, "lost": 1, "losing": 1, "goal": 0.5, "energy": 0.5,
+    # Access and cost
+    "covered": 1, "approved": 1, "saved": 1,
+    "shortage": -1, "expensive": -1, "denied": -1.5,
+    # Side effects
+    "nausea": -1, "nauseous": -1, "diarrhea": -1, "constipation": -1, "constipated": -1, "headache": -1,
+    "headaches": -1, "fatigue": -1, "dizzy": -1, "heartburn": -1, "reflux": -1, "bloated": -1, "sulfur": -1,
+    "vomiting": -1.5, "vomit": -1.5, "pain": -1.5, "painful": -1.5, "sick": -1.5, "hospital": -1.5,
+    "pancreatitis": -2, "gastroparesis": -2, "tired": -0.5, "exhausted": -1, "burps": -0.5,
+    # Outcomes and mood
+    "worse": -1.5, "worst": -2, "awful": -2, "terrible": -2, "horrible": -2, "hate": -2, "bad": -1.5,
+    "regret": -1.5, "frustrated": -1.5, "frustrating": -1.5, "disappointed": -1.5, "depressed": -1.5,
+    "depression": -1.5, "anxiety": -1, "scared": -1, "worried": -1, "quit": -1, "gained": -1,
+    "plateau": -0.5, "stalled": -0.5, "stopped": -0.5,
+}
+SENTIMENT_NEGATORS = {
+    "not", "no", "never", "without", "hardly", "barely", "don't", "dont", "didn't", "didnt", "isn't", "isnt",
+    "wasn't", "wasnt", "can't", "cant", "won't", "wont", "haven't", "havent",
+}
+# Tokens are lowercased runs between whitespace and ASCII punctuation (apostrophes kept, curly ones
+# straightened), split as UTF-8 bytes: bytes.translate stays on its fast path whatever the content,
+# which str.translate doesn't once a chunk holds a single non-ASCII character.
+_SENTIMENT_PUNCTUATION = b"!\"#$%&()*+,-./:;<=>?@[\\]^_`{|}~"
+_SENTIMENT_SPLIT = bytes.maketrans(_SENTIMENT_PUNCTUATION, b" " * len(_SENTIMENT_PUNCTUATION))
+_SENTIMENT_SEPARATOR = "\0"  # never present in Postgres text
+
+def sentiment_tokens(text: Optional[str]) -> List[bytes]:
+    if not text:
+        return []
+    return text.lower().replace("\u2019", "'").encode("utf-8").translate(_SENTIMENT_SPLIT).split()
+
+class LexiconScorer:
+    """Sum of lexicon weights per text, with terms shortly after a negator counted with the opposite sign."""
+
+    def __init__(self, lexicon: Dict[str, float] = SENTIMENT_LEXICON, negators=SENTIMENT_NEGATORS,
+                 window: int = SENTIMENT_NEGATION_WINDOW, threshold: float = SENTIMENT_THRESHOLD):
+        self.window = window
+        self.threshold = threshold
+        self.weights = {w.encode("utf-8"): float(v) for w, v in lexicon.items()}
+        self.negators = frozenset(w.encode("utf-8") for w in negators)
+        # Token ids: 0 is "not in the vocabulary", then lexicon terms, negators and the text separator
+        vocab = list(self.weights) + sorted(self.negators - set(self.weights)) + [_SENTIMENT_SEPARATOR.encode()]
+        self.vocab = {w: i + 1 for i, w in enumerate(vocab)}
+        self._separator_id = len(vocab)
+        if np is not None:
+            self._weights = np.array([0.0] + [self.weights.get(w, 0.0) for w in vocab])
+            self._is_negator = np.array([False] + [w in self.negators for w in vocab])
+
+    def _score_python(self, texts: List[Optional[str]]) -> List[float]:
+        scores = []
+        for text in texts:
+            score, last_negator = 0.0, -self.window - 1
+            for i, token in enumerate(sentiment_tokens(text)):
+                if token in self.negators:
+                    last_negator = i
+                weight = self.weights.get(token)
+                if weight:
+                    score += -weight if i - last_negator <= self.window else weight
+            scores.append(score)
+        return scores
+
+    def _score_numpy(self, texts: List[Optional[str]]):
+        # Tokenize the whole chunk at once; a separator token opens every text, so the running
+        # count of separators is each token's text index.
+        sep = f" {_SENTIMENT_SEPARATOR} "
+        tokens = sentiment_tokens(sep + sep.join(t or "" for t in texts))
+        ids = np.fromiter(map(self.vocab.get, tokens, itertools.repeat(0)), dtype=np.int32, count=len(tokens))
+        doc = np.cumsum(ids == self._separator_id) - 1
+        is_negator = self._is_negator[ids]
+        negated = np.zeros(len(ids), dtype=bool)
+        for k in range(1, self.window + 1):
+            # A negator k tokens back, within the same text
+            negated[k:] |= is_negator[:-k] & (doc[k:] == doc[:-k])
+        weights = self._weights[ids]
+        return np.bincount(doc, weights=np.where(negated, -weights, weights), minlength=len(texts))
+
+    def score(self, texts: List[Optional[str]]):
+        if np is not None and texts:
+            return self._score_numpy(texts)
+        return self._score_python(texts)
+
+    def label(self, texts: List[Optional[str]]) -> List[str]:
+        scores = self.score(texts)
+        if np is not None and len(scores):
+            labels = np.where(scores >= self.threshold, "positive",
+                              np.where(scores <= -self.threshold, "negative", "neutral"))
+            return labels.tolist()
+        return ["positive" if s >= self.threshold else "negative" if s <= -self.threshold else "neutral" for s in scores]
+
+_default_scorer = None
+
+def classify_sentiment(texts: List[Optional[str]]) -> List[str]:
+    """Label texts with the default lexicon; module-level so process-pool workers can run it."""
+    global _default_scorer
+    if _default_scorer is None:
+        _default_scorer = LexiconScorer()
+    return _default_scorer.label(texts)
+
+# Writes labels for still-unlabeled rows and moves their already-folded counts out of the ''
+# sentiment bucket of the daily and hourly rollups. Rows above a rollup's watermark (or in one of its
+# gaps) are folded later with their new label. The caller holds ROLLUP_LOCK_ID so the watermarks
+# can't move in between.
+SENTIMENT_WRITE_BACK = """
+    WITH labeled AS (
+        UPDATE kwatch_alert_results AS a
+        SET sentiment = v.sentiment
+        FROM (VALUES %s) AS v(id, sentiment)
+        WHERE a.id = v.id AND a.sentiment IS NULL
+        RETURNING a.id, a.keyword, a.received_at, a.author, a.sentiment
+    ), moved AS (
+        SELECT COALESCE(keyword, '') AS keyword, COALESCE(DATE(received_at), '-infinity'::date) AS day,
+               sentiment, COUNT(*) AS count
+        FROM labeled
+        WHERE author != 'AutoModerator'
+          AND id <= (SELECT last_id FROM rollup_watermarks WHERE name = 'daily')
+          AND NOT EXISTS (SELECT 1 FROM rollup_gaps g WHERE g.name = 'daily' AND id BETWEEN g.lo AND g.hi)
+        GROUP BY 1, 2, 3
+    ), moved_hourly AS (
+        SELECT COALESCE(keyword, '') AS keyword, COALESCE(date_trunc('hour', received_at), '-infinity'::timestamp) AS hour,
+               sentiment, COUNT(*) AS count
+        FROM labeled
+        WHERE author != 'AutoModerator'
+          AND id <= (SELECT last_id FROM rollup_watermarks WHERE name = 'hourly')
+          AND NOT EXISTS (SELECT 1 FROM rollup_gaps g WHERE g.name = 'hourly' AND id BETWEEN g.lo AND g.hi)
+        GROUP BY 1, 2, 3
+    ), unlabeled AS (
+        UPDATE kwatch_daily_rollup AS r
+        SET count = r.count - m.count
+        FROM (SELECT keyword, day, SUM(count) AS count FROM moved GROUP BY 1, 2) m
+        WHERE r.keyword = m.keyword AND r.day = m.day AND r.sentiment = ''
+    ), unlabeled_hourly AS (
+        UPDATE kwatch_hourly_rollup AS r
+        SET count = r.count - m.count
+        FROM (SELECT keyword, hour, SUM(count) AS count FROM moved_hourly GROUP BY 1, 2) m
+        WHERE r.keyword = m.keyword AND r.hour = m.hour AND r.sentiment = ''
+    ), labeled_hourly AS (
+        INSERT INTO kwatch_hourly_rollup (keyword, hour, sentiment, count)
+        SELECT keyword, hour, sentiment, count FROM moved_hourly
+        ON CONFLICT (keyword, hour, sentiment)
+        DO UPDATE SET count = kwatch_hourly_rollup.count + EXCLUDED.count
+    )
+    INSERT INTO kwatch_daily_rollup (keyword, day, sentiment, count)
+    SELECT keyword, day, sentiment, count FROM moved
+    ON CONFLICT (keyword, day, sentiment)
+    DO UPDATE SET count = kwatch_daily_rollup.count + EXCLUDED.count
+"""
+
+def _fetch_unlabeled(conn, after_id: int, limit: int) -> List[tuple]:
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT id, content FROM kwatch_alert_results WHERE sentiment IS NULL AND id > %s ORDER BY id LIMIT %s",
+            (after_id, limit)
+        )
+        rows = cur.fetchall()
+    conn.commit()
+    return rows
+
+def _write_labels(conn, ids: List[int], labels: List[str]):
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (ROLLUP_LOCK_ID,))
+        extras.execute_values(cur, SENTIMENT_WRITE_BACK, list(zip(ids, labels)),
+                              template="(%s::bigint, %s::text)", page_size=SENTIMENT_WRITE_PAGE)
+        cur.execute(
+            "UPDATE rollup_watermarks SET last_id = %s, updated_at = CURRENT_TIMESTAMP WHERE name = 'sentiment_backfill'",
+            (ids[-1],)
+        )
+    conn.commit()
+
+def backfill_sentiment(conn, chunk_size: int = SENTIMENT_CHUNK_SIZE, workers: int = 0,
+                       limit: Optional[int] = None) -> Dict:
+    """
+    Label rows with a NULL sentiment, in id order from the checkpoint, one transaction per chunk.
+    With workers > 1 chunks are scored in a process pool while the next ones are fetched; labels
+    are still written (and the checkpoint advanced) in id order, so an interrupted run resumes cleanly.
+    """
+    started = time.perf_counter()
+    with conn.cursor() as cur:
+        cur.execute("SELECT last_id FROM rollup_watermarks WHERE name = 'sentiment_backfill'")
+        row = cur.fetchone()
+    conn.commit()
+    checkpoint = fetched_to = row[0] if row else 0
+    counts = {"positive": 0, "negative": 0, "neutral": 0}
+    fetched = labeled = 0
+    exhausted = False
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    pending = deque()
+    try:
+        while True:
+            while not exhausted and len(pending) < max(1, 2 * workers):
+                size = chunk_size if limit is None else min(chunk_size, limit - fetched)
+                rows = _fetch_unlabeled(conn, fetched_to, size) if size > 0 else []
+                if not rows:
+                    exhausted = True
+                    break
+                fetched += len(rows)
+                fetched_to = rows[-1][0]
+                ids, texts = [r[0] for r in rows], [r[1] for r in rows]
+                pending.append((ids, executor.submit(classify_sentiment, texts) if executor else classify_sentiment(texts)))
+            if not pending:
+                break
+            ids, labels = pending.popleft()
+            if executor:
+                labels = labels.result()
+            _write_labels(conn, ids, labels)
+            checkpoint = ids[-1]
+            labeled += len(ids)
+            for label in labels:
+                counts[label] += 1
+            print(f"Sentiment backfill: {labeled} rows labeled, checkpoint id {checkpoint}.")
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "labeled": labeled,
+        "labels": counts,
+        "checkpoint": checkpoint,
+        "engine": "numpy" if np is not None else "python",
+        "workers": max(1, workers),
+        "seconds": round(elapsed, 3),
+        "rows_per_s": round(labeled / elapsed) if elapsed else None,
+    }
+
+# --- Live Mention Feed ---
+# Dashboards subscribe to /api/mentions/stream instead of re-polling /api/mentions. A statement-level
+# trigger (migration 19) NOTIFYs FEED_CHANNEL once per INSERT; one listener thread per process then
+# reads the new rows once and fans them out to every subscriber whose keywords match. A subscriber
+# that falls more than FEED_QUEUE_SIZE rows behind drops its buffer and catches up from the table by
+# id, the same path a reconnecting EventSource takes with Last-Event-ID.
+FEED_CHANNEL = "kwatch_alerts"
+FEED_QUEUE_SIZE = int(os.getenv("FEED_QUEUE_SIZE", "500"))  # buffered rows per subscriber
+FEED_REPLAY_LIMIT = int(os.getenv("FEED_REPLAY_LIMIT", "1000"))  # rows a reconnecting client may catch up on
+FEED_HEARTBEAT = float(os.getenv("FEED_HEARTBEAT", "15"))  # seconds between keepalive comments
+FEED_POLL_INTERVAL = 1.0  # listener wakes this often to notice shutdown and idle
+FEED_FETCH_SIZE = 500
+FEED_GAP_TTL = float(os.getenv("FEED_GAP_TTL", "60"))  # seconds a skipped id may still commit and be streamed
+FEED_GAP_LIMIT = 10000  # skipped ids the listener watches at once, oldest dropped first
+FEED_RECENT_IDS = 4096  # ids a subscriber remembers sending, to tell a late commit from a repeat
+FEED_COLUMNS = "id, author, content, received_at, url, sentiment, keyword"
+
+metrics.describe("kwatch_feed_events_total", "counter", "Mention feed events sent to subscribers, by kind (mention, catch_up, reset).")
+metrics.describe("kwatch_feed_overflows_total", "counter", "Subscribers that fell FEED_QUEUE_SIZE rows behind and caught up from the table.")
+metrics.describe("kwatch_feed_listener", "gauge", "Mention feed listener gauges.")
+
+def fetch_mentions_after(cur, after_id: int, keywords: List[str], limit: int):
+    """Feed rows (FEED_COLUMNS tuples) with id > after_id in id order."""
+    kw_sql, kw_params = build_keyword_filter(keywords)
+    cur.execute(
+        f"SELECT {FEED_COLUMNS} FROM kwatch_alert_results "
+        f"WHERE author != 'AutoModerator' AND id > %s{kw_sql} ORDER BY id LIMIT %s",
+        [after_id] + kw_params + [limit]
+    )
+    return cur.fetchall()
+
+def fetch_mentions_by_id(cur, ids: List[int]):
+    """Feed rows (FEED_COLUMNS tuples) among ids in id order, AutoModerator included so those ids resolve too."""
+    cur.execute(f"SELECT {FEED_COLUMNS} FROM kwatch_alert_results WHERE id = ANY(%s) ORDER BY id", (ids,))
+    return cur.fetchall()
+
+def feed_event(row, resume: bool = True) -> str:
+    """
+    One SSE 'mention' event; the id line lets EventSource resume with Last-Event-ID. A late commit
+    below the stream's position is sent without one, so it doesn't move the resume point back.
+    """
+    payload = dumps_json({
+        "id": row[0],
+        "author": row[1],
+        "content": row[2],
+        "date": row[3].isoformat() if row[3] else None,
+        "url": row[4],
+        "sentiment": row[5] or 'neutral',
+        "keyword": row[6],
+        "source": "Reddit"
+    }).decode("utf-8")
+    id_line = f"id: {row[0]}\n" if resume else ""
+    return f"{id_line}event: mention\ndata: {payload}\n\n"
+
+class FeedSubscriber:
+    """
+    One open stream. The listener thread hands rows over with loop.call_soon_threadsafe(offer), so
+    the buffer is only touched on the subscriber's event loop. last_id is the highest id sent;
+    the last FEED_RECENT_IDS ids sent are remembered, since a late commit can arrive below it.
+    """
+
+    def __init__(self, loop, keywords: List[str], last_id: int):
+        self.loop = loop
+        self.keywords = keywords
+        _, kw_params = build_keyword_filter(keywords)
+        self.match = frozenset(kw_params[0]) if kw_params else None
+        self.last_id = last_id
+        self.sent = deque()
+        self.sent_ids = set()
+        self.buffer = deque()
+        self.overflowed = False
+        self.wake = asyncio.Event()
+
+    def offer(self, rows):
+        if not self.overflowed:
+            if len(self.buffer) + len(rows) > FEED_QUEUE_SIZE:
+                # Too slow to keep up: forget the backlog and re-read it from the table instead
+                self.overflowed = True
+                self.buffer.clear()
+                metrics.inc("kwatch_feed_overflows_total")
+            else:
+                self.buffer.extend(rows)
+        self.wake.set()
+
+    def remember(self, row_id: int) -> bool:
+        """Record row_id as sent; False if it already was."""
+        if row_id in self.sent_ids:
+            return False
+        self.sent.append(row_id)
+        self.sent_ids.add(row_id)
+        if len(self.sent) > FEED_RECENT_IDS:
+            self.sent_ids.discard(self.sent.popleft())
+        return True
+
+class MentionFeed:
+    """
+    The per-process LISTEN connection. Started by the first subscriber and stopped once the last
+    one leaves, so idle workers hold no extra database session.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._thread: Optional[threading.Thread] = None
+        self.last_id: Optional[int] = None
+        self.gaps: Dict[int, float] = {}  # ids skipped below last_id -> when noticed, oldest first
+        self.connected = False
+        self.notifications = 0
+        self.reconnects = 0
+        self.error: Optional[str] = None
+
+    def subscribe(self, sub: FeedSubscriber, head: int):
+        """Add a subscriber; head is the max id it read before subscribing, where a new listener starts."""
+        with self._lock:
+            self._subscribers.add(sub)
+            if self._thread is None:
+                self.last_id = head
+                self._thread = threading.Thread(target=self._run, name="mention-feed", daemon=True)
+                self._thread.start()
+
+    def unsubscribe(self, sub: FeedSubscriber):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "subscribers": len(self._subscribers),
+            "connected": int(self.connected),
+            "notifications": self.notifications,
+            "reconnects": self.reconnects,
+        }
+
+    def dispatch(self, rows):
+        """Hand rows to every subscriber whose keywords match; called on the listener thread."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            matched = rows if sub.match is None else [r for r in rows if r[6] in sub.match]
+            if not matched:
+                continue
+            try:
+                sub.loop.call_soon_threadsafe(sub.offer, matched)
+            except RuntimeError:  # event loop already closed
+                self.unsubscribe(sub)
+
+    def _idle(self) -> bool:
+        with self._lock:
+            if self._subscribers:
+                return False
+            self._thread = None  # under the lock, so the next subscribe() starts a fresh listener
+            return True
+
+    def _note_gaps(self, rows):
+        """Remember the ids skipped between last_id and rows (in id order): they may still commit."""
+        now = time.monotonic()
+        prev = self.last_id
+        for row in rows:
+            for missing in range(max(prev + 1, row[0] - FEED_GAP_LIMIT), row[0]):
+                self.gaps[missing] = now
+            prev = row[0]
+        while len(self.gaps) > FEED_GAP_LIMIT:
+            del self.gaps[next(iter(self.gaps))]
+
+    def _fill_gaps(self, conn):
+        """Send rows that committed into an earlier gap, and forget gaps older than FEED_GAP_TTL."""
+        cutoff = time.monotonic() - FEED_GAP_TTL
+        while self.gaps:
+            oldest = next(iter(self.gaps))
+            if self.gaps[oldest] >= cutoff:
+                break
+            del self.gaps[oldest]
+        if not self.gaps:
+            return
+        with conn.cursor() as cur:
+            rows = fetch_mentions_by_id(cur, list(self.gaps))
+        for row in rows:
+            del self.gaps[row[0]]
+        rows = [r for r in rows if r[1] != 'AutoModerator']
+        if rows:
+            self.dispatch(rows)
+
+    def _catch_up(self, conn):
+        """
+        Read everything past last_id, and any late commits into the gaps behind it (one query each
+        per notification, however many subscribers).
+        """
+        self._fill_gaps(conn)
+        while True:
+            with conn.cursor() as cur:
+                rows = fetch_mentions_after(cur, self.last_id, ["All"], FEED_FETCH_SIZE)
+            if rows:
+                self._note_gaps(rows)
+                self.last_id = rows[-1][0]
+                self.dispatch(rows)
+            if len(rows) < FEED_FETCH_SIZE:
+                return
+
+    def _listen(self, conn) -> bool:
+        """Serve notifications until shutdown (False) or until nobody is subscribed (True)."""
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {FEED_CHANNEL}")
+            if self.last_id is None:
+                cur.execute("SELECT COALESCE(MAX(id), 0) FROM kwatch_alert_results")
+                self.last_id = cur.fetchone()[0]
+        self.connected = True
+        # Rows committed while (re)connecting raised notifications nobody heard
+        self._catch_up(conn)
+        while not db_state.stop.is_set():
+            if self._idle():
+                return True
+            if select.select([conn], [], [], FEED_POLL_INTERVAL) == ([], [], []):
+                continue
+            conn.poll()
+            if conn.notifies:
+                self.notifications += len(conn.notifies)
+                conn.notifies.clear()
+                self._catch_up(conn)
+        return False
+
+    def _run(self):
+        backoff = DB_RETRY_INITIAL
+        while not db_state.stop.is_set():
+            conn = None
+            try:
+                # A dedicated session: LISTEN registrations don't survive being returned to the pool
+                conn = psycopg2.connect(
+                    host=DB_HOST, database=DB_NAME, user=DB_USER, password=DB_PASS, port=DB_PORT,
+                    connect_timeout=DB_CONNECT_TIMEOUT, keepalives=1, keepalives_idle=30,
+                    keepalives_interval=10, keepalives_count=3
+                )
+                self.error = None
+                backoff = DB_RETRY_INITIAL
+                if self._listen(conn):
+                    return
+            except Exception as e:
+                self.error = str(e).strip()
+                self.reconnects += 1
+                print(f"Mention feed listener error (retrying in {backoff:.0f}s): {self.error}")
+                db_state.stop.wait(backoff)
+                backoff = min(backoff * 2, DB_RETRY_MAX)
+                if self._idle():
+                    return
+            finally:
+                self.connected = False
+                if conn is not None:
+                    conn.close()
+        with self._lock:
+            self._thread = None
+
+mention_feed = MentionFeed()
+
+def _read_feed(after_id: Optional[int], keywords: List[str], limit: int):
+    """Rows past after_id for a subscriber catching up, or the newest id when after_id is None."""
+    with pooled_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                if after_id is None:
+                    cur.execute("SELECT COALESCE(MAX(id), 0) FROM kwatch_alert_results")
+                    return cur.fetchone()[0]
+                return fetch_mentions_after(cur, after_id, keywords, limit)
+        finally:
+            conn.rollback()
+
+@app.get("/api/mentions/stream", tags=["Data"], summary="Stream New Mentions")
+async def stream_mentions(
+    request: Request,
+    keyword: List[str] = Query(["All"]),
+    after_id: Optional[int] = Query(None, ge=0, description="Replay mentions after this id first (EventSource reconnects send Last-Event-ID instead)")
+):
+    """
+    Server-sent 'mention' events for new alerts matching the keywords, in id order. A client that
+    resumes more than FEED_REPLAY_LIMIT mentions behind gets a 'reset' event and should reload the
+    list; the stream then continues from the newest mention.
+    """
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        after_id = int(last_event_id)
+
+    # Read the head, subscribe, then catch up from it: a row committed in between arrives through
+    # the catch-up, the listener or both (events are de-duplicated by id), never through neither
+    head = await asyncio.to_thread(_read_feed, None, keyword, 0)
+    sub = FeedSubscriber(asyncio.get_running_loop(), keyword, head if after_id is None else after_id)
+    mention_feed.subscribe(sub, head)
+
+    async def catch_up(budget: int):
+        """Replay rows past sub.last_id from the table, or send 'reset' if there are more than budget."""
+        while True:
+            page = min(FEED_FETCH_SIZE, budget + 1)  # one extra row tells whether the budget suffices
+            rows = await asyncio.to_thread(_read_feed, sub.last_id, sub.keywords, page)
+            if len(rows) > budget:
+                break
+            for row in rows:
+                sub.last_id = row[0]
+                sub.remember(row[0])
+                yield feed_event(row)
+            metrics.inc("kwatch_feed_events_total", len(rows), kind="catch_up")
+            if len(rows) < page:
+                return
+            budget -= len(rows)
+        sub.last_id = await asyncio.to_thread(_read_feed, None, sub.keywords, 0)
+        metrics.inc("kwatch_feed_events_total", kind="reset")
+        yield f"event: reset\ndata: {dumps_json({'last_id': sub.last_id}).decode('utf-8')}\n\n"
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            async for event in catch_up(FEED_REPLAY_LIMIT):
+                yield event
+            while True:
+                try:
+                    await asyncio.wait_for(sub.wake.wait(), FEED_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                sub.wake.clear()
+                if sub.overflowed:
+                    sub.overflowed = False
+                    async for event in catch_up(FEED_REPLAY_LIMIT):
+                        yield event
+                sent = 0
+                while sub.buffer:
+                    row = sub.buffer.popleft()
+                    if row[0] > sub.last_id:
+                        sub.last_id = row[0]
+                        sub.remember(row[0])
+                        sent += 1
+                        yield feed_event(row)
+                    elif sub.remember(row[0]):  # committed late, below rows already sent
+                        sent += 1
+                        yield feed_event(row, resume=False)
+                if sent:
+                    metrics.inc("kwatch_feed_events_total", sent, kind="mention")
+        finally:
+            mention_feed.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # nginx: flush each event instead of buffering the response
+    })
 
-@app.get("/api/mentions/{mention_id}", tags=["Data"], summary="Get Single Mention")
-def get_mention_by_id(mention_id: int, conn=Depends(get_db_connection)):
+@app.get("/api/mentions/{mention_id}", tags=["Data"], summary="Get Single Mention", dependencies=[Depends(data_validators)])
+def get_mention_by_id(mention_id: int, conn=Depends(get_read_connection)):
     """Fetch a single mention by its ID."""
     with conn.cursor(cursor_factory=extras.RealDictCursor) as cur:
         cur.execute("SELECT id, author, content, received_at, url, sentiment, keyword FROM kwatch_alert_results WHERE id = %s", (mention_id,))
@@ -285,14 +3120,26 @@ def get_mention_by_id(mention_id: int, conn=Depends(get_db_connection)):
             "source": "Reddit"
         }
 
-@app.get("/api/stats/unique-authors", tags=["Analytics"], summary="Get Unique Author Count")
+@app.get("/api/stats/unique-authors", tags=["Analytics"], summary="Get Unique Author Count", dependencies=[Depends(data_validators)])
+@fast_json
 def get_unique_authors(
     keyword: List[str] = Query(["All"]),
     start: Optional[str] = Query(None),
     end: Optional[str] = Query(None),
-    conn=Depends(get_db_connection)
+    exact: bool = Query(False, description="Run COUNT(DISTINCT) on the raw table instead of merging HyperLogLog sketches (~2% error, day-granular dates)"),
+    conn=Depends(get_read_connection)
 ):
     """Returns the total number of distinct authors matching the provided filters."""
+    key = cache_key("unique-authors", keyword, start, end, exact)
+    cached, watermark = analytics_cache.lookup(conn, key)
+    if cached is not None:
+        return cached
+
+    if not exact:
+        with conn.cursor() as cur:
+            count = estimate_unique_authors(cur, keyword, start, end)
+        return analytics_cache.store(key, watermark, {"count": count, "estimated": True})
+
     query = "SELECT COUNT(DISTINCT author) as count FROM kwatch_alert_results WHERE author != 'AutoModerator'"
     params = []
 
@@ -309,91 +3156,342 @@ def get_unique_authors(
     with conn.cursor() as cur:
         cur.execute(query, tuple(params))
         result = cur.fetchone()
-        return {"count": result[0]}
+        return analytics_cache.store(key, watermark, {"count": result[0], "estimated": False})
 
-@app.get("/api/stats/authors", tags=["Analytics"], summary="Get Author Leadership List")
+@app.get("/api/stats/authors", tags=["Analytics"], summary="Get Author Leadership List", dependencies=[Depends(data_validators)])
+@fast_json
 def get_author_list(
     keyword: List[str] = Query(["All"]),
-    limit: int = Query(50),
-    offset: int = Query(0),
-    conn=Depends(get_db_connection)
+    start: Optional[str] = Query(None, description="Start date (ISO 8601, day granularity)"),
+    end: Optional[str] = Query(None, description="End date (ISO 8601, day granularity)"),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0, description="Pagination offset (ignored when cursor is provided)"),
+    cursor: Optional[str] = Query(None, description="Opaque keyset cursor returned as next_cursor by the previous page"),
+    exact: bool = Query(False, description="Exact distinct-author total instead of the sketch estimate"),
+    conn=Depends(get_read_connection)
 ):
-    """Retrieves a paginated list of authors with their respective mention counts."""
-    base_query = """
-        FROM kwatch_alert_results
-        WHERE author != 'AutoModerator'
     """
-    kw_sql, kw_params = build_keyword_filter(keyword)
-    base_query += kw_sql
-    
-    # Get total count
-    count_query = "SELECT COUNT(DISTINCT author) " + base_query
-    
-    # Get actual data
-    data_query = "SELECT author, COUNT(*) as count " + base_query + " GROUP BY author ORDER BY count DESC LIMIT %s OFFSET %s"
-    
-    with conn.cursor(cursor_factory=extras.RealDictCursor) as cur:
-        # Count total unique authors
-        cur.execute(count_query, tuple(kw_params))
-        total_count = cur.fetchone()['count']
-        
-        # Get paginated authors
-        params = list(kw_params) + [limit, offset]
-        cur.execute(data_query, tuple(params))
+    Retrieves authors ranked by mention count (ties by author), read from the leaderboard rollup.
+    Pass the returned next_cursor back as cursor to page without re-reading skipped authors.
+    """
+    key = cache_key("authors", keyword, start, end, limit, offset, cursor, exact)
+    cached, watermark = analytics_cache.lookup(conn, key)
+    if cached is not None:
+        return cached
+
+    ranking_sql, ranking_params = author_ranking_query(keyword, start, end)
+    query = "SELECT author, count FROM (" + ranking_sql + ") ranking"
+    params = list(ranking_params)
+    if cursor:
+        last_count, last_author = decode_cursor(cursor, kind="count")
+        query += " WHERE (count, author) < (%s, %s) ORDER BY count DESC, author DESC LIMIT %s"
+        params.extend([last_count, last_author, limit])
+    else:
+        query += " ORDER BY count DESC, author DESC LIMIT %s OFFSET %s"
+        params.extend([limit, offset])
+
+    with conn.cursor() as cur:
+        if exact:
+            cur.execute("SELECT COUNT(*) FROM (" + ranking_sql + ") ranking", tuple(ranking_params))
+            total_count = cur.fetchone()[0]
+        else:
+            total_count = estimate_unique_authors(cur, keyword, start, end)
+
+        cur.execute(query, tuple(params))
         rows = cur.fetchall()
-        
-        return {
-            "authors": [{"author": r['author'], "count": r['count']} for r in rows],
-            "total": total_count
-        }
 
-@app.get("/api/stats/counts-by-day", response_model=List[CountByDay], tags=["Analytics"], summary="Get Trends by Day")
+    next_cursor = encode_cursor(rows[-1][1], rows[-1][0]) if len(rows) == limit else None
+    return analytics_cache.store(key, watermark, {
+        "authors": [{"author": r[0], "count": r[1]} for r in rows],
+        "total": total_count,
+        "estimated": not exact,
+        "next_cursor": next_cursor
+    })
+
+@app.get("/api/stats/authors/top", tags=["Analytics"], summary="Get Top Authors per Keyword", dependencies=[Depends(data_validators)])
+@fast_json
+def get_top_authors(
+    keyword: List[str] = Query(["All"], description="Keywords to rank; All ranks every keyword"),
+    start: Optional[str] = Query(None, description="Start date (ISO 8601, day granularity)"),
+    end: Optional[str] = Query(None, description="End date (ISO 8601, day granularity)"),
+    n: int = Query(10, ge=1, le=100, description="Authors per keyword"),
+    conn=Depends(get_read_connection)
+):
+    """Returns the n most active authors of each keyword, in one query."""
+    key = cache_key("authors-top", keyword, start, end, n)
+    cached, watermark = analytics_cache.lookup(conn, key)
+    if cached is not None:
+        return cached
+
+    kw_sql, kw_params = build_keyword_filter(keyword)
+    if not start and not end:
+        # One index-ordered LIMIT per keyword against the all-time totals
+        query = """
+            SELECT k.keyword, t.author, t.count
+            FROM (SELECT DISTINCT keyword FROM kwatch_daily_rollup WHERE keyword != ''""" + kw_sql + """) k
+            CROSS JOIN LATERAL (
+                SELECT author, count FROM kwatch_author_totals
+                WHERE keyword = k.keyword
+                ORDER BY count DESC, author DESC LIMIT %s
+            ) t
+            ORDER BY k.keyword, t.count DESC, t.author DESC
+        """
+        params = list(kw_params) + [n]
+    else:
+        date_sql, date_params = build_rollup_date_filter(start, end)
+        query = """
+            SELECT keyword, author, count FROM (
+                SELECT keyword, author, SUM(count)::bigint AS count,
+                       ROW_NUMBER() OVER (PARTITION BY keyword ORDER BY SUM(count) DESC, author DESC) AS rank
+                FROM kwatch_author_daily
+                WHERE keyword != ''""" + kw_sql + date_sql + """
+                GROUP BY keyword, author
+            ) ranked
+            WHERE rank <= %s
+            ORDER BY keyword, rank
+        """
+        params = list(kw_params) + date_params + [n]
+
+    # Requested keywords without any authors in range still get an (empty) entry
+    top = {k: [] for k in (kw_params[0] if kw_params else ())}
+    with conn.cursor() as cur:
+        cur.execute(query, tuple(params))
+        for kw, author, count in cur.fetchall():
+            top.setdefault(kw, []).append({"author": author, "count": count})
+    return analytics_cache.store(key, watermark, {"keywords": top, "limit": n})
+
+# --- Time Buckets ---
+TIMESERIES_MAX_BUCKETS = int(os.getenv("TIMESERIES_MAX_BUCKETS", "5000"))  # per series, zero-filled
+# Bucket expression over the rollup each granularity reads (date_trunc weeks start on Monday)
+TIMESERIES_BUCKETS = {
+    "hour": ("kwatch_hourly_rollup", "hour"),
+    "day": ("kwatch_daily_rollup", "day"),
+    "week": ("kwatch_daily_rollup", "date_trunc('week', day)::date"),
+    "month": ("kwatch_daily_rollup", "date_trunc('month', day)::date"),
+}
+
+def bucket_start(value, granularity: str):
+    """Python counterpart of the bucket expressions above, for a date or datetime."""
+    if granularity == "hour":
+        if not isinstance(value, datetime):
+            value = datetime.combine(value, dt_time())
+        return value.replace(minute=0, second=0, microsecond=0)
+    if isinstance(value, datetime):
+        value = value.date()
+    if granularity == "week":
+        return value - timedelta(days=value.weekday())
+    if granularity == "month":
+        return value.replace(day=1)
+    return value
+
+def next_bucket(bucket, granularity: str):
+    if granularity == "hour":
+        return bucket + timedelta(hours=1)
+    if granularity == "week":
+        return bucket + timedelta(days=7)
+    if granularity == "month":
+        return (bucket.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return bucket + timedelta(days=1)
+
+def count_buckets(first, last, granularity: str) -> int:
+    if last < first:
+        return 0
+    if granularity == "month":
+        return (last.year - first.year) * 12 + last.month - first.month + 1
+    step = timedelta(hours=1) if granularity == "hour" else timedelta(days=7 if granularity == "week" else 1)
+    return (last - first) // step + 1
+
+def _parse_bound(value: Optional[str], name: str):
+    """ISO 8601 bound as a naive UTC datetime, the form the rollups store; offsets are converted."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} date")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+@app.get("/api/stats/counts-by-day", response_model=List[CountByDay], tags=["Analytics"], summary="Get Mention Trends", dependencies=[Depends(data_validators)])
+@fast_json
 def get_counts_by_day(
     keyword: List[str] = Query(["All"]),
-    conn=Depends(get_db_connection)
+    start: Optional[str] = Query(None, description="Start date (ISO 8601; day granularity except for hour buckets); required for hour buckets"),
+    end: Optional[str] = Query(None, description="End date (ISO 8601, inclusive; day granularity except for hour buckets)"),
+    granularity: str = Query("day", pattern="^(hour|day|week|month)$", description="Bucket size"),
+    group_by: Optional[str] = Query(None, pattern="^(keyword|sentiment)$", description="One series per keyword or sentiment, from a single query"),
+    fill: bool = Query(True, description="Zero-fill empty buckets between start (or the first bucket) and end (or the last)"),
+    conn=Depends(get_read_connection)
 ):
-    """Get frequency of mentions aggregated by calendar day useful for trend charts."""
-    query = """
-        SELECT DATE(received_at) as date, COUNT(*) as count 
-        FROM kwatch_alert_results 
-        WHERE author != 'AutoModerator'
     """
-    params = []
-    
-    kw_sql, kw_params = build_keyword_filter(keyword)
-    query += kw_sql
-    params.extend(kw_params)
+    Mention counts per time bucket, read from the hourly or daily rollup. With group_by every
+    series comes back in the same list, one row per (bucket, series) in date order.
+    start/end are applied at the rollup's grain: whole days for day, week and month buckets (a time
+    of day is ignored), whole hours for hour buckets.
+    """
+    first, last = _parse_bound(start, "start"), _parse_bound(end, "end")
+    # Bounds with an offset go to SQL converted too (a ::timestamp cast would just drop the offset)
+    if first is not None and datetime.fromisoformat(start).tzinfo is not None:
+        start = first.isoformat()
+    if last is not None and datetime.fromisoformat(end).tzinfo is not None:
+        end = last.isoformat()
+    if granularity == "hour" and first is None:
+        raise HTTPException(status_code=400, detail="Hour buckets need a start date")
+    if first is not None:
+        first = bucket_start(first, granularity)
+        bound = bucket_start(last or datetime.now(), granularity)
+        if count_buckets(first, bound, granularity) > TIMESERIES_MAX_BUCKETS:
+            raise HTTPException(status_code=400, detail=f"More than {TIMESERIES_MAX_BUCKETS} {granularity} buckets; narrow the range or use a coarser granularity")
+    if last is not None:
+        last = bucket_start(last, granularity)
 
-    query += " GROUP BY DATE(received_at) ORDER BY date ASC"
+    key = cache_key("counts-by-day", keyword, start, end, granularity, group_by, fill)
+    cached, watermark = analytics_cache.lookup(conn, key)
+    if cached is not None:
+        return cached
 
-    with conn.cursor(cursor_factory=extras.RealDictCursor) as cur:
+    table, bucket = TIMESERIES_BUCKETS[granularity]
+    series_sql = {
+        None: "",
+        "keyword": ", NULLIF(keyword, '') AS series",
+        "sentiment": ", COALESCE(NULLIF(sentiment, ''), 'unknown') AS series",
+    }[group_by]
+    # Undated alerts are kept in the rollups under '-infinity' for the totals but can't be charted
+    if granularity == "hour":
+        query = f"SELECT {bucket} AS date{series_sql}, SUM(count)::bigint AS count FROM {table} WHERE hour != '-infinity'::timestamp"
+        date_sql, date_params = build_hourly_date_filter(start, end)
+    else:
+        query = f"SELECT {bucket} AS date{series_sql}, SUM(count)::bigint AS count FROM {table} WHERE day != '-infinity'::date"
+        date_sql, date_params = build_rollup_date_filter(start, end)
+    kw_sql, kw_params = build_keyword_filter(keyword)
+    query += kw_sql + date_sql
+    params = list(kw_params) + date_params
+    query += " GROUP BY 1, 2 ORDER BY 1, 2" if group_by else " GROUP BY 1 ORDER BY 1"
+
+    with conn.cursor() as cur:
         cur.execute(query, tuple(params))
         rows = cur.fetchall()
-        return [{"date": str(row['date']), "count": row['count']} for row in rows]
 
-@app.get("/api/stats/sentiment", tags=["Analytics"], summary="Get Sentiment Distribution")
+    def as_bucket(value):
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        return bucket_start(value, granularity)
+
+    counts = {}
+    for row in rows:
+        series = row[1] if group_by else None
+        counts[(as_bucket(row[0]), series)] = row[-1]
+    points = list(counts)
+    if fill and (counts or first is not None):
+        series_keys = sorted({s for _, s in counts}, key=lambda s: (s is None, s or "")) if group_by else [None]
+        b = first if first is not None else min(b for b, _ in counts)
+        stop = last if last is not None else max([b] + [b for b, _ in counts])
+        points = []
+        while b <= stop:
+            points.extend((b, s) for s in series_keys)
+            b = next_bucket(b, granularity)
+
+    return analytics_cache.store(key, watermark, [
+        {
+            "date": b.isoformat(),
+            "count": counts.get((b, s), 0),
+            "sentiment": s if group_by == "sentiment" else None,
+            "keyword": s if group_by == "keyword" else None,
+        }
+        for b, s in points
+    ])
+
+@app.get("/api/stats/sentiment", tags=["Analytics"], summary="Get Sentiment Distribution", dependencies=[Depends(data_validators)])
+@fast_json
 def get_sentiment_groups(
     keyword: List[str] = Query(["All"]),
-    conn=Depends(get_db_connection)
+    start: Optional[str] = Query(None, description="Start date (ISO 8601, day granularity)"),
+    end: Optional[str] = Query(None, description="End date (ISO 8601, day granularity)"),
+    conn=Depends(get_read_connection)
 ):
     """Returns a mapping of sentiment labels to their respective frequency counts."""
-    query = "SELECT sentiment, COUNT(*) as count FROM kwatch_alert_results WHERE author != 'AutoModerator'"
+    key = cache_key("sentiment", keyword, start, end)
+    cached, watermark = analytics_cache.lookup(conn, key)
+    if cached is not None:
+        return cached
+
+    query = "SELECT NULLIF(sentiment, '') as sentiment, SUM(count)::bigint as count FROM kwatch_daily_rollup WHERE TRUE"
     params = []
 
     kw_sql, kw_params = build_keyword_filter(keyword)
     query += kw_sql
     params.extend(kw_params)
+
+    date_sql, date_params = build_rollup_date_filter(start, end)
+    query += date_sql
+    params.extend(date_params)
         
     query += " GROUP BY sentiment"
 
     with conn.cursor(cursor_factory=extras.RealDictCursor) as cur:
         cur.execute(query, tuple(params))
         rows = cur.fetchall()
-        return { (row['sentiment'] or 'unknown'): row['count'] for row in rows }
+        return analytics_cache.store(key, watermark, { (row['sentiment'] or 'unknown'): row['count'] for row in rows })
+
+# --- Dashboard ---
+DASHBOARD_WORKERS = int(os.getenv("DASHBOARD_WORKERS", "6"))
+
+# Shared across requests so concurrent dashboards can't fan out past DASHBOARD_WORKERS connections
+dashboard_executor = ThreadPoolExecutor(max_workers=DASHBOARD_WORKERS, thread_name_prefix="dashboard")
+
+def _run_panel(fn, **kwargs):
+    """Run one endpoint function on its own pooled (read) connection."""
+    with read_connection() as conn:
+        return getattr(fn, "__wrapped__", fn)(conn=conn, **kwargs)
+
+@app.get("/api/dashboard", tags=["Analytics"], summary="Get Dashboard Panels", dependencies=[Depends(data_validators)])
+@fast_json
+def get_dashboard(
+    keyword: List[str] = Query(["All"], description="Filter by one or more keywords"),
+    start: Optional[str] = Query(None, description="Start date (ISO 8601)"),
+    end: Optional[str] = Query(None, description="End date (ISO 8601)"),
+    mentions_limit: int = Query(50, ge=1, le=200, description="First mentions page size"),
+    authors_limit: int = Query(50, ge=1, le=200, description="First authors page size"),
+):
+    """
+    Returns every dashboard panel for one filter set in a single round trip.
+    Panels are queried concurrently on separate pooled connections; a failing panel
+    is reported under 'errors' instead of failing the whole response.
+    """
+    panels = {
+        "keywords": (get_keywords, dict(start=start, end=end)),
+        "unique_authors": (get_unique_authors, dict(keyword=keyword, start=start, end=end, exact=False)),
+        "counts_by_day": (get_counts_by_day, dict(
+            keyword=keyword, start=start, end=end, granularity="day", group_by=None, fill=True
+        )),
+        "sentiment": (get_sentiment_groups, dict(keyword=keyword, start=start, end=end)),
+        "authors": (get_author_list, dict(
+            keyword=keyword, start=start, end=end, limit=authors_limit, offset=0, cursor=None, exact=False
+        )),
+        "mentions": (get_mentions, dict(
+            keyword=keyword, start=start, end=end, limit=mentions_limit, offset=0,
+            cursor=None, count="exact", include_raw=False
+        )),
+    }
+    futures = {name: submit_in_context(dashboard_executor, _run_panel, fn, **kwargs) for name, (fn, kwargs) in panels.items()}
+
+    response = {"errors": {}}
+    for name, future in futures.items():
+        try:
+            response[name] = future.result()
+        except HTTPException as e:
+            response[name] = None
+            response["errors"][name] = e.detail
+        except Exception as e:
+            print(f"Dashboard panel '{name}' failed: {e}")
+            response[name] = None
+            response["errors"][name] = "Panel query failed"
+    return response
 
 # --- Rules CRUD ---
 
-@app.get("/api/rules", response_model=List[Rule], tags=["Rules"], summary="List Analysis Rules")
+@app.get("/api/rules", response_model=List[Rule], tags=["Rules"], summary="List Analysis Rules", dependencies=[Depends(rules_validators)])
 def get_rules(conn=Depends(get_db_connection)):
     """Fetch all persisted user analysis rules."""
     with conn.cursor(cursor_factory=extras.RealDictCursor) as cur:
@@ -417,14 +3515,17 @@ def create_or_update_rule(
                 "UPDATE saved_rules SET title = %s, instruction = %s, is_chaining = %s WHERE id = %s RETURNING id, title, instruction, is_chaining, created_at",
                 (rule.title, rule.instruction, rule.is_chaining, id)
             )
+            new_row = cur.fetchone()
+            # Stale translations of the old instruction must not be served for this rule
+            cur.execute("DELETE FROM llm_translation_cache WHERE rule_id = %s", (id,))
         else:
             # Create
             cur.execute(
                 "INSERT INTO saved_rules (title, instruction, is_chaining) VALUES (%s, %s, %s) RETURNING id, title, instruction, is_chaining, created_at",
                 (rule.title, rule.instruction, rule.is_chaining)
             )
+            new_row = cur.fetchone()
         conn.commit()
-        new_row = cur.fetchone()
         if not new_row:
              raise HTTPException(status_code=404, detail="Rule not found")
         return dict(new_row)
@@ -434,29 +3535,347 @@ def delete_rule(rule_id: int, conn=Depends(get_db_connection)):
     """Remove a rule from the database permanently."""
     with conn.cursor() as cur:
         cur.execute("DELETE FROM saved_rules WHERE id = %s", (rule_id,))
+        cur.execute("DELETE FROM llm_translation_cache WHERE rule_id = %s", (rule_id,))
         conn.commit()
     return {"status": "deleted", "id": rule_id}
 
-@app.post("/api/rules/execute", tags=["Rules"], summary="Execute Rule (ChatGPT)")
-def execute_rule(req: RuleExecuteRequest, conn=Depends(get_db_connection)):
+# --- Rule Execution ---
+READ_SYSTEM_PROMPT = r"""
+            You are a SQL Engineer for 'Drug Experience Explorer'.
+            Target Database: PostgreSQL. Table: kwatch_alert_results
+            Columns: id, author, content, sentiment, received_at, keyword, url
+            Goal: Convert the user's natural language request (starting with \Read) into a valid PostgreSQL SELECT query.
+            Rules:
+            - Respond ONLY with a valid JSON object: {"query": "SELECT ...", "explanation": "..."}
+            - Do not output markdown.
+            - Filter autogenerated content: author != 'AutoModerator'
+            - Use LIMIT if specified, otherwise default to 50.
+            """
+
+PROCESS_SYSTEM_PROMPT = r"""
+            You are a Data Analyst processing raw social media data.
+            Input: A JSON list of posts.
+            Instruction: A processing rule starting with \Process.
+            Goal: Analyze the input data based on the instruction and return a new JSON list.
+            Rules:
+            - Respond ONLY with a valid JSON object containing a key "result" which is the list of processed items.
+            - CRITICAL: You MUST preserve the 'id' field from the input for every item. Do not change, reformat, or generate new IDs. Use the exact ID from the input.
+            - Do not include items that don't match criteria if the instruction implies filtering.
+            - Example Output: {"result": [{"id": 12345, "author": "...", "weight_lost": 10}, ...]}
+            """
+
+GENERIC_SYSTEM_PROMPT = """
+            You are an expert Data Analyst and SQL Engineer for "Drug Experience Explorer" (DXE).
+            Target Database: PostgreSQL. Table: kwatch_alert_results
+            Columns: id, date_text, author, url, content, sentiment, received_at, kwatch_query, keyword
+            User's Current Application state: Selected Keywords: {keywords}
+            Rules:
+            - Respond ONLY with a valid JSON object.
+            - If instruction requires data retrieval, return: {{"type": "sql", "query": "SELECT ...", "explanation": "..."}}
+            - If instruction is analysis/text, return: {{"type": "text", "content": "...", "explanation": "..."}}
+            """
+
+def prompt_version(template: str) -> str:
+    """Short content hash of a system prompt; editing a prompt retires its cached translations."""
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:12]
+
+def llm_cache_key(mode: str, instruction: str, keywords: Optional[List[str]], version: str, model: str) -> str:
+    # Same normalization as build_keyword_filter so keyword order/duplicates don't split entries
+    _, kw_params = build_keyword_filter(keywords or ["All"])
+    raw = json.dumps([mode, instruction, list(kw_params[0]) if kw_params else ["All"], version, model])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def call_llm(system_prompt: str, user_prompt: str, timeout: Optional[float] = None) -> Dict:
+    """One JSON-mode chat completion, parsed."""
+    kwargs = {"timeout": timeout} if timeout else {}
+    t0 = time.perf_counter()
+    try:
+        response = llm_client().chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+            response_format={ "type": "json_object" },
+            **kwargs
+        )
+    finally:
+        elapsed = time.perf_counter() - t0
+        metrics.observe("kwatch_llm_request_duration_seconds", elapsed, model=OPENAI_MODEL)
+        record_phase("llm", elapsed)
+    return json.loads(response.choices[0].message.content)
+
+def translate_instruction(connect, rule_id: int, mode: str, instruction: str, keywords: Optional[List[str]],
+                          template: str, system_prompt: str, user_prompt: str, cacheable=lambda res: True,
+                          job=None):
     """
-    Executes a rule based on its instruction type (\Read, \Process, \Show).
-    Falls back to generic interpretation if no prefix is found.
+    LLM translation of a rule instruction, served from llm_translation_cache when the same
+    (instruction, keywords, prompt version, model) was translated before.
+    No database connection is held while waiting on the LLM.
+    Returns (gpt_res, cached).
+    """
+    key = llm_cache_key(mode, instruction, keywords, prompt_version(template), OPENAI_MODEL)
+    with connect() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE llm_translation_cache SET hits = hits + 1, last_used_at = CURRENT_TIMESTAMP WHERE cache_key = %s RETURNING response",
+                (key,)
+            )
+            row = cur.fetchone()
+        conn.commit()
+    if row:
+        return row[0], True
+
+    gpt_res = call_llm(system_prompt, user_prompt, timeout=job.remaining() if job else None)
+    if cacheable(gpt_res):
+        with connect() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO llm_translation_cache (cache_key, rule_id, mode, model, prompt_version, response)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (cache_key) DO UPDATE
+                    SET rule_id = EXCLUDED.rule_id, response = EXCLUDED.response, created_at = CURRENT_TIMESTAMP
+                """, (key, rule_id, mode, OPENAI_MODEL, prompt_version(template), extras.Json(gpt_res)))
+            conn.commit()
+    return gpt_res, False
+
+# --- Generated SQL Guard ---
+RULE_SQL_TIMEOUT_MS = int(os.getenv("RULE_SQL_TIMEOUT_MS", "15000"))
+RULE_SQL_MAX_COST = float(os.getenv("RULE_SQL_MAX_COST", "1000000"))  # planner cost units
+RULE_SQL_MAX_ROWS = int(os.getenv("RULE_SQL_MAX_ROWS", "5000"))
+RULE_SQL_MAX_PLAN_ROWS = int(os.getenv("RULE_SQL_MAX_PLAN_ROWS", "10000000"))  # planner row estimate, any plan node
+RULE_SQL_MAX_BYTES = int(os.getenv("RULE_SQL_MAX_BYTES", str(20 * 1024 * 1024)))
+RULE_SQL_FETCH_SIZE = int(os.getenv("RULE_SQL_FETCH_SIZE", "500"))
+
+class SqlGuardError(Exception):
+    """Generated SQL rejected before execution."""
+
+def guard_generated_sql(sql: Optional[str], max_rows: int) -> str:
+    """
+    Accept a single SELECT/WITH statement and wrap it in an outer LIMIT, whatever the LLM wrote.
+    Any ';' left after trimming trailing ones is refused: it could close the read-only
+    transaction and smuggle in a second statement.
+    """
+    if not sql or not sql.strip():
+        raise SqlGuardError("Query rejected: the model returned no SQL")
+    body = sql.strip().rstrip(";").strip()
+    if ";" in body:
+        raise SqlGuardError("Query rejected: only a single statement is allowed")
+    if not re.match(r"(?is)^(select|with)\b", body):
+        raise SqlGuardError("Query rejected: only SELECT queries are allowed")
+    # max_rows + 1 lets us tell a complete result from a truncated one
+    return f"SELECT * FROM (\n{body}\n) AS rule_query LIMIT {int(max_rows) + 1}"
+
+def explain_plan(cur, sql: str) -> Dict:
+    cur.execute("EXPLAIN (FORMAT JSON) " + sql)
+    row = cur.fetchone()
+    plan = row["QUERY PLAN"] if isinstance(row, dict) else row[0]
+    return plan[0]["Plan"]
+
+def run_generated_sql(connect, sql: str, job=None):
+    """
+    Execute LLM-generated SQL inside a sandbox: read-only transaction, statement timeout,
+    EXPLAIN cost and row-estimate gate, enforced outer LIMIT and a streamed fetch capped by rows and bytes.
+    In job mode the timeout is also bounded by the job deadline and the statement is cancellable.
+    Returns (rows, truncated).
+    """
+    guarded = guard_generated_sql(sql, RULE_SQL_MAX_ROWS)
+    timeout_ms = RULE_SQL_TIMEOUT_MS
+    if job:
+        timeout_ms = max(1, min(timeout_ms, int(job.remaining() * 1000)))
+
+    with connect() as conn:
+        # Start a fresh transaction so READ ONLY is its first statement
+        conn.rollback()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SET TRANSACTION READ ONLY")
+                cur.execute("SET LOCAL statement_timeout = %s", (timeout_ms,))
+                plan = explain_plan(cur, guarded)
+                cost = float(plan.get("Total Cost", 0))
+                if cost > RULE_SQL_MAX_COST:
+                    raise SqlGuardError(
+                        f"Query rejected: estimated cost {cost:,.0f} exceeds the budget of {RULE_SQL_MAX_COST:,.0f}. "
+                        "Try narrowing the keywords or date range."
+                    )
+                # The outer LIMIT caps the root's estimate, so look for the widest node underneath it
+                plan_rows = max(int(n.get("Plan Rows", 0)) for n in _plan_nodes(plan))
+                if plan_rows > RULE_SQL_MAX_PLAN_ROWS:
+                    raise SqlGuardError(
+                        f"Query rejected: estimated {plan_rows:,} rows exceeds the limit of {RULE_SQL_MAX_PLAN_ROWS:,}. "
+                        "Try narrowing the keywords or date range."
+                    )
+
+            rows, size, truncated = [], 0, False
+            if job:
+                job.active_conn = conn
+            try:
+                # Named cursor: rows stream from the server in RULE_SQL_FETCH_SIZE batches as tuples;
+                # column names are read once and values (dates included) are left for the JSON encoder
+                with conn.cursor(name=f"rule_{uuid.uuid4().hex}") as cur:
+                    cur.execute(guarded)
+                    columns = None
+                    while not truncated:
+                        batch = cur.fetchmany(RULE_SQL_FETCH_SIZE)
+                        if not batch:
+                            break
+                        if columns is None:
+                            columns = [c[0] for c in cur.description]
+                        for t in batch:
+                            r = dict(zip(columns, t))
+                            size += len(dumps_json(r))
+                            if len(rows) >= RULE_SQL_MAX_ROWS or size > RULE_SQL_MAX_BYTES:
+                                truncated = True
+                                break
+                            rows.append(r)
+            finally:
+                if job:
+                    job.active_conn = None
+        finally:
+            conn.rollback()
+        return rows, truncated
+
+# --- \Process Batching ---
+PROCESS_BATCH_TOKENS = int(os.getenv("PROCESS_BATCH_TOKENS", "12000"))  # input-data tokens per LLM call
+PROCESS_MAX_CONCURRENCY = int(os.getenv("PROCESS_MAX_CONCURRENCY", "4"))  # in-flight LLM calls, process-wide
+PROCESS_BATCH_RETRIES = int(os.getenv("PROCESS_BATCH_RETRIES", "1"))
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_token_encoding = None
+
+def estimate_tokens(text: str) -> int:
+    """Token count via tiktoken when installed, else the ~4 chars/token rule of thumb."""
+    global _token_encoding
+    if tiktoken is not None:
+        if _token_encoding is None:
+            try:
+                _token_encoding = tiktoken.encoding_for_model(OPENAI_MODEL)
+            except KeyError:
+                _token_encoding = tiktoken.get_encoding("o200k_base")
+        return len(_token_encoding.encode(text))
+    return len(text) // 4 + 1
+
+def batch_by_token_budget(items: List, budget: Optional[int] = None) -> List[List]:
+    """Greedy split into batches whose serialized size fits the budget. An oversized item gets a batch of its own."""
+    budget = budget or PROCESS_BATCH_TOKENS
+    batches, current, used = [], [], 0
+    for item in items:
+        cost = estimate_tokens(json.dumps(item, default=str)) + 1
+        if current and used + cost > budget:
+            batches.append(current)
+            current, used = [], 0
+        current.append(item)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+# Shared so PROCESS_MAX_CONCURRENCY caps LLM calls across all requests and jobs, not per request
+process_executor = ThreadPoolExecutor(max_workers=PROCESS_MAX_CONCURRENCY, thread_name_prefix="process-batch")
+
+def _process_batch(instruction: str, batch: List, index: int, total: int, job=None) -> List:
+    data_str = json.dumps(batch, default=str)
+    user_prompt = f"Instruction: {instruction}\n\nInput Data (batch {index + 1} of {total}):\n{data_str}"
+    attempt = 0
+    while True:
+        if job and job.interrupted:
+            raise job.interrupted
+        try:
+            gpt_res = call_llm(PROCESS_SYSTEM_PROMPT, user_prompt, timeout=job.remaining() if job else None)
+            result = gpt_res.get("result", [])
+            if not isinstance(result, list):
+                raise ValueError("LLM response 'result' is not a list")
+            return result
+        except JobInterrupted:
+            raise
+        except Exception:
+            attempt += 1
+            if attempt > PROCESS_BATCH_RETRIES:
+                raise
+
+def process_in_batches(instruction: str, input_data: List, job=None) -> Dict:
+    """
+    \\Process over arbitrarily many rows: token-budgeted batches run concurrently and are merged
+    back in input order using the preserved 'id'. Failed batches are reported, not silently dropped.
+    """
+    batches = batch_by_token_budget(input_data)
+    total = len(batches)
+    futures = [submit_in_context(process_executor, _process_batch, instruction, b, i, total, job) for i, b in enumerate(batches)]
+
+    # Rank of each input id so the merged output follows the input order
+    position = {}
+    for pos, item in enumerate(input_data):
+        if isinstance(item, dict) and item.get("id") is not None:
+            position.setdefault(str(item["id"]), pos)
+
+    merged, report, failed = [], [], 0
+    for index, future in enumerate(futures):
+        entry = {"batch": index + 1, "items": len(batches[index])}
+        try:
+            rows = future.result()
+            merged.extend(rows)
+            entry.update(status="ok", returned=len(rows))
+        except JobInterrupted:
+            for f in futures:
+                f.cancel()
+            raise
+        except Exception as e:
+            failed += 1
+            entry.update(status="failed", error=str(e))
+            print(f"Process batch {index + 1}/{total} failed: {e}")
+        report.append(entry)
+        if job:
+            job.update(progress={"completed": index + 1, "total": total, "failed": failed})
+
+    merged.sort(key=lambda r: position.get(str(r.get("id")) if isinstance(r, dict) else None, len(input_data)))
+    unmatched = sum(1 for r in merged if not isinstance(r, dict) or str(r.get("id")) not in position)
+
+    if failed == total:
+        return {"status": "error", "type": "process", "message": f"All {total} \\Process batches failed", "batches": report}
+    message = None
+    if failed:
+        message = f"{failed} of {total} batches failed; their rows are missing from the result."
+    return {
+        "status": "success",
+        "type": "process",
+        "data": merged,
+        "batches": report,
+        "input_rows": len(input_data),
+        "unmatched_ids": unmatched,
+        "message": message
+    }
+
+def fetch_rule(connect, rule_id: int) -> Dict:
+    """instruction and is_chaining of a saved rule; 404 if there is none."""
+    with connect() as conn:
+        with conn.cursor(cursor_factory=extras.RealDictCursor) as cur:
+            cur.execute("SELECT instruction, is_chaining FROM saved_rules WHERE id = %s", (rule_id,))
+            rule_row = cur.fetchone()
+        conn.rollback()
+    if not rule_row:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    return rule_row
+
+def run_rule(req: RuleExecuteRequest, rule: Dict, connect, job=None, read_connect=read_connection) -> Dict:
+    """
+    Rule execution shared by the synchronous endpoint and the job queue; rule comes from fetch_rule.
+    `connect` returns a context manager yielding a connection; each DB step opens its own,
+    so with pooled_connection nothing is checked out during the LLM call. Rules and the
+    translation cache are read and written through `connect` (the primary); the data
+    sample and the generated SQL run through `read_connect` (the replica when healthy).
     """
-    if not OPENAI_API_KEY:
+    if llm_client() is None:
         return {
             "status": "error", 
             "message": "OpenAI API Key is missing. Please configure OPENAI_API_KEY in the environment."
         }
 
-    # 1. Fetch Rule
-    with conn.cursor(cursor_factory=extras.RealDictCursor) as cur:
-        cur.execute("SELECT instruction FROM saved_rules WHERE id = %s", (req.rule_id,))
-        rule_row = cur.fetchone()
-        if not rule_row:
-            raise HTTPException(status_code=404, detail="Rule not found")
-        
-        instruction = rule_row['instruction'].strip()
+    previous_result = req.previous_result
+    if req.previous_handle:
+        previous_result = result_store.get(req.previous_handle)
+
+    instruction = rule['instruction'].strip()
 
     # Determine Mode
     mode = "generic"
@@ -472,87 +3891,48 @@ def execute_rule(req: RuleExecuteRequest, conn=Depends(get_db_connection)):
     try:
         # --- \READ MODE ---
         if mode == "read":
-            system_prompt = r"""
-            You are a SQL Engineer for 'Drug Experience Explorer'.
-            Target Database: PostgreSQL. Table: kwatch_alert_results
-            Columns: id, author, content, sentiment, received_at, keyword, url
-            Goal: Convert the user's natural language request (starting with \Read) into a valid PostgreSQL SELECT query.
-            Rules:
-            - Respond ONLY with a valid JSON object: {"query": "SELECT ...", "explanation": "..."}
-            - Do not output markdown.
-            - Filter autogenerated content: author != 'AutoModerator'
-            - Use LIMIT if specified, otherwise default to 50.
-            """
-            
             user_prompt = f"Instruction: {instruction}\n"
             if req.keywords and "All" not in req.keywords:
                 user_prompt += f"Context: Focus on keywords {req.keywords}\n"
 
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
-                response_format={ "type": "json_object" }
+            if job:
+                job.checkpoint("translating")
+            gpt_res, cached = translate_instruction(
+                connect, req.rule_id, mode, instruction, req.keywords,
+                READ_SYSTEM_PROMPT, READ_SYSTEM_PROMPT, user_prompt, job=job
             )
-            gpt_res = json.loads(response.choices[0].message.content)
             sql = gpt_res.get("query")
-            
-            with conn.cursor(cursor_factory=extras.RealDictCursor) as cur:
-                cur.execute(sql)
-                rows = cur.fetchall()
-                # Serialize dates
-                for r in rows:
-                    for k, v in r.items():
-                        if isinstance(v, datetime):
-                            r[k] = v.isoformat()
-                return {"status": "success", "type": "read", "data": rows, "sql": sql, "explanation": gpt_res.get("explanation")}
+
+            if job:
+                job.checkpoint("querying")
+            rows, truncated = run_generated_sql(read_connect, sql, job)
+            return {"status": "success", "type": "read", "data": rows, "sql": sql, "explanation": gpt_res.get("explanation"), "cached": cached, "truncated": truncated}
 
         # --- \PROCESS MODE ---
         elif mode == "process":
             # Requires chaining
             input_data = []
-            if req.previous_result and req.previous_result.get("data"):
-                input_data = req.previous_result.get("data")
+            if previous_result and previous_result.get("data"):
+                input_data = previous_result.get("data")
             
             if not input_data:
                 return {"status": "error", "message": r"No input data found for \Process. Chain this rule after a \Read rule."}
 
-            system_prompt = r"""
-            You are a Data Analyst processing raw social media data.
-            Input: A JSON list of posts.
-            Instruction: A processing rule starting with \Process.
-            Goal: Analyze the input data based on the instruction and return a new JSON list.
-            Rules:
-            - Respond ONLY with a valid JSON object containing a key "result" which is the list of processed items.
-            - CRITICAL: You MUST preserve the 'id' field from the input for every item. Do not change, reformat, or generate new IDs. Use the exact ID from the input.
-            - Do not include items that don't match criteria if the instruction implies filtering.
-            - Example Output: {"result": [{"id": 12345, "author": "...", "weight_lost": 10}, ...]}
-            """
-            
-            # Truncate to safe size approx 30k chars to avoid hitting token limits
-            data_str = json.dumps(input_data)[:30000]
-
-            user_prompt = f"Instruction: {instruction}\n\nInput Data (Truncated if too large):\n{data_str}"
-
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
-                response_format={ "type": "json_object" }
-            )
-            gpt_res = json.loads(response.choices[0].message.content)
-            processed_data = gpt_res.get("result", [])
-            return {"status": "success", "type": "process", "data": processed_data}
+            if job:
+                job.checkpoint("processing")
+            return process_in_batches(instruction, input_data, job)
 
         # --- \SHOW MODE ---
         elif mode == "show":
             # Pass-through or formatting
-            if not req.previous_result:
+            if not previous_result:
                 return {"status": "error", "message": "No data to show."}
             
             # In the future, this could ask GPT to format as HTML table etc, but for now we just pass data
             return {
                 "status": "success", 
                 "type": "show", 
-                "data": req.previous_result.get("data", []),
+                "data": previous_result.get("data", []),
                 "message": "Data passed through for display."
             }
 
@@ -560,55 +3940,450 @@ def execute_rule(req: RuleExecuteRequest, conn=Depends(get_db_connection)):
         else:
             # Fallback to the original mixed logic
             context_data = []
-            with conn.cursor(cursor_factory=extras.RealDictCursor) as cur:
-                sample_query = "SELECT author, content, sentiment, keyword, received_at FROM kwatch_alert_results WHERE author != 'AutoModerator' ORDER BY received_at DESC LIMIT 5"
-                cur.execute(sample_query)
-                context_data = cur.fetchall()
-                for r in context_data:
-                    if r['received_at']: r['received_at'] = r['received_at'].isoformat()
-
-            system_prompt = f"""
-            You are an expert Data Analyst and SQL Engineer for "Drug Experience Explorer" (DXE).
-            Target Database: PostgreSQL. Table: kwatch_alert_results
-            Columns: id, date_text, author, url, content, sentiment, received_at, kwatch_query, keyword
-            User's Current Application state: Selected Keywords: {req.keywords}
-            Rules:
-            - Respond ONLY with a valid JSON object.
-            - If instruction requires data retrieval, return: {{"type": "sql", "query": "SELECT ...", "explanation": "..."}}
-            - If instruction is analysis/text, return: {{"type": "text", "content": "...", "explanation": "..."}}
-            """
+            with read_connect() as conn:
+                with conn.cursor(cursor_factory=extras.RealDictCursor) as cur:
+                    sample_query = "SELECT author, content, sentiment, keyword, received_at FROM kwatch_alert_results WHERE author != 'AutoModerator' ORDER BY received_at DESC NULLS LAST LIMIT 5"
+                    cur.execute(sample_query)
+                    context_data = cur.fetchall()
+                    for r in context_data:
+                        if r['received_at']: r['received_at'] = r['received_at'].isoformat()
+                conn.rollback()
+
+            system_prompt = GENERIC_SYSTEM_PROMPT.format(keywords=req.keywords)
             
             user_prompt = f"Natural Language Rule: {instruction}\n\n"
-            if req.previous_result:
-                user_prompt += f"Previous context: {str(req.previous_result.get('data', []))[:1000]}\n"
+            if previous_result:
+                user_prompt += f"Previous context: {str(previous_result.get('data', []))[:1000]}\n"
             
             user_prompt += f"Recent Data Sample: {json.dumps(context_data)}\n"
 
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
-                response_format={ "type": "json_object" }
-            )
-            
-            gpt_res = json.loads(response.choices[0].message.content)
+            if job:
+                job.checkpoint("translating")
+            if previous_result:
+                # Answers depend on the chained input, so they can't be reused
+                gpt_res, cached = call_llm(system_prompt, user_prompt, timeout=job.remaining() if job else None), False
+            else:
+                # Only SQL translations are reusable; text answers reflect the current data sample
+                gpt_res, cached = translate_instruction(
+                    connect, req.rule_id, mode, instruction, req.keywords,
+                    GENERIC_SYSTEM_PROMPT, system_prompt, user_prompt,
+                    cacheable=lambda res: res.get("type") == "sql", job=job
+                )
             
             if gpt_res.get("type") == "sql":
                 sql = gpt_res.get("query")
-                with conn.cursor(cursor_factory=extras.RealDictCursor) as cur:
-                    cur.execute(sql)
-                    rows = cur.fetchall()
-                    for r in rows:
-                        for k, v in r.items():
-                            if isinstance(v, datetime):
-                                r[k] = v.isoformat()
-                    return {"status": "success", "data": rows, "sql": sql, "explanation": gpt_res.get("explanation")}
+                if job:
+                    job.checkpoint("querying")
+                rows, truncated = run_generated_sql(read_connect, sql, job)
+                return {"status": "success", "data": rows, "sql": sql, "explanation": gpt_res.get("explanation"), "cached": cached, "truncated": truncated}
             else:
                 return {"status": "success", "message": gpt_res.get("content"), "explanation": gpt_res.get("explanation")}
 
+    except JobInterrupted:
+        raise
     except Exception as e:
+        if job and job.interrupted:
+            # A cancelled/timed out statement surfaces as a driver error; report it as the interruption
+            raise job.interrupted
         print(f"GPT/SQL Execution Error: {e}")
         return {"status": "error", "message": f"Execution failed: {str(e)}"}
 
+@app.post("/api/rules/execute", tags=["Rules"], summary="Execute Rule (ChatGPT)")
+@fast_json
+def execute_rule(req: RuleExecuteRequest, connect=Depends(get_connector), read_connect=Depends(get_read_connector)):
+    """
+    Executes a rule based on its instruction type (\Read, \Process, \Show).
+    Falls back to generic interpretation if no prefix is found.
+    SQL translations for \Read and generic rules are cached per instruction/keywords/prompt/model.
+    Each SQL step checks a connection out only for its own duration, none is held across the LLM call.
+    For long-running rules prefer POST /api/rules/jobs, which doesn't tie up a request.
+    """
+    return execute_and_store(req, connect, read_connect=read_connect)
+
+# --- Result Store & Chains ---
+RESULT_STORE_TTL = float(os.getenv("RESULT_STORE_TTL", "1800"))
+RESULT_STORE_MAX_ENTRIES = int(os.getenv("RESULT_STORE_MAX_ENTRIES", "256"))
+RESULT_STORE_MAX_BYTES = int(os.getenv("RESULT_STORE_MAX_BYTES", str(256 * 1024 * 1024)))  # serialized size of all entries
+
+class ResultStore:
+    """
+    Server-side home for intermediate rule results, referenced by opaque handle so chained
+    steps never round-trip their data through the browser. TTL + LRU bounded, by entry count
+    and by the total serialized size of the stored results.
+    """
+
+    def __init__(self, ttl: float = RESULT_STORE_TTL, max_entries: int = RESULT_STORE_MAX_ENTRIES,
+                 max_bytes: int = RESULT_STORE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # handle -> (expires_at, result, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, result: Dict) -> Optional[str]:
+        """Store result and return its handle, or None if it alone is larger than max_bytes."""
+        size = len(dumps_json(result))
+        if size > self.max_bytes:
+            return None
+        handle = uuid.uuid4().hex
+        with self._lock:
+            self._entries[handle] = (time.monotonic() + self.ttl, result, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+        return handle
+
+    def get(self, handle: str) -> Dict:
+        """Stored result for handle; 410 once it has expired or been evicted."""
+        with self._lock:
+            entry = self._entries.get(handle)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(handle)
+                return entry[1]
+            if entry:
+                del self._entries[handle]
+                self._bytes -= entry[2]
+        raise HTTPException(status_code=410, detail="Result handle expired or unknown; re-run the previous step")
+
+result_store = ResultStore()
+
+def execute_and_store(req: RuleExecuteRequest, connect, job=None, read_connect=read_connection) -> Dict:
+    """
+    run_rule, keeping a data-bearing result in result_store and returning its handle when another
+    step may consume it: the caller asked (keep_result, chain steps) or the rule is a chaining rule.
+    """
+    if job:
+        job.checkpoint("fetching_rule")
+    rule = fetch_rule(connect, req.rule_id)
+    result = run_rule(req, rule, connect, job, read_connect)
+    if result.get("status") == "success" and "data" in result and (req.keep_result or rule.get("is_chaining")):
+        result["handle"] = result_store.put(result)
+    return result
+
+def page_result(result: Dict, offset: int, limit: int) -> Dict:
+    data = result.get("data") or []
+    page = {k: v for k, v in result.items() if k != "data"}
+    page.update({"total_rows": len(data), "offset": offset, "limit": limit, "data": data[offset:offset + limit]})
+    return page
+
+def run_chain(req: RuleChainRequest, connect, job=None) -> Dict:
+    """
+    Run rules in order (typically \\Read -> \\Process -> \\Show), each step consuming the
+    previous step's result from result_store. Returns a page of the final output plus per-step summaries.
+    """
+    if not req.rule_ids:
+        raise HTTPException(status_code=400, detail="rule_ids must not be empty")
+
+    handle = req.previous_handle
+    steps = []
+    result: Dict = {}
+    for index, rule_id in enumerate(req.rule_ids):
+        step_req = RuleExecuteRequest(
+            rule_id=rule_id, previous_handle=handle, keywords=req.keywords,
+            start_date=req.start_date, end_date=req.end_date, keep_result=True
+        )
+        result = execute_and_store(step_req, connect, job)
+        handle = result.get("handle")
+        steps.append({
+            "rule_id": rule_id,
+            "status": result.get("status"),
+            "type": result.get("type"),
+            "rows": len(result["data"]) if isinstance(result.get("data"), list) else None,
+            "handle": handle,
+            "sql": result.get("sql"),
+            "cached": result.get("cached"),
+        })
+        if result.get("status") != "success":
+            return {"status": "error", "message": f"Step {index + 1} (rule {rule_id}) failed: {result.get('message')}", "steps": steps}
+        if handle is None and index < len(req.rule_ids) - 1:
+            return {"status": "error", "message": f"Step {index + 1} (rule {rule_id}) produced no data to chain", "steps": steps}
+
+    response = page_result(result, req.offset, req.limit)
+    response["steps"] = steps
+    return response
+
+@app.post("/api/rules/chain", tags=["Rules"], summary="Execute Rule Chain")
+@fast_json
+def execute_rule_chain(req: RuleChainRequest):
+    """
+    Execute an ordered list of rules entirely server-side.
+    Intermediate results stay in the result store (see steps[].handle); only a page of the final output is returned.
+    """
+    return run_chain(req, pooled_connection)
+
+@app.get("/api/results/{handle}", tags=["Rules"], summary="Get Stored Result Page")
+@fast_json
+def get_stored_result(
+    handle: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(200, ge=1, le=5000)
+):
+    """Page through a stored rule or chain step result."""
+    return page_result(result_store.get(handle), offset, limit)
+
+# --- Rule Jobs ---
+RULE_JOB_WORKERS = int(os.getenv("RULE_JOB_WORKERS", "4"))
+RULE_JOB_MAX_PENDING = int(os.getenv("RULE_JOB_MAX_PENDING", "32"))
+RULE_JOB_TIMEOUT = float(os.getenv("RULE_JOB_TIMEOUT", "120"))
+RULE_JOB_MAX_TIMEOUT = float(os.getenv("RULE_JOB_MAX_TIMEOUT", "600"))
+RULE_JOB_TTL = float(os.getenv("RULE_JOB_TTL", "3600"))  # how long finished jobs stay fetchable
+
+class JobInterrupted(Exception):
+    status = "failed"
+
+class JobCancelled(JobInterrupted):
+    status = "cancelled"
+
+class JobTimedOut(JobInterrupted):
+    status = "timed_out"
+
+class RuleJob:
+    """State of one queued rule execution. Workers report progress through checkpoint()."""
+
+    FINISHED = ("succeeded", "failed", "cancelled", "timed_out")
+
+    def __init__(self, req, timeout: float, runner=None):
+        self.id = uuid.uuid4().hex
+        self.req = req
+        self.runner = runner or execute_and_store
+        self.timeout = timeout
+        self.status = "queued"
+        self.stage = "queued"
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self.version = 0
+        self.future = None
+        self.active_conn = None
+        self.interrupted: Optional[JobInterrupted] = None
+        self._deadline = time.monotonic() + timeout
+        self._finished_monotonic = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in self.FINISHED
+
+    def remaining(self) -> float:
+        return max(0.0, self._deadline - time.monotonic())
+
+    def update(self, **fields):
+        with self._lock:
+            for k, v in fields.items():
+                setattr(self, k, v)
+            if self.finished and self._finished_monotonic is None:
+                self.finished_at = datetime.now()
+                self._finished_monotonic = time.monotonic()
+            self.version += 1
+
+    def checkpoint(self, stage: str):
+        """Raise if the job was cancelled or ran past its deadline, otherwise record the new stage."""
+        if self._cancel.is_set():
+            self.interrupted = JobCancelled("Job cancelled")
+        elif self.remaining() <= 0:
+            self.interrupted = JobTimedOut(f"Job exceeded its {self.timeout:g}s timeout")
+        if self.interrupted:
+            raise self.interrupted
+        self.update(stage=stage)
+
+    def cancel(self):
+        self._cancel.set()
+        if self.future and self.future.cancel():
+            self.update(status="cancelled", stage="cancelled", error="Job cancelled")
+            return
+        self.interrupted = self.interrupted or JobCancelled("Job cancelled")
+        conn = self.active_conn
+        if conn is not None:
+            # Abort the running statement server-side; the worker sees it as an error and stops
+            try:
+                conn.cancel()
+            except Exception:
+                pass
+
+    def snapshot(self, include_result: bool = True) -> Dict:
+        with self._lock:
+            data = {
+                "job_id": self.id,
+                "rule_id": getattr(self.req, "rule_id", None),
+                "rule_ids": getattr(self.req, "rule_ids", None),
+                "status": self.status,
+                "stage": self.stage,
+                "progress": self.progress,
+                "error": self.error,
+                "created_at": self.created_at.isoformat(),
+                "started_at": self.started_at.isoformat() if self.started_at else None,
+                "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+                "timeout": self.timeout,
+            }
+            if include_result:
+                data["result"] = self.result
+            return data
+
+rule_job_executor = ThreadPoolExecutor(max_workers=RULE_JOB_WORKERS, thread_name_prefix="rule-job")
+rule_jobs: Dict[str, RuleJob] = {}
+rule_jobs_lock = threading.Lock()
+
+def _run_rule_job(job: RuleJob):
+    job.update(status="running", started_at=datetime.now())
+
+    def expire():
+        # Deadline watchdog: interrupts a statement that would otherwise run past the timeout
+        if job.finished:
+            return
+        job.interrupted = job.interrupted or JobTimedOut(f"Job exceeded its {job.timeout:g}s timeout")
+        conn = job.active_conn
+        if conn is not None:
+            try:
+                conn.cancel()
+            except Exception:
+                pass
+
+    watchdog = threading.Timer(job.remaining(), expire)
+    watchdog.daemon = True
+    watchdog.start()
+    try:
+        result = job.runner(job.req, pooled_connection, job)
+        if job.interrupted:
+            raise job.interrupted
+        job.update(status="succeeded", stage="done", result=result)
+    except JobInterrupted as e:
+        job.update(status=e.status, stage=e.status, error=str(e))
+    except HTTPException as e:
+        job.update(status="failed", stage="failed", error=e.detail)
+    except Exception as e:
+        print(f"Rule job {job.id} failed: {e}")
+        job.update(status="failed", stage="failed", error=str(e))
+    finally:
+        watchdog.cancel()
+
+def _prune_rule_jobs():
+    now = time.monotonic()
+    with rule_jobs_lock:
+        for job_id in [j.id for j in rule_jobs.values() if j._finished_monotonic and now - j._finished_monotonic > RULE_JOB_TTL]:
+            del rule_jobs[job_id]
+
+def _submit_rule_job(req, timeout: float, runner=None) -> Dict:
+    _prune_rule_jobs()
+    with rule_jobs_lock:
+        pending = sum(1 for j in rule_jobs.values() if not j.finished)
+        if pending >= RULE_JOB_MAX_PENDING:
+            raise HTTPException(status_code=429, detail="Too many rule jobs in progress, please retry", headers={"Retry-After": "5"})
+        job = RuleJob(req, timeout, runner)
+        rule_jobs[job.id] = job
+    job.future = rule_job_executor.submit(_run_rule_job, job)
+    return job.snapshot(include_result=False)
+
+def _get_rule_job(job_id: str) -> RuleJob:
+    job = rule_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/api/rules/jobs", status_code=202, tags=["Rules"], summary="Submit Rule Job")
+def submit_rule_job(
+    req: RuleExecuteRequest,
+    timeout: float = Query(RULE_JOB_TIMEOUT, gt=0, le=RULE_JOB_MAX_TIMEOUT, description="Seconds before the job is aborted")
+):
+    """
+    Queue a rule execution and return its job id immediately.
+    Poll GET /api/rules/jobs/{job_id} or stream GET /api/rules/jobs/{job_id}/events for progress.
+    """
+    return _submit_rule_job(req, timeout)
+
+@app.post("/api/rules/chain/jobs", status_code=202, tags=["Rules"], summary="Submit Rule Chain Job")
+def submit_rule_chain_job(
+    req: RuleChainRequest,
+    timeout: float = Query(RULE_JOB_TIMEOUT, gt=0, le=RULE_JOB_MAX_TIMEOUT, description="Seconds before the whole chain is aborted")
+):
+    """Queue a rule chain as a job; the finished job's result is the same as POST /api/rules/chain."""
+    return _submit_rule_job(req, timeout, run_chain)
+
+@app.get("/api/rules/jobs/{job_id}", tags=["Rules"], summary="Get Rule Job")
+def get_rule_job(job_id: str):
+    """Current status, stage and (once finished) result of a rule job."""
+    return _get_rule_job(job_id).snapshot()
+
+@app.delete("/api/rules/jobs/{job_id}", tags=["Rules"], summary="Cancel Rule Job")
+def cancel_rule_job(job_id: str):
+    """Cancel a queued or running rule job. Running SQL is aborted server-side."""
+    job = _get_rule_job(job_id)
+    if not job.finished:
+        job.cancel()
+    return job.snapshot(include_result=False)
+
+@app.get("/api/rules/jobs/{job_id}/events", tags=["Rules"], summary="Stream Rule Job Events")
+async def stream_rule_job(job_id: str):
+    """Server-sent events: one 'status' event per progress change, ending with the finished job (including result)."""
+    job = _get_rule_job(job_id)
+
+    async def events():
+        seen = -1
+        while True:
+            version, finished = job.version, job.finished
+            if version != seen:
+                seen = version
+                payload = dumps_json(job.snapshot(include_result=finished)).decode("utf-8")
+                yield f"event: {'result' if finished else 'status'}\ndata: {payload}\n\n"
+            if finished:
+                return
+            await asyncio.sleep(0.25)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # nginx: flush each progress event instead of holding them until the job ends
+    })
+
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    import argparse
+    parser = argparse.ArgumentParser(description="DsX API service")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("serve", help="Run the API (default)")
+    migrate_cmd = sub.add_parser("migrate", help="Apply pending schema migrations and exit")
+    migrate_cmd.add_argument("--target", type=int, default=None, help="Stop after this migration version")
+    explain_cmd = sub.add_parser("explain", help="Print EXPLAIN summaries for the hot endpoint queries")
+    explain_cmd.add_argument("--keyword", default=None, help="Keyword to filter on (default: the most mentioned)")
+    backfill_cmd = sub.add_parser("backfill-sentiment", help="Label rows with a NULL sentiment using the local lexicon scorer")
+    backfill_cmd.add_argument("--chunk-size", type=int, default=SENTIMENT_CHUNK_SIZE)
+    backfill_cmd.add_argument("--workers", type=int, default=0, help="Score in a pool of this many processes")
+    backfill_cmd.add_argument("--limit", type=int, default=None, help="Stop after this many rows")
+    ingest_cmd = sub.add_parser("ingest", help="Bulk-load NDJSON/CSV alert files (one transaction per file)")
+    ingest_cmd.add_argument("files", nargs="+", help="Files to load, - for stdin")
+    ingest_cmd.add_argument("--format", choices=["ndjson", "csv"], default=None, help="Default: from the file extension")
+    args = parser.parse_args()
+
+    if args.command in ("migrate", "explain", "ingest", "backfill-sentiment"):
+        if not ensure_db_pool():
+            raise SystemExit(f"No database connection available: {db_state.error}")
+        conn = db_pool.getconn()
+        try:
+            if args.command == "migrate":
+                applied = run_migrations(conn, args.target)
+                print(f"Applied {len(applied)} migration(s): {applied}")
+            elif args.command == "backfill-sentiment":
+                print(json.dumps(backfill_sentiment(conn, args.chunk_size, args.workers, args.limit), indent=2))
+            elif args.command == "ingest":
+                for path in args.files:
+                    fmt = args.format or ("csv" if path.lower().endswith(".csv") else "ndjson")
+                    with (open(path, "rb") if path != "-" else contextlib.nullcontext(sys.stdin.buffer)) as f:
+                        try:
+                            result = ingest_alerts(conn, f, fmt)
+                        except IngestError as e:
+                            raise SystemExit(f"{path}: {e}")
+                    print(json.dumps({"file": path, **result}))
+            else:
+                report = explain_hot_paths(conn, args.keyword)
+                print(json.dumps(report, indent=2))
+                for entry in report:
+                    if "kwatch_alert_results" in entry["seq_scans"]:
+                        print(f"WARNING: {entry['query']} sequentially scans kwatch_alert_results")
+        finally:
+            db_pool.putconn(conn)
+    else:
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=8000)
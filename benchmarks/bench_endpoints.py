@@ -0,0 +1,305 @@
+"""
+Endpoint latency/throughput benchmark for api_service.
+
+    python benchmarks/bench_endpoints.py                                   # in-process, data already loaded
+    python benchmarks/bench_endpoints.py --sizes 100000 1000000 10000000   # load each size first (local DB only)
+    python benchmarks/bench_endpoints.py --url http://127.0.0.1:8000 --concurrency 1 16 64
+    python benchmarks/bench_endpoints.py --output new.json --baseline old.json
+
+Every scenario is driven by --concurrency simultaneous clients until --requests calls have
+completed, and reports p50/p95/p99/max latency, throughput and status codes. Without --url
+requests go through the ASGI app in-process (no network), and --cold clears the response
+cache before each call. Rule scenarios use the offline fake LLM client unless OPENAI_FAKE=0.
+
+Prints (or writes with --output) one JSON document per run so results can be diffed between
+commits; --baseline prints the p95 change per scenario against an earlier document.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_FAKE", "1")
+
+import api_service
+import generate_data
+
+BENCH_RULE = {"title": "bench: latest mentions", "instruction": r"\Read the 50 most recent mentions", "is_chaining": False}
+
+
+def percentile(samples, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return None
+    rank = max(1, -(-len(samples) * p // 100))
+    return samples[int(rank) - 1]
+
+
+class Context:
+    """Dataset facts the scenarios parametrize on, discovered through the API itself."""
+
+    def __init__(self, client):
+        keywords = client.get("/api/keywords").json()
+        self.keyword = keywords[1]["keyword"] if len(keywords) > 1 else "All"
+        days = client.get("/api/stats/counts-by-day").json()
+        last = date.fromisoformat(days[-1]["date"]) if days else date.today()
+        self.start, self.end = str(last - timedelta(days=30)), str(last)
+
+        first = client.get("/api/mentions", params={"keyword": self.keyword, "count": "none"}).json()
+        self.mention_id = first["data"][0]["id"] if first["data"] else 1
+        # 20 pages deep: where OFFSET paging used to fall over
+        page, self.deep_cursor = first, None
+        for _ in range(20):
+            if not page.get("next_cursor"):
+                break
+            self.deep_cursor = page["next_cursor"]
+            page = client.get("/api/mentions", params={"keyword": self.keyword, "cursor": self.deep_cursor, "count": "none"}).json()
+
+        page, self.deep_author_cursor = client.get("/api/stats/authors", params={"keyword": self.keyword}).json(), None
+        for _ in range(20):
+            if not page.get("next_cursor"):
+                break
+            self.deep_author_cursor = page["next_cursor"]
+            page = client.get("/api/stats/authors", params={"keyword": self.keyword, "cursor": self.deep_author_cursor}).json()
+
+        self.rule_id = None
+        if api_service.OPENAI_FAKE:
+            self.rule_id = client.post("/api/rules", json=BENCH_RULE).json()["id"]
+
+    def close(self, client):
+        if self.rule_id:
+            client.delete(f"/api/rules/{self.rule_id}")
+
+
+def _run_job(client, path, body):
+    job = client.post(path, json=body)
+    if job.status_code != 202:
+        return job
+    job_id = job.json()["job_id"]
+    while True:
+        resp = client.get(f"/api/rules/jobs/{job_id}")
+        if resp.status_code != 200 or resp.json()["status"] not in ("queued", "running"):
+            return resp
+        time.sleep(0.01)
+
+
+def scenarios(ctx):
+    """(name, call(client) -> response) for every read endpoint plus the rule execution paths."""
+    kw = {"keyword": ctx.keyword}
+    kw_range = {"keyword": ctx.keyword, "start": ctx.start, "end": ctx.end}
+    items = [
+        ("health", lambda c: c.get("/api/health")),
+        ("pool_stats", lambda c: c.get("/api/pool/stats")),
+        ("keywords", lambda c: c.get("/api/keywords")),
+        ("mentions:first_page", lambda c: c.get("/api/mentions")),
+        ("mentions:keyword_range", lambda c: c.get("/api/mentions", params=kw_range)),
+        ("mentions:approximate_total", lambda c: c.get("/api/mentions", params={**kw, "count": "approximate"})),
+        ("mentions:deep_cursor", lambda c: c.get("/api/mentions", params={**kw, "cursor": ctx.deep_cursor, "count": "none"})),
+        ("mentions:by_id", lambda c: c.get(f"/api/mentions/{ctx.mention_id}")),
+        ("mentions:export_30d", lambda c: c.get("/api/mentions/export", params=kw_range)),
+        ("search:relevance", lambda c: c.get("/api/search", params={"q": "nausea", **kw})),
+        ("search:recent", lambda c: c.get("/api/search", params={"q": "dose OR insurance", "sort": "recent", "count": "approximate"})),
+        ("unique_authors:sketch", lambda c: c.get("/api/stats/unique-authors", params=kw_range)),
+        ("unique_authors:exact", lambda c: c.get("/api/stats/unique-authors", params={**kw_range, "exact": "true"})),
+        ("authors", lambda c: c.get("/api/stats/authors", params=kw)),
+        ("authors:deep_cursor", lambda c: c.get("/api/stats/authors", params={**kw, "cursor": ctx.deep_author_cursor})),
+        ("authors:range", lambda c: c.get("/api/stats/authors", params=kw_range)),
+        ("authors:top_per_keyword", lambda c: c.get("/api/stats/authors/top", params={"start": ctx.start, "end": ctx.end})),
+        ("counts_by_day", lambda c: c.get("/api/stats/counts-by-day", params=kw)),
+        ("counts_by_day:week_by_keyword", lambda c: c.get("/api/stats/counts-by-day", params={"granularity": "week", "group_by": "keyword"})),
+        ("counts_by_day:hour_by_sentiment", lambda c: c.get("/api/stats/counts-by-day", params={**kw_range, "granularity": "hour", "group_by": "sentiment"})),
+        ("sentiment", lambda c: c.get("/api/stats/sentiment", params=kw_range)),
+        ("dashboard", lambda c: c.get("/api/dashboard", params=kw_range)),
+        ("rules:list", lambda c: c.get("/api/rules")),
+    ]
+    if ctx.rule_id:
+        body = {"rule_id": ctx.rule_id, "keywords": [ctx.keyword]}
+        items += [
+            ("rules:execute", lambda c: c.post("/api/rules/execute", json=body)),
+            ("rules:job_roundtrip", lambda c: _run_job(c, "/api/rules/jobs", body)),
+        ]
+    return items
+
+
+def measure(client, call, requests, concurrency, cold):
+    samples, statuses = [], {}
+    lock = threading.Lock()
+
+    def one(_):
+        if cold:
+            api_service.analytics_cache.clear()
+        t0 = time.perf_counter()
+        try:
+            status = call(client).status_code
+        except Exception as e:
+            status = type(e).__name__
+        elapsed = (time.perf_counter() - t0) * 1000
+        with lock:
+            samples.append(elapsed)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    wall = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - wall
+
+    samples.sort()
+    errors = sum(n for s, n in statuses.items() if not s.isdigit() or int(s) >= 400)
+    return {
+        "requests": requests,
+        "errors": errors,
+        "status": statuses,
+        "p50_ms": round(percentile(samples, 50), 2),
+        "p95_ms": round(percentile(samples, 95), 2),
+        "p99_ms": round(percentile(samples, 99), 2),
+        "mean_ms": round(sum(samples) / len(samples), 2),
+        "max_ms": round(samples[-1], 2),
+        "throughput_rps": round(requests / wall, 1) if wall else None,
+    }
+
+
+def wait_until_ready(client, timeout=120):
+    """Block until /api/ready says the pool is up and startup migrations are done."""
+    deadline = time.monotonic() + timeout
+    while True:
+        resp = client.get("/api/ready")
+        if resp.status_code == 200:
+            return
+        if time.monotonic() > deadline:
+            raise SystemExit(f"Service not ready after {timeout}s: {resp.text}")
+        time.sleep(0.5)
+
+
+def run(client, args):
+    wait_until_ready(client)
+    ctx = Context(client)
+    try:
+        runs = []
+        for concurrency in args.concurrency:
+            results = []
+            for name, call in scenarios(ctx):
+                if args.only and not any(name.startswith(o) for o in args.only):
+                    continue
+                for _ in range(args.warmup):
+                    call(client)
+                result = measure(client, call, args.requests, concurrency, args.cold)
+                results.append({"endpoint": name, **result})
+                print(f"  c={concurrency:<3} {name:<28} p50={result['p50_ms']:>8}ms p95={result['p95_ms']:>8}ms "
+                      f"{result['throughput_rps']:>8} rps  errors={result['errors']}", file=sys.stderr)
+            runs.append({"concurrency": concurrency, "results": results})
+        return {"keyword": ctx.keyword, "start": ctx.start, "end": ctx.end, "runs": runs}
+    finally:
+        ctx.close(client)
+
+
+def load_size(rows, force):
+    """Grow the local dataset to exactly `rows` (appending when smaller, reloading when larger)."""
+    generate_data.check_local(force)
+    conn = api_service.db_pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(generate_data.CREATE_TABLE)
+            cur.execute("SELECT COUNT(*) FROM kwatch_alert_results")
+            current = cur.fetchone()[0]
+        conn.commit()
+        if current <= rows:
+            stats = generate_data.generate(conn, rows - current, seed=rows)
+        else:
+            stats = generate_data.generate(conn, rows, seed=rows, truncate=True)
+        api_service.analytics_cache.clear()
+        api_service._mention_totals.clear()
+        return stats
+    finally:
+        api_service.db_pool.putconn(conn)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(report, baseline):
+    """p95 ratio new/old per (rows, concurrency, endpoint) present in both documents."""
+    def index(doc):
+        return {
+            (d.get("rows"), r["concurrency"], e["endpoint"]): e["p95_ms"]
+            for d in doc["datasets"] for r in d["runs"] for e in r["results"]
+        }
+    old, new = index(baseline), index(report)
+    rows = []
+    for key in sorted(set(old) & set(new), key=str):
+        ratio = new[key] / old[key] if old[key] else None
+        rows.append({"rows": key[0], "concurrency": key[1], "endpoint": key[2],
+                     "p95_old_ms": old[key], "p95_new_ms": new[key],
+                     "ratio": round(ratio, 3) if ratio is not None else None})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--sizes", type=int, nargs="+", help="Row counts to load before each run (e.g. 100000 1000000 10000000)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--requests", type=int, default=200, help="Measured calls per scenario and concurrency level")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--cold", action="store_true", help="Clear the response cache before every call (in-process only)")
+    parser.add_argument("--only", nargs="+", help="Scenario name prefixes to run")
+    parser.add_argument("--force", action="store_true", help="Allow --sizes against a non-local DB_HOST")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare p95 latencies against")
+    args = parser.parse_args()
+    if args.cold and args.url:
+        parser.error("--cold only applies to the in-process app")
+
+    if args.url:
+        import httpx
+        limits = httpx.Limits(max_connections=max(args.concurrency))
+        client_cm = httpx.Client(base_url=args.url, timeout=120, limits=limits)
+    else:
+        from fastapi.testclient import TestClient
+        client_cm = TestClient(api_service.app)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "target": args.url or "in-process",
+            "cold": args.cold,
+            "requests": args.requests,
+        },
+        "datasets": [],
+    }
+    with client_cm as client:
+        for rows in args.sizes or [None]:
+            dataset = {"rows": rows}
+            if rows is not None:
+                print(f"Loading {rows:,} rows...", file=sys.stderr)
+                dataset["load"] = load_size(rows, args.force)
+            print(f"Benchmarking ({rows or 'existing'} rows)...", file=sys.stderr)
+            dataset.update(run(client, args))
+            report["datasets"].append(dataset)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["comparison"] = compare(report, json.load(f))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Sentiment backfill scorer throughput, no database needed.
+
+    python benchmarks/bench_sentiment.py
+    python benchmarks/bench_sentiment.py --rows 200000 --chunk-size 20000 --workers 4
+
+Scores synthetic mention content (same generator as generate_data.py) with the lexicon scorer,
+once per engine available (numpy, python) and, with --workers, through a process pool as
+backfill_sentiment does. Prints one JSON document so runs can be diffed between commits.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_FAKE", "1")
+
+import api_service
+import generate_data
+
+
+def chunks(texts, size):
+    return [texts[i:i + size] for i in range(0, len(texts), size)]
+
+
+def run_serial(scorer, parts):
+    t0 = time.perf_counter()
+    labels = [label for part in parts for label in scorer.label(part)]
+    return labels, time.perf_counter() - t0
+
+
+def run_pool(parts, workers):
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(api_service.classify_sentiment, parts[:workers]))  # warm the workers
+        t0 = time.perf_counter()
+        labels = [label for part in pool.map(api_service.classify_sentiment, parts) for label in part]
+        return labels, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--chunk-size", type=int, default=api_service.SENTIMENT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=0)
+    args = parser.parse_args()
+
+    gen = generate_data.RowGenerator(args.rows)
+    texts = [gen.row()[3] for _ in range(args.rows)]
+    parts = chunks(texts, args.chunk_size)
+    results = []
+
+    numpy = api_service.np
+    engines = [("numpy", numpy)] if numpy is not None else []
+    engines.append(("python", None))
+    reference = None
+    for name, module in engines:
+        api_service.np = module
+        labels, elapsed = run_serial(api_service.LexiconScorer(), parts)
+        reference = reference or labels
+        assert labels == reference, name
+        results.append({"engine": name, "workers": 1, "seconds": round(elapsed, 3), "rows_per_s": round(len(texts) / elapsed)})
+    api_service.np = numpy
+
+    if args.workers > 1:
+        labels, elapsed = run_pool(parts, args.workers)
+        assert labels == reference
+        results.append({"engine": engines[0][0], "workers": args.workers, "seconds": round(elapsed, 3),
+                        "rows_per_s": round(len(texts) / elapsed)})
+
+    print(json.dumps({
+        "rows": args.rows,
+        "chunk_size": args.chunk_size,
+        "labels": {label: reference.count(label) for label in ("positive", "negative", "neutral")},
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Response serialization benchmark: the default FastAPI path vs the FAST_JSON path.
+
+    python benchmarks/bench_serialization.py
+    python benchmarks/bench_serialization.py --mention-rows 200 --rule-rows 10000 --repeats 50
+
+Both paths start from what the driver returns (RealDictRow-like dicts for the old path,
+tuples for the new one), so the numbers cover row shaping plus encoding:
+
+- legacy: per-row dict rebuild with isoformat(), jsonable_encoder (+ response_model
+  validation where the endpoint declares one), then JSONResponse rendering; rule rows are
+  walked for datetimes and json.dumps'd once for the byte cap.
+- fast: tuples mapped by column once, values left as-is and encoded by dumps_json
+  (orjson when installed).
+
+Prints one JSON document so runs can be diffed between commits.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_FAKE", "1")
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+import api_service
+
+COLUMNS = ["id", "author", "content", "received_at", "url", "sentiment", "keyword"]
+
+
+def mention_tuples(n, seed=7):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    return [
+        (
+            10_000_000 - i,
+            f"user_{rng.randrange(50_000)}",
+            " ".join(rng.choice(["nausea", "dose", "week", "appetite", "insurance", "pen"]) for _ in range(40)),
+            start + timedelta(seconds=rng.randrange(30_000_000)),
+            f"https://www.reddit.com/r/loseit/comments/{rng.getrandbits(40):x}/",
+            rng.choice(["positive", "negative", "neutral", None]),
+            rng.choice(["Ozempic", "Wegovy", "Mounjaro"]),
+        )
+        for i in range(n)
+    ]
+
+
+def legacy_mentions(rows):
+    dict_rows = [dict(zip(COLUMNS, r)) for r in rows]  # what RealDictCursor hands back
+    results = []
+    for row in dict_rows:
+        results.append({
+            "id": row['id'],
+            "author": row['author'],
+            "content": row['content'],
+            "date": row['received_at'].isoformat() if row['received_at'] else None,
+            "url": row['url'],
+            "sentiment": row['sentiment'] or 'neutral',
+            "keyword": row['keyword'],
+            "source": "Reddit"
+        })
+    payload = {"total": 12345, "page": 0, "limit": len(rows), "mentions": results, "next_cursor": "x"}
+    return JSONResponse(jsonable_encoder(payload)).body
+
+
+def fast_mentions(rows):
+    results = [
+        {"id": r[0], "author": r[1], "content": r[2], "date": r[3], "url": r[4],
+         "sentiment": r[5] or 'neutral', "keyword": r[6], "source": "Reddit"}
+        for r in rows
+    ]
+    payload = {"total": 12345, "page": 0, "limit": len(rows), "mentions": results, "next_cursor": "x"}
+    return api_service.FastJSONResponse(payload).body
+
+
+def legacy_counts(rows):
+    adapter = TypeAdapter(List[api_service.CountByDay])
+    data = [{"date": str(d), "count": c} for d, c in rows]
+    return JSONResponse(jsonable_encoder(adapter.validate_python(data))).body
+
+
+def fast_counts(rows):
+    return api_service.FastJSONResponse([{"date": str(d), "count": c, "sentiment": None} for d, c in rows]).body
+
+
+def legacy_rule(rows):
+    dict_rows = [dict(zip(COLUMNS + ["score"], r + (Decimal("1.5"),))) for r in rows]
+    out, size = [], 0
+    for r in dict_rows:
+        for k, v in r.items():
+            if isinstance(v, datetime):
+                r[k] = v.isoformat()
+        size += len(json.dumps(r, default=str))
+        out.append(r)
+    return JSONResponse(jsonable_encoder({"status": "success", "data": out})).body
+
+
+def fast_rule(rows):
+    columns = COLUMNS + ["score"]
+    out, size = [], 0
+    for t in rows:
+        r = dict(zip(columns, t + (Decimal("1.5"),)))
+        size += len(api_service.dumps_json(r))
+        out.append(r)
+    return api_service.FastJSONResponse({"status": "success", "data": out}).body
+
+
+def timed(fn, arg, repeats):
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn(arg)
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return round(samples[len(samples) // 2], 3)
+
+
+def compare(name, legacy, fast, arg, repeats):
+    # Same document either way (modulo whitespace)
+    assert json.loads(legacy(arg)) == json.loads(fast(arg)), name
+    legacy_ms, fast_ms = timed(legacy, arg, repeats), timed(fast, arg, repeats)
+    return {
+        "case": name,
+        "legacy_p50_ms": legacy_ms,
+        "fast_p50_ms": fast_ms,
+        "speedup": round(legacy_ms / fast_ms, 2) if fast_ms else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mention-rows", type=int, default=200)
+    parser.add_argument("--rule-rows", type=int, default=10_000)
+    parser.add_argument("--repeats", type=int, default=30)
+    args = parser.parse_args()
+
+    days = [(date(2023, 1, 1) + timedelta(days=i), 100 + i) for i in range(3 * 365)]
+    report = {
+        "encoder": "orjson" if api_service.orjson is not None else "json",
+        "results": [
+            compare(f"mentions_page_{args.mention_rows}", legacy_mentions, fast_mentions, mention_tuples(args.mention_rows), args.repeats),
+            compare(f"counts_by_day_{len(days)}", legacy_counts, fast_counts, days, args.repeats),
+            compare(f"rule_output_{args.rule_rows}", legacy_rule, fast_rule, mention_tuples(args.rule_rows), max(3, args.repeats // 5)),
+        ],
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
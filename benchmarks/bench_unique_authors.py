@@ -0,0 +1,138 @@
+"""
+Unique-author benchmark: HyperLogLog sketches vs exact COUNT(DISTINCT author).
+
+    python benchmarks/bench_unique_authors.py              # offline accuracy/latency on synthetic authors
+    python benchmarks/bench_unique_authors.py --db         # also compare against the configured database
+
+Prints one JSON document so runs can be diffed between commits.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_service
+from api_service import hll_estimate, hll_sketch
+
+
+def synthetic(sizes, days=30, seed=7):
+    """Split each author population over `days` daily sketches, merge them and compare with the true count."""
+    rng = random.Random(seed)
+    results = []
+    for n in sizes:
+        authors = [f"author_{i}" for i in range(n)]
+        # Power-law activity: a few authors post most days, most post once
+        daily = [[] for _ in range(days)]
+        for a in authors:
+            for _ in range(min(days, int(rng.paretovariate(1.2)))):
+                daily[rng.randrange(days)].append(a)
+
+        t0 = time.perf_counter()
+        sketches = [int(hll_sketch(d), 2) for d in daily]
+        build_ms = (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        merged = 0
+        for sk in sketches:
+            merged |= sk
+        estimate = hll_estimate(format(merged, f"0{api_service.HLL_SKETCH_BITS}b"))
+        merge_ms = (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        exact = len(set(a for d in daily for a in d))
+        exact_ms = (time.perf_counter() - t0) * 1000
+
+        results.append({
+            "authors": exact,
+            "estimate": estimate,
+            "rel_error": round(abs(estimate - exact) / exact, 5) if exact else 0.0,
+            "sketch_build_ms": round(build_ms, 2),
+            "merge_estimate_ms": round(merge_ms, 2),
+            "exact_set_ms": round(exact_ms, 2),
+        })
+    return results
+
+
+def _timed(fn, repeats):
+    samples = []
+    value = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        value = fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return value, round(samples[len(samples) // 2], 2)
+
+
+def database(repeats):
+    """Exact vs sketch latency/error for every keyword plus 'All', over all time and the last 30 days."""
+    pool = api_service.ensure_db_pool()
+    if not pool:
+        raise SystemExit(f"No database connection available: {api_service.db_state.error}")
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT DISTINCT keyword FROM kwatch_daily_rollup WHERE keyword != ''")
+            keywords = [["All"]] + [[r[0]] for r in cur.fetchall()]
+            cur.execute("SELECT MAX(day) FROM kwatch_daily_rollup")
+            last_day = cur.fetchone()[0]
+
+            ranges = [(None, None)]
+            if last_day:
+                ranges.append((str(last_day - timedelta(days=30)), str(last_day)))
+
+            results = []
+            for kw in keywords:
+                kw_sql, kw_params = api_service.build_keyword_filter(kw)
+                for start, end in ranges:
+                    exact_query = "SELECT COUNT(DISTINCT author) FROM kwatch_alert_results WHERE author != 'AutoModerator'" + kw_sql
+                    params = list(kw_params)
+                    if start:
+                        exact_query += " AND received_at >= %s::date AND received_at < %s::date + 1"
+                        params.extend([start, end])
+
+                    def run_exact():
+                        cur.execute(exact_query, tuple(params))
+                        return cur.fetchone()[0]
+
+                    exact, exact_ms = _timed(run_exact, repeats)
+                    estimate, sketch_ms = _timed(lambda: api_service.estimate_unique_authors(cur, kw, start, end), repeats)
+                    results.append({
+                        "keywords": kw,
+                        "start": start,
+                        "end": end,
+                        "exact": exact,
+                        "estimate": estimate,
+                        "rel_error": round(abs(estimate - exact) / exact, 5) if exact else 0.0,
+                        "exact_ms": exact_ms,
+                        "sketch_ms": sketch_ms,
+                    })
+        conn.rollback()
+        return results
+    finally:
+        pool.putconn(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--db", action="store_true", help="Also benchmark against the configured database")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    report = {
+        "hll_precision": api_service.HLL_PRECISION,
+        "synthetic": synthetic(args.sizes),
+    }
+    if args.db:
+        report["database"] = database(args.repeats)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Synthetic kwatch_alert_results loader for benchmarking against a local Postgres.
+
+    python benchmarks/generate_data.py --rows 1000000              # append 1M rows
+    python benchmarks/generate_data.py --rows 100000 --truncate    # reset tables, then load 100k
+
+The shape follows production data: a handful of keywords take most mentions (Zipf),
+author activity is power-law with a small AutoModerator share, and received_at spans
+several years with volume growing towards the present. Runs are deterministic per --seed.
+After loading it applies the schema migrations, folds every rollup and ANALYZEs, so the
+endpoints are benchmarked in their steady state.
+
+Refuses to touch a non-local DB_HOST unless --force is given.
+"""
+import argparse
+import bisect
+import csv
+import io
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_FAKE", "1")
+
+import api_service
+
+KEYWORDS = [
+    "Ozempic", "Wegovy", "Mounjaro", "Zepbound", "Semaglutide", "Tirzepatide",
+    "Saxenda", "Rybelsus", "Trulicity", "Victoza", "Metformin", "Contrave",
+]
+SENTIMENTS = [("positive", 0.3), ("negative", 0.35), ("neutral", 0.3), (None, 0.05)]
+SUBREDDITS = ["loseit", "Semaglutide", "Mounjaro", "diabetes", "WegovyWeightLoss", "Zepbound"]
+WORDS = (
+    "nausea week dose started side effects appetite weight lost pounds doctor insurance pharmacy "
+    "shortage injection pen fatigue constipation headache sleep food noise cravings energy "
+    "blood sugar a1c results month feeling better worse stomach vomiting heartburn refill "
+    "prescription cost coupon titration 0.25mg 0.5mg 1mg 2.4mg plateau gym protein water"
+).split()
+AUTOMODERATOR_SHARE = 0.03
+BATCH_ROWS = 50_000
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS kwatch_alert_results (
+        id BIGSERIAL PRIMARY KEY,
+        date_text TEXT,
+        author TEXT,
+        url TEXT,
+        content TEXT,
+        sentiment TEXT,
+        received_at TIMESTAMP,
+        kwatch_query TEXT,
+        keyword TEXT
+    );
+"""
+COLUMNS = ("date_text", "author", "url", "content", "sentiment", "received_at", "kwatch_query", "keyword")
+
+
+def zipf_cum_weights(n, s):
+    return list(itertools.accumulate(1.0 / (rank + 1) ** s for rank in range(n)))
+
+
+class RowGenerator:
+    """Deterministic stream of alert rows; `rows` sizes the author population."""
+
+    def __init__(self, rows, seed=7, years=3, now=None):
+        self.rng = random.Random(seed)
+        self.now = now or datetime(2026, 1, 1)
+        self.span = timedelta(days=365 * years).total_seconds()
+        self.keyword_weights = zipf_cum_weights(len(KEYWORDS), 1.2)
+        # Roughly one author per 8 mentions, with a long tail of one-time posters
+        self.authors = max(10, rows // 8)
+        self.author_weights = zipf_cum_weights(self.authors, 0.8)
+        self.sentiment_weights = list(itertools.accumulate(w for _, w in SENTIMENTS))
+
+    def _pick(self, cum_weights):
+        return bisect.bisect_left(cum_weights, self.rng.random() * cum_weights[-1])
+
+    def row(self):
+        rng = self.rng
+        keyword = KEYWORDS[self._pick(self.keyword_weights)]
+        if rng.random() < AUTOMODERATOR_SHARE:
+            author = "AutoModerator"
+        else:
+            author = f"user_{self._pick(self.author_weights)}"
+        # sqrt skews timestamps towards the present: mention volume grows over time
+        received_at = self.now - timedelta(seconds=self.span * (1 - rng.random() ** 0.5))
+        length = max(3, int(rng.lognormvariate(3.0, 0.8)))
+        words = rng.choices(WORDS, k=length)
+        words.insert(rng.randrange(len(words) + 1), keyword.lower())
+        post = f"{rng.getrandbits(40):x}"
+        return (
+            received_at.strftime("%b %d, %Y %H:%M"),
+            author,
+            f"https://www.reddit.com/r/{rng.choice(SUBREDDITS)}/comments/{post}/",
+            " ".join(words),
+            SENTIMENTS[self._pick(self.sentiment_weights)][0],
+            received_at.isoformat(sep=" "),
+            keyword.lower(),
+            keyword,
+        )
+
+
+def copy_rows(conn, gen, rows):
+    """COPY rows in BATCH_ROWS chunks, one transaction per chunk."""
+    loaded = 0
+    while loaded < rows:
+        n = min(BATCH_ROWS, rows - loaded)
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for _ in range(n):
+            writer.writerow(["" if v is None else v for v in gen.row()])
+        buf.seek(0)
+        with conn.cursor() as cur:
+            # Empty unquoted fields load as NULL (sentiment)
+            cur.copy_expert(f"COPY kwatch_alert_results ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buf)
+        conn.commit()
+        loaded += n
+        print(f"  {loaded:,}/{rows:,} rows", file=sys.stderr)
+    return loaded
+
+
+def reset(conn):
+    """Empty the alert table and everything derived from it."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('kwatch_daily_rollup') IS NOT NULL")
+        derived = cur.fetchone()[0]
+        cur.execute("TRUNCATE kwatch_alert_results RESTART IDENTITY")
+        if derived:
+            cur.execute("TRUNCATE kwatch_daily_rollup, kwatch_hourly_rollup, kwatch_author_sketches, kwatch_author_daily, kwatch_author_totals")
+            cur.execute("UPDATE rollup_watermarks SET last_id = 0")
+    conn.commit()
+
+
+def finish(conn):
+    """Migrate, fold every rollup up to the new high-water mark and refresh planner statistics."""
+    api_service.run_migrations(conn)
+    timings = {}
+    for name, refresh in api_service.ROLLUPS:
+        t0 = time.perf_counter()
+        refresh(conn)
+        timings[name] = round(time.perf_counter() - t0, 2)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE")
+    finally:
+        conn.autocommit = False
+    return timings
+
+
+def generate(conn, rows, seed=7, years=3, truncate=False):
+    with conn.cursor() as cur:
+        cur.execute(CREATE_TABLE)
+    conn.commit()
+    if truncate:
+        reset(conn)
+
+    t0 = time.perf_counter()
+    loaded = copy_rows(conn, RowGenerator(rows, seed, years), rows)
+    load_s = time.perf_counter() - t0
+    rollup_s = finish(conn)
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM kwatch_alert_results")
+        total = cur.fetchone()[0]
+    conn.rollback()
+    return {
+        "loaded": loaded,
+        "total_rows": total,
+        "seed": seed,
+        "years": years,
+        "load_s": round(load_s, 2),
+        "rows_per_s": round(loaded / load_s) if load_s else None,
+        "rollup_s": rollup_s,
+    }
+
+
+def check_local(force):
+    if api_service.DB_HOST not in ("localhost", "127.0.0.1", "::1") and not force:
+        raise SystemExit(f"Refusing to load synthetic data into DB_HOST={api_service.DB_HOST}; pass --force to override.")
+    if not api_service.ensure_db_pool():
+        raise SystemExit(f"No database connection available: {api_service.db_state.error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--truncate", action="store_true", help="Empty the alert and rollup tables first")
+    parser.add_argument("--force", action="store_true", help="Allow a non-local DB_HOST")
+    args = parser.parse_args()
+
+    check_local(args.force)
+    conn = api_service.db_pool.getconn()
+    try:
+        print(json.dumps(generate(conn, args.rows, args.seed, args.years, args.truncate), indent=2))
+    finally:
+        api_service.db_pool.putconn(conn)
+
+
+if __name__ == "__main__":
+    main()
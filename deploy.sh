@@ -43,6 +43,12 @@ ssh $KEY_ARG $USER@$HOST <<EOF
     
     # Check status
     sudo systemctl status drugsafety-backend --no-pager | head -n 5
+
+    # Wait until the new worker has its database pool and migrations (see /api/ready)
+    for i in \$(seq 1 60); do
+        if curl -fs http://127.0.0.1:8000/api/ready > /dev/null; then echo "Backend ready."; break; fi
+        sleep 1
+    done
 EOF
 
 echo "✅ Deployment Complete!"
@@ -1,7 +1,7 @@
 import { useState, useEffect } from 'react';
 import './App.css';
 import {
-    fetchKeywords, fetchMentions, fetchAuthors, fetchUniqueAuthors, fetchMentionById
+    fetchKeywords, fetchMentions, fetchAuthors, fetchDashboard, fetchMentionById, subscribeMentions
 } from './services/api';
 import KeywordDropdown from './components/KeywordDropdown';
 import PostDetail from './components/PostDetail';
@@ -45,12 +45,16 @@ function App() {
     const [totalMentions, setTotalMentions] = useState(0);
     const [loadingMentions, setLoadingMentions] = useState(false);
     const [mentionsPage, setMentionsPage] = useState(0);
+    const [mentionsCursor, setMentionsCursor] = useState(null);
     const [hasMoreMentions, setHasMoreMentions] = useState(true);
+    // Bumped when the live feed falls too far behind, to reload the first page
+    const [feedResets, setFeedResets] = useState(0);
 
     const [authors, setAuthors] = useState([]);
     const [totalAuthors, setTotalAuthors] = useState(0);
     const [loadingAuthors, setLoadingAuthors] = useState(false);
     const [authorsPage, setAuthorsPage] = useState(0);
+    const [authorsCursor, setAuthorsCursor] = useState(null);
     const [hasMoreAuthors, setHasMoreAuthors] = useState(true);
 
     const [selectedPost, setSelectedPost] = useState(() => {
@@ -109,62 +113,67 @@ function App() {
             .catch(err => console.error(err));
     }, []);
 
-    // Fetch Mentions & Authors on Keyword Change (Reset Pagination)
+    // Fetch Mentions & Authors on Keyword Change or Feed Reset (Reset Pagination)
     useEffect(() => {
         setMentions([]);
         setMentionsPage(0);
+        setMentionsCursor(null);
         setHasMoreMentions(true);
         setLoadingMentions(true);
 
-        fetchMentions(selectedKeywords, 0)
-            .then(data => {
-                const newMentions = data.mentions || [];
-                setMentions(newMentions);
-                setTotalMentions(data.total || 0);
-                setHasMoreMentions(newMentions.length < (data.total || 0));
-                setLoadingMentions(false);
-            })
-            .catch(err => {
-                console.error(err);
-                setLoadingMentions(false);
-            });
-
         // Authors
         setAuthors([]);
         setAuthorsPage(0);
+        setAuthorsCursor(null);
         setHasMoreAuthors(true);
         setLoadingAuthors(true);
 
-        fetchAuthors(selectedKeywords, 0)
+        // One round trip for the first mentions page, first authors page and unique author count
+        fetchDashboard(selectedKeywords)
             .then(data => {
-                const newAuthors = data.authors || [];
+                const mentionsData = data.mentions || {};
+                const newMentions = mentionsData.mentions || [];
+                setMentions(newMentions);
+                setMentionsCursor(mentionsData.next_cursor || null);
+                setTotalMentions(mentionsData.total || 0);
+                setHasMoreMentions(newMentions.length < (mentionsData.total || 0));
+                setLoadingMentions(false);
+
+                const authorsData = data.authors || {};
+                const newAuthors = authorsData.authors || [];
                 setAuthors(newAuthors);
-                setTotalAuthors(data.total || 0);
-                setHasMoreAuthors(newAuthors.length < (data.total || 0));
+                setAuthorsCursor(authorsData.next_cursor || null);
+                // The author total is a sketch estimate; next_cursor is only set after a full page
+                setHasMoreAuthors(Boolean(authorsData.next_cursor));
+                setTotalAuthors(data.unique_authors?.count ?? authorsData.total ?? 0);
                 setLoadingAuthors(false);
             })
             .catch(err => {
                 console.error(err);
+                setLoadingMentions(false);
                 setLoadingAuthors(false);
             });
+    }, [selectedKeywords, feedResets]);
 
-        fetchUniqueAuthors(selectedKeywords)
-            .then(data => {
-                setTotalAuthors(data.count || 0);
-            })
-            .catch(err => console.error(err));
+    // Prepend new mentions as they arrive instead of re-polling
+    useEffect(() => {
+        return subscribeMentions(selectedKeywords, mention => {
+            setMentions(prev => prev.some(m => m.id === mention.id) ? prev : [mention, ...prev]);
+            setTotalMentions(prev => prev + 1);
+        }, () => setFeedResets(n => n + 1));
     }, [selectedKeywords]);
 
     const loadMoreMentions = () => {
         if (loadingMentions || !hasMoreMentions) return;
         setLoadingMentions(true);
         const nextPage = mentionsPage + 1;
-        fetchMentions(selectedKeywords, nextPage)
+        fetchMentions(selectedKeywords, nextPage, 50, mentionsCursor)
             .then(data => {
                 const newMentions = data.mentions || [];
                 setMentions(prev => [...prev, ...newMentions]);
                 setMentionsPage(nextPage);
-                setHasMoreMentions((mentions.length + newMentions.length) < data.total);
+                setMentionsCursor(data.next_cursor || null);
+                setHasMoreMentions(Boolean(data.next_cursor) && (mentions.length + newMentions.length) < data.total);
                 setLoadingMentions(false);
             })
             .catch(err => {
@@ -177,12 +186,13 @@ function App() {
         if (loadingAuthors || !hasMoreAuthors) return;
         setLoadingAuthors(true);
         const nextPage = authorsPage + 1;
-        fetchAuthors(selectedKeywords, nextPage)
+        fetchAuthors(selectedKeywords, nextPage, 50, authorsCursor)
             .then(data => {
                 const newAuthors = data.authors || [];
                 setAuthors(prev => [...prev, ...newAuthors]);
                 setAuthorsPage(nextPage);
-                setHasMoreAuthors((authors.length + newAuthors.length) < data.total);
+                setAuthorsCursor(data.next_cursor || null);
+                setHasMoreAuthors(Boolean(data.next_cursor));
                 setLoadingAuthors(false);
             })
             .catch(err => {
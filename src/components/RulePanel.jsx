@@ -128,8 +128,8 @@ const RulePanel = ({
         try {
             // Determine Chaining Context
             let contextResult = null;
+            const currentIndex = rules.findIndex(r => r.id === activeRuleId);
             if (useChaining && rules.length > 0) {
-                const currentIndex = rules.findIndex(r => r.id === activeRuleId);
                 if (currentIndex > 0) {
                     const prevRuleId = rules[currentIndex - 1].id;
                     contextResult = ruleResults[prevRuleId];
@@ -142,7 +142,8 @@ const RulePanel = ({
                 selectedKeywords,
                 startDate,
                 endDate,
-                contextResult
+                contextResult,
+                Boolean(rules[currentIndex + 1]?.is_chaining)
             );
             onExecutionComplete(result);
         } catch (err) {
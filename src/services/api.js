@@ -31,9 +31,10 @@ export const deleteRule = async (id) => {
     return res.json();
 };
 
-export const fetchAuthors = async (keywords, page = 0, limit = 50) => {
+export const fetchAuthors = async (keywords, page = 0, limit = 50, cursor = null) => {
     const offset = page * limit;
     let url = `${API_BASE_URL}/api/stats/authors?offset=${offset}&limit=${limit}`;
+    if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
     if (Array.isArray(keywords)) {
         keywords.forEach(kw => {
             url += `&keyword=${encodeURIComponent(kw)}`;
@@ -52,9 +53,10 @@ export const fetchKeywords = async () => {
     return res.json();
 };
 
-export const fetchMentions = async (keywords, page = 0, limit = 50) => {
+export const fetchMentions = async (keywords, page = 0, limit = 50, cursor = null) => {
     const offset = page * limit;
     let url = `${API_BASE_URL}/api/mentions?offset=${offset}&limit=${limit}`;
+    if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
     if (Array.isArray(keywords)) {
         keywords.forEach(kw => {
             url += `&keyword=${encodeURIComponent(kw)}`;
@@ -68,6 +70,31 @@ export const fetchMentions = async (keywords, page = 0, limit = 50) => {
     return res.json();
 };
 
+// Server-sent new mentions for the keywords; EventSource reconnects resume via Last-Event-ID.
+// Returns a function that closes the stream.
+export const subscribeMentions = (keywords, onMention, onReset) => {
+    const params = new URLSearchParams();
+    (Array.isArray(keywords) ? keywords : [keywords]).forEach(kw => params.append('keyword', kw));
+    const source = new EventSource(`${API_BASE_URL}/api/mentions/stream?${params}`);
+    source.addEventListener('mention', e => onMention(JSON.parse(e.data)));
+    if (onReset) source.addEventListener('reset', () => onReset());
+    return () => source.close();
+};
+
+export const fetchDashboard = async (keywords, limit = 50) => {
+    let url = `${API_BASE_URL}/api/dashboard?mentions_limit=${limit}&authors_limit=${limit}`;
+    if (Array.isArray(keywords)) {
+        keywords.forEach(kw => {
+            url += `&keyword=${encodeURIComponent(kw)}`;
+        });
+    } else if (keywords && keywords !== 'All') {
+        url += `&keyword=${encodeURIComponent(keywords)}`;
+    }
+    const res = await fetch(url);
+    if (!res.ok) throw new Error('Failed to fetch dashboard');
+    return res.json();
+};
+
 export const fetchUniqueAuthors = async (keywords) => {
     let url = `${API_BASE_URL}/api/stats/unique-authors?`;
     if (Array.isArray(keywords)) {
@@ -82,7 +109,7 @@ export const fetchUniqueAuthors = async (keywords) => {
     if (!res.ok) throw new Error('Failed to fetch author stats');
     return res.json();
 };
-export const executeRule = async (ruleId, keywords = ['All'], startDate = null, endDate = null, previousResult = null) => {
+export const executeRule = async (ruleId, keywords = ['All'], startDate = null, endDate = null, previousResult = null, keepResult = false) => {
     const res = await fetch(`${API_BASE_URL}/api/rules/execute`, {
         method: 'POST',
         headers: {
@@ -93,7 +120,11 @@ export const executeRule = async (ruleId, keywords = ['All'], startDate = null,
             keywords: keywords,
             start_date: startDate,
             end_date: endDate,
-            previous_result: previousResult
+            // Results kept server-side are referenced by handle instead of being posted back
+            previous_handle: previousResult?.handle || null,
+            previous_result: previousResult?.handle ? null : previousResult,
+            // Only results a following step chains from are kept server-side
+            keep_result: keepResult
         }),
     });
     if (!res.ok) throw new Error("Failed to execute rule");
@@ -2,11 +2,15 @@ import pytest
 from unittest.mock import MagicMock
 import sys
 import os
+from datetime import datetime
 
 # Add parent dir to sys.path to import api_service
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")  # rules refuse to run without one; no call is ever made
 
-from api_service import app, get_db_connection
+import api_service
+from api_service import app, get_db_connection, get_read_connection, get_connector, get_read_connector
+import contextlib
 
 # Mock Data
 MOCK_KEYWORDS = [
@@ -19,13 +23,21 @@ MOCK_MENTIONS = [
         'id': 1,
         'author': 'user1',
         'content': 'Test content',
-        'received_at': '2023-01-01T12:00:00',
+        'received_at': datetime(2023, 1, 1, 12, 0, 0),
         'url': 'http://test.com',
         'sentiment': 'positive',
         'keyword': 'Ozempic'
     }
 ]
 
+class MockRow(dict):
+    """Served to both RealDictCursor (row['id']) and tuple cursors (row[0])."""
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return list(self.values())[key]
+        return super().__getitem__(key)
+
 @pytest.fixture
 def mock_db_cursor():
     cursor = MagicMock()
@@ -33,15 +45,41 @@ def mock_db_cursor():
     # Configure cursor behavior based on executed query
     def execute_side_effect(query, params=None):
         query_str = query.strip().upper()
-        if "SELECT KEYWORD" in query_str:
+        if query_str.startswith("EXPLAIN (FORMAT JSON)"):
+            cursor.fetchone.return_value = ([{"Plan": {"Node Type": "Limit", "Total Cost": 10.0, "Plan Rows": 1}}],)
+        elif "AS RULE_QUERY LIMIT" in query_str:
+            cursor.description = [(k,) for k in MOCK_MENTIONS[0]]
+            cursor.fetchmany.side_effect = [[tuple(m.values()) for m in MOCK_MENTIONS], []]
+        elif "FROM SAVED_RULES_VERSION" in query_str:
+            cursor.fetchone.return_value = (3, datetime(2023, 1, 2, 9, 30, 0))
+        elif "SUM(LAST_ID) FROM ROLLUP_WATERMARKS" in query_str:
+            cursor.fetchone.return_value = (1, datetime(2023, 1, 1, 12, 0, 0), 1)
+        elif "TS_HEADLINE" in query_str:
+            cursor.fetchall.return_value = [
+                MockRow(m, rank=0.5, snippet='<mark>Test</mark> content') for m in MOCK_MENTIONS
+            ]
+        elif "KWATCH_AUTHOR_TOTALS" in query_str or "KWATCH_AUTHOR_DAILY" in query_str:
+            if query_str.startswith("SELECT COUNT(*)"):
+                cursor.fetchone.return_value = (2,)
+            elif "PARTITION BY KEYWORD" in query_str or "LATERAL" in query_str:
+                cursor.fetchall.return_value = [('Ozempic', 'user1', 3), ('Ozempic', 'user2', 1)]
+            else:
+                cursor.fetchall.return_value = [('user1', 3), ('user2', 1)]
+        elif "SELECT KEYWORD" in query_str:
             cursor.fetchall.return_value = MOCK_KEYWORDS
         elif "SELECT ID" in query_str:
-            cursor.fetchall.return_value = MOCK_MENTIONS
-            cursor.fetchone.return_value = MOCK_MENTIONS[0]
+            cursor.fetchall.return_value = [MockRow(m) for m in MOCK_MENTIONS]
+            cursor.fetchone.return_value = dict(MOCK_MENTIONS[0])
+        elif "SELECT COUNT(*)" in query_str:
+            cursor.fetchone.return_value = {'count': len(MOCK_MENTIONS)}
+        elif "BIT_OR(SKETCH)" in query_str:
+            sketch = api_service.hll_sketch(f"author{i}" for i in range(40))
+            cursor.fetchone.return_value = {0: sketch, 'sketch': sketch}
         elif "COUNT(DISTINCT AUTHOR)" in query_str:
-            cursor.fetchone.return_value = [42]
-        elif "GROUP BY DATE" in query_str:
-             cursor.fetchall.return_value = [{'date': '2023-01-01', 'count': 10}]
+            # Served to both tuple cursors (row[0]) and RealDictCursor (row['count'])
+            cursor.fetchone.return_value = {0: 42, 'count': 42}
+        elif "AS DATE" in query_str and "_ROLLUP" in query_str:
+             cursor.fetchall.return_value = [MockRow(date='2023-01-01', count=10)]
         elif "GROUP BY SENTIMENT" in query_str:
              cursor.fetchall.return_value = [{'sentiment': 'positive', 'count': 5}]
     
@@ -57,6 +95,13 @@ def mock_db_connection(mock_db_cursor):
 @pytest.fixture
 def client(mock_db_connection):
     # Override dependency
+    api_service._mention_totals.clear()
+    api_service.analytics_cache = api_service.ResponseCache()
+    api_service.metrics.clear()
+    api_service.slow_queries.clear()
     app.dependency_overrides[get_db_connection] = lambda: mock_db_connection
+    app.dependency_overrides[get_read_connection] = lambda: mock_db_connection
+    app.dependency_overrides[get_connector] = lambda: lambda: contextlib.nullcontext(mock_db_connection)
+    app.dependency_overrides[get_read_connector] = lambda: lambda: contextlib.nullcontext(mock_db_connection)
     from fastapi.testclient import TestClient
     return TestClient(app)
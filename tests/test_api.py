@@ -1,3 +1,10 @@
+import contextlib
+import json
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
 def test_health_check(client):
     response = client.get("/health")
     assert response.status_code == 200
@@ -22,9 +29,29 @@ def test_get_mentions(client):
     assert data['mentions'][0]['keyword'] == 'Ozempic'
 
 def test_get_unique_authors(client):
-    response = client.get("/api/stats/unique-authors?keyword=Ozempic")
+    response = client.get("/api/stats/unique-authors?keyword=Ozempic&exact=true")
+    assert response.status_code == 200
+    assert response.json() == {"count": 42, "estimated": False}
+
+def test_get_unique_authors_from_sketches(client, mock_db_cursor):
+    response = client.get("/api/stats/unique-authors?keyword=Ozempic&start=2023-01-01")
     assert response.status_code == 200
-    assert response.json() == {"count": 42}
+    data = response.json()
+    assert data['estimated'] is True
+    assert abs(data['count'] - 40) <= 2
+    query, params = mock_db_cursor.execute.call_args[0]
+    assert "FROM kwatch_author_sketches" in query
+    assert params == (('Ozempic',), '2023-01-01')
+
+def test_hll_sketches_merge_and_estimate():
+    from api_service import hll_estimate, hll_sketch
+    a = hll_sketch(f"user{i}" for i in range(0, 30000))
+    b = hll_sketch(f"user{i}" for i in range(20000, 50000))
+    merged = "".join("1" if x == "1" or y == "1" else "0" for x, y in zip(a, b))
+
+    assert hll_estimate(merged) == hll_estimate(hll_sketch(f"user{i}" for i in range(50000)))
+    assert abs(hll_estimate(merged) - 50000) / 50000 < 0.05
+    assert hll_estimate(hll_sketch([])) == 0
 
 def test_get_counts_by_day(client):
     response = client.get("/api/stats/counts-by-day")
@@ -38,3 +65,1121 @@ def test_get_sentiment(client):
     assert response.status_code == 200
     data = response.json()
     assert data['positive'] == 5
+
+def test_get_mentions_cursor_roundtrip(client, mock_db_cursor):
+    response = client.get("/api/mentions?keyword=Ozempic&limit=1")
+    assert response.status_code == 200
+    cursor = response.json()['next_cursor']
+    assert cursor
+
+    response = client.get(f"/api/mentions?keyword=Ozempic&limit=1&cursor={cursor}")
+    assert response.status_code == 200
+    query, params = mock_db_cursor.execute.call_args[0]
+    # The rest of the dated rows, then the undated ones
+    assert "(received_at, id) < (%s, %s) ORDER BY received_at DESC NULLS LAST, id DESC LIMIT %s" in query
+    assert "received_at IS NULL ORDER BY received_at DESC NULLS LAST, id DESC LIMIT %s" in query
+    assert params == (('Ozempic',), datetime(2023, 1, 1, 12, 0, 0), 1, 1, ('Ozempic',), 1, 1)
+
+def test_get_mentions_cursor_continues_past_undated_rows(client, mock_db_cursor):
+    import api_service
+    original = mock_db_cursor.execute.side_effect
+
+    def execute(query, params=None):
+        original(query, params)
+        if "NULLS LAST" in query:
+            mock_db_cursor.fetchall.return_value = [(7, 'user1', 'Undated', None, 'http://u', None, 'Ozempic')]
+    mock_db_cursor.execute.side_effect = execute
+
+    response = client.get("/api/mentions?keyword=Ozempic&limit=1")
+    assert response.status_code == 200
+    cursor = response.json()['next_cursor']
+    assert api_service.decode_cursor(cursor) == (None, 7)
+
+    response = client.get(f"/api/mentions?keyword=Ozempic&limit=1&cursor={cursor}")
+    assert response.status_code == 200
+    query, params = mock_db_cursor.execute.call_args[0]
+    assert "AND received_at IS NULL AND id < %s ORDER BY received_at DESC NULLS LAST, id DESC LIMIT %s" in query
+    assert "UNION ALL" not in query
+    assert params == (('Ozempic',), 7, 1)
+
+def test_get_mentions_total_respects_dates_and_is_cached(client, mock_db_cursor):
+    client.get("/api/mentions?keyword=Ozempic&start=2023-01-01")
+    client.get("/api/mentions?keyword=Ozempic&start=2023-01-01&offset=50")
+    count_calls = [c for c in mock_db_cursor.execute.call_args_list if "COUNT(*)" in c[0][0]]
+    assert len(count_calls) == 1
+    assert "received_at >= %s" in count_calls[0][0][0]
+
+def test_get_mentions_invalid_cursor(client):
+    response = client.get("/api/mentions?cursor=not-a-cursor")
+    assert response.status_code == 400
+
+def test_counts_by_day_reads_rollup_with_date_range(client, mock_db_cursor):
+    response = client.get("/api/stats/counts-by-day?keyword=Ozempic&start=2023-01-01&end=2023-01-31")
+    assert response.status_code == 200
+    query, params = mock_db_cursor.execute.call_args[0]
+    assert "FROM kwatch_daily_rollup" in query
+    assert "kwatch_alert_results" not in query
+    assert params == (('Ozempic',), '2023-01-01', '2023-01-31')
+
+def test_counts_by_day_bounds_are_day_granular_for_day_buckets(client, mock_db_cursor):
+    mock_db_cursor.execute.side_effect = None
+    mock_db_cursor.fetchone.return_value = (1, datetime(2023, 1, 20), 1)  # data watermark
+    mock_db_cursor.fetchall.return_value = [('2023-01-01', 7), ('2023-01-02', 3)]
+    # The time of day in start/end doesn't narrow the edge days: they count whole
+    response = client.get("/api/stats/counts-by-day?start=2023-01-01T15:00&end=2023-01-02T09:00")
+    assert response.status_code == 200
+    assert [(r['date'], r['count']) for r in response.json()] == [('2023-01-01', 7), ('2023-01-02', 3)]
+    query, params = mock_db_cursor.execute.call_args[0]
+    assert "day >= %s::date" in query and "day <= %s::date" in query
+    assert params == ('2023-01-01T15:00', '2023-01-02T09:00')
+
+def test_counts_by_day_weekly_series_zero_filled_from_one_query(client, mock_db_cursor):
+    mock_db_cursor.execute.side_effect = None
+    mock_db_cursor.fetchone.return_value = (1, datetime(2023, 1, 20), 1)  # data watermark
+    mock_db_cursor.fetchall.return_value = [
+        ('2023-01-02', 'negative', 4), ('2023-01-02', 'positive', 1), ('2023-01-16', 'positive', 2),
+    ]
+    response = client.get("/api/stats/counts-by-day?start=2023-01-04&end=2023-01-20&granularity=week&group_by=sentiment")
+    assert response.status_code == 200
+    data = response.json()
+    assert [(r['date'], r['sentiment'], r['count']) for r in data] == [
+        ('2023-01-02', 'negative', 4), ('2023-01-02', 'positive', 1),
+        ('2023-01-09', 'negative', 0), ('2023-01-09', 'positive', 0),
+        ('2023-01-16', 'negative', 0), ('2023-01-16', 'positive', 2),
+    ]
+    queries = [c[0] for c in mock_db_cursor.execute.call_args_list if "AS date" in c[0][0]]
+    assert len(queries) == 1
+    query, params = queries[0]
+    assert "date_trunc('week', day)::date AS date" in query and "FROM kwatch_daily_rollup" in query
+    assert "GROUP BY 1, 2" in query
+    assert params == ('2023-01-04', '2023-01-20')
+
+def test_counts_by_day_hourly_buckets(client, mock_db_cursor):
+    assert client.get("/api/stats/counts-by-day?granularity=hour").status_code == 400
+    assert client.get("/api/stats/counts-by-day?granularity=hour&start=2020-01-01&end=2023-01-01").status_code == 400
+
+    mock_db_cursor.execute.side_effect = None
+    mock_db_cursor.fetchall.return_value = [(datetime(2023, 1, 1, 1), 3)]
+    response = client.get("/api/stats/counts-by-day?keyword=Ozempic&granularity=hour&start=2023-01-01T00:30&end=2023-01-01T02:00")
+    assert response.status_code == 200
+    assert [(r['date'], r['count']) for r in response.json()] == [
+        ('2023-01-01T00:00:00', 0), ('2023-01-01T01:00:00', 3), ('2023-01-01T02:00:00', 0),
+    ]
+    query, params = mock_db_cursor.execute.call_args_list[-1][0]
+    assert "FROM kwatch_hourly_rollup" in query
+    assert params == (('Ozempic',), '2023-01-01T00:30', '2023-01-01T02:00')
+
+def test_counts_by_day_converts_offset_bounds_to_utc(client, mock_db_cursor):
+    mock_db_cursor.execute.side_effect = None
+    mock_db_cursor.fetchone.return_value = (1, datetime(2023, 1, 1), 1)  # data watermark
+    mock_db_cursor.fetchall.return_value = [(datetime(2023, 1, 1, 1), 3)]
+    response = client.get("/api/stats/counts-by-day?granularity=hour&start=2023-01-01T02:30%2B02:00&end=2023-01-01T02:00Z")
+    assert response.status_code == 200
+    assert [(r['date'], r['count']) for r in response.json()] == [
+        ('2023-01-01T00:00:00', 0), ('2023-01-01T01:00:00', 3), ('2023-01-01T02:00:00', 0),
+    ]
+    query, params = mock_db_cursor.execute.call_args[0]
+    assert params == ('2023-01-01T00:30:00', '2023-01-01T02:00:00')
+
+    # Open-ended: the last bucket comes from the (naive) current time
+    response = client.get(f"/api/stats/counts-by-day?granularity=hour&start={datetime.utcnow().strftime('%Y-%m-%dT%H:00')}Z")
+    assert response.status_code == 200
+
+def test_refresh_daily_rollup_advances_watermark():
+    import api_service
+    from api_service import refresh_daily_rollup
+    cursor = MagicMock()
+    # lock acquired, watermark 100, batch of 3 rows up to id 103
+    cursor.fetchone.side_effect = [(True,), (100,), (103, 3)]
+    # id 90 was still uncommitted when an earlier batch passed it, and has committed since
+    noted = datetime(2023, 1, 1, 12, 0, 0)
+    cursor.fetchall.return_value = [(90, 91, noted)]
+    conn = MagicMock()
+    conn.cursor.return_value.__enter__.return_value = cursor
+
+    assert refresh_daily_rollup(conn, batch_size=10) == 3
+    calls = [c[0] for c in cursor.execute.call_args_list]
+    assert "ON CONFLICT (keyword, day, sentiment)" in calls[3][0]
+    assert calls[3][1] == (100, 103)
+    assert "INSERT INTO rollup_gaps" in calls[4][0]
+    assert calls[4][1] == ('daily', None, 100, 100, 103, 103)
+    assert calls[5][1] == (103, 'daily')
+    conn.commit.assert_called_once()
+
+    # The filled gap is folded on its own and whatever is still missing in it keeps its deadline
+    assert "DELETE FROM rollup_gaps" in calls[6][0] and calls[6][1] == ('daily', api_service.ROLLUP_GAP_TTL)
+    assert "RETURNING lo, hi, noted_at" in calls[7][0]
+    assert "ON CONFLICT (keyword, day, sentiment)" in calls[8][0] and calls[8][1] == (89, 91)
+    assert calls[9][1] == ('daily', noted, 89, 89, 91, 91)
+    assert calls[10] == ("UPDATE rollup_watermarks SET updated_at = CURRENT_TIMESTAMP WHERE name = %s", ('daily',))
+
+def test_refresh_author_counts_folds_daily_and_total_aggregates():
+    from api_service import refresh_author_counts
+    cursor = MagicMock()
+    cursor.fetchone.side_effect = [(True,), (0,), (7, 7)]
+    conn = MagicMock()
+    conn.cursor.return_value.__enter__.return_value = cursor
+
+    assert refresh_author_counts(conn, batch_size=10) == 7
+    fold_sql, fold_params = cursor.execute.call_args_list[3][0]
+    assert "ON CONFLICT (keyword, day, author)" in fold_sql
+    assert "ON CONFLICT (keyword, author)" in fold_sql
+    assert fold_params == (0, 7, '*')
+    assert cursor.execute.call_args_list[5][0][1] == (7, 'author_counts')
+
+def test_author_leaderboard_pages_by_cursor(client, mock_db_cursor):
+    import api_service
+    response = client.get("/api/stats/authors?keyword=Ozempic&limit=2")
+    assert response.status_code == 200
+    data = response.json()
+    assert data['authors'] == [{'author': 'user1', 'count': 3}, {'author': 'user2', 'count': 1}]
+    assert data['next_cursor']
+    query, params = mock_db_cursor.execute.call_args_list[-1][0]
+    assert "FROM kwatch_author_totals WHERE keyword = %s" in query
+    assert params == ('Ozempic', 2, 0)
+
+    response = client.get(f"/api/stats/authors?keyword=Ozempic&limit=2&cursor={data['next_cursor']}")
+    assert response.status_code == 200
+    query, params = mock_db_cursor.execute.call_args_list[-1][0]
+    assert "(count, author) < (%s, %s)" in query
+    assert params == ('Ozempic', 1, 'user2', 2)
+
+    # A mention cursor isn't an author cursor
+    mention_cursor = api_service.encode_cursor(datetime(2023, 1, 1), 5)
+    assert client.get(f"/api/stats/authors?cursor={mention_cursor}").status_code == 400
+
+def test_author_leaderboard_date_range_reads_daily_aggregates(client, mock_db_cursor):
+    response = client.get("/api/stats/authors?keyword=Ozempic&keyword=Wegovy&start=2023-01-01&end=2023-01-31&exact=true")
+    assert response.status_code == 200
+    assert response.json()['total'] == 2
+    query, params = mock_db_cursor.execute.call_args_list[-1][0]
+    assert "FROM kwatch_author_daily" in query
+    assert params == (('Ozempic', 'Wegovy'), '2023-01-01', '2023-01-31', 50, 0)
+    executed = [c[0][0] for c in mock_db_cursor.execute.call_args_list]
+    assert not any("kwatch_alert_results" in q for q in executed if "MAX(id)" not in q)
+
+def test_top_authors_per_keyword_in_one_query(client, mock_db_cursor):
+    response = client.get("/api/stats/authors/top?keyword=Ozempic&keyword=Wegovy&start=2023-01-01&n=2")
+    assert response.status_code == 200
+    data = response.json()
+    assert data['keywords'] == {
+        'Ozempic': [{'author': 'user1', 'count': 3}, {'author': 'user2', 'count': 1}],
+        'Wegovy': [],
+    }
+    ranked = [c for c in mock_db_cursor.execute.call_args_list if "PARTITION BY keyword" in c[0][0]]
+    assert len(ranked) == 1
+    assert ranked[0][0][1] == (('Ozempic', 'Wegovy'), '2023-01-01', 2)
+
+def test_analytics_cache_normalizes_keywords(client, mock_db_cursor):
+    client.get("/api/stats/sentiment?keyword=Wegovy&keyword=Ozempic")
+    client.get("/api/stats/sentiment?keyword=Ozempic&keyword=Wegovy&keyword=Ozempic")
+    sentiment_calls = [c for c in mock_db_cursor.execute.call_args_list if "GROUP BY SENTIMENT" in c[0][0].upper()]
+    assert len(sentiment_calls) == 1
+    assert sentiment_calls[0][0][1] == (('Ozempic', 'Wegovy'),)
+
+    stats = client.get("/api/cache/stats").json()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+
+def test_analytics_cache_invalidates_on_watermark_move(client, mock_db_cursor):
+    import api_service
+    client.get("/api/stats/sentiment")
+    # Simulate a new alert row arriving and the watermark re-check interval elapsing
+    api_service.analytics_cache._watermark_checked_at = 0.0
+    original = mock_db_cursor.execute.side_effect
+    def moved(query, params=None):
+        original(query, params)
+        if "SUM(LAST_ID) FROM ROLLUP_WATERMARKS" in query.strip().upper():
+            mock_db_cursor.fetchone.return_value = (2, datetime(2023, 1, 2), 1)
+    mock_db_cursor.execute.side_effect = moved
+
+    client.get("/api/stats/sentiment")
+    sentiment_calls = [c for c in mock_db_cursor.execute.call_args_list if "GROUP BY SENTIMENT" in c[0][0].upper()]
+    assert len(sentiment_calls) == 2
+    assert client.get("/api/cache/stats").json()['invalidations'] == 1
+
+def _fake_connection():
+    import psycopg2.extensions
+    conn = MagicMock()
+    conn.closed = 0
+    conn.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    return conn
+
+def test_connection_pool_acquire_timeout(monkeypatch):
+    import api_service
+    monkeypatch.setattr(api_service.psycopg2, "connect", lambda **kw: _fake_connection())
+    pool = api_service.BoundedConnectionPool(0, 1, acquire_timeout=0.05)
+
+    conn = pool.getconn()
+    assert pool.stats()['in_use'] == 1
+    with pytest.raises(api_service.PoolTimeout):
+        pool.getconn()
+    assert pool.stats()['timeouts'] == 1
+
+    pool.putconn(conn)
+    assert pool.stats()['idle'] == 1
+    assert pool.getconn() is conn
+
+def test_connection_pool_replaces_stale_connection(monkeypatch):
+    import api_service
+    monkeypatch.setattr(api_service.psycopg2, "connect", lambda **kw: _fake_connection())
+    pool = api_service.BoundedConnectionPool(1, 2, validate_after=0)
+
+    stale = pool.getconn()
+    stale.cursor.return_value.__enter__.return_value.execute.side_effect = Exception("server closed the connection")
+    pool.putconn(stale)
+
+    fresh = pool.getconn()
+    assert fresh is not stale
+    stats = pool.stats()
+    assert stats['discarded'] == 1
+    assert stats['size'] == 1
+
+def test_pool_timeout_maps_to_503(monkeypatch):
+    import api_service
+    pool = MagicMock()
+    pool.getconn.side_effect = api_service.PoolTimeout("busy")
+    monkeypatch.setattr(api_service, "db_pool", pool)
+    with pytest.raises(api_service.HTTPException) as exc:
+        next(api_service.get_db_connection())
+    assert exc.value.status_code == 503
+
+def test_dashboard_returns_all_panels(client, mock_db_connection, monkeypatch):
+    import api_service
+    from concurrent.futures import ThreadPoolExecutor
+    pool = MagicMock()
+    pool.getconn.return_value = mock_db_connection
+    monkeypatch.setattr(api_service, "db_pool", pool)
+    # The shared mock cursor isn't thread-safe, so run the panels one at a time
+    monkeypatch.setattr(api_service, "dashboard_executor", ThreadPoolExecutor(max_workers=1))
+
+    response = client.get("/api/dashboard?keyword=Ozempic")
+    assert response.status_code == 200
+    data = response.json()
+    assert data['errors'] == {}
+    assert data['keywords'][0]['keyword'] == "All"
+    assert abs(data['unique_authors']['count'] - 40) <= 2
+    assert data['sentiment']['positive'] == 5
+    assert len(data['mentions']['mentions']) == 1
+    assert pool.getconn.call_count == pool.putconn.call_count == 6
+
+def _use_pool(monkeypatch, conn):
+    import api_service
+    pool = MagicMock()
+    pool.getconn.return_value = conn
+    monkeypatch.setattr(api_service, "db_pool", pool)
+    return pool
+
+def test_export_mentions_streams_ndjson(client, mock_db_connection, mock_db_cursor, monkeypatch):
+    import json
+    pool = _use_pool(monkeypatch, mock_db_connection)
+    row = (1, 'user1', 'Test content', datetime(2023, 1, 1, 12, 0, 0), 'http://test.com', None, 'Ozempic')
+    mock_db_cursor.fetchmany.side_effect = [[row, row], [row], []]
+
+    response = client.get("/api/mentions/export?keyword=Ozempic")
+    assert response.status_code == 200
+    lines = response.text.strip().split("\n")
+    assert len(lines) == 3
+    assert json.loads(lines[0])['sentiment'] == 'neutral'
+    assert 'name' in mock_db_connection.cursor.call_args.kwargs
+    pool.putconn.assert_called_once_with(mock_db_connection)
+
+def test_export_mentions_releases_connection_when_client_leaves(mock_db_connection, mock_db_cursor, monkeypatch):
+    import asyncio
+    from fastapi import HTTPException
+    import api_service
+    pool = _use_pool(monkeypatch, mock_db_connection)
+    row = (1, 'user1', 'Test content', datetime(2023, 1, 1, 12, 0, 0), 'http://test.com', None, 'Ozempic')
+    mock_db_cursor.fetchmany.side_effect = [[row], [row], []]
+
+    # The body is never read past the first chunk; the response's background task still returns the connection
+    response = api_service.export_mentions(keyword=["All"], start=None, end=None, format="ndjson")
+    pool.putconn.assert_not_called()
+    asyncio.run(response.background())
+    pool.putconn.assert_called_once_with(mock_db_connection)
+
+    # A busy pool fails before any bytes are sent
+    pool.getconn.side_effect = api_service.PoolTimeout("busy")
+    with pytest.raises(HTTPException) as exc:
+        api_service.export_mentions(keyword=["All"], start=None, end=None, format="ndjson")
+    assert exc.value.status_code == 503
+
+def test_export_mentions_csv(client, mock_db_connection, mock_db_cursor, monkeypatch):
+    _use_pool(monkeypatch, mock_db_connection)
+    row = (1, 'user1', 'Test, content', datetime(2023, 1, 1, 12, 0, 0), 'http://test.com', 'positive', 'Ozempic')
+    mock_db_cursor.fetchmany.side_effect = [[row], []]
+
+    response = client.get("/api/mentions/export?format=csv")
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith("text/csv")
+    header, first = response.text.strip().splitlines()
+    assert header == "id,author,content,date,url,sentiment,keyword,source"
+    assert '"Test, content"' in first
+
+def _ingest_connection(merge_row, watermarks):
+    """Connection double that drains COPY sources and answers the merge and watermark queries."""
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    log, copied = [], []
+
+    def execute(query, params=None):
+        log.append((" ".join(query.split()), params))
+        if "FROM inserted" in query:
+            cursor.fetchone.return_value = merge_row
+        elif query.startswith("SELECT last_id FROM rollup_watermarks"):
+            cursor.fetchone.return_value = (watermarks[params[0]],)
+
+    def copy_expert(sql, source):
+        chunks = list(iter(lambda: source.read(64) or None, None))
+        copied.append((sql, b"".join(chunks).decode() if chunks and isinstance(chunks[0], bytes) else "".join(chunks)))
+
+    cursor.execute.side_effect = execute
+    cursor.copy_expert.side_effect = copy_expert
+    return conn, log, copied
+
+def test_ndjson_copy_source_streams_csv_rows():
+    import api_service
+    lines = [b'{"url": "http://a", "author": "x", "content": "hi, there"}\n', b'\n', b'{"url": "http://b", "keyword": "Ozempic"}\n']
+    source = api_service.NdjsonCopySource(lines)
+    text = "".join(iter(lambda: source.read(8), ""))
+    assert text.splitlines() == [',,x,http://a,"hi, there",,,,', ',,,http://b,,,,,Ozempic']
+
+    with pytest.raises(api_service.IngestError, match="line 2"):
+        api_service.NdjsonCopySource([b'{}', b'[1, 2]']).read()
+
+def test_ingest_merges_batch_and_advances_caught_up_rollups(client, monkeypatch):
+    import api_service
+    # 3 received, 1 without url, 1 new row (id 101); 'daily' is caught up, 'search_tsv' far behind
+    watermarks = {"daily": 100, "hourly": 100, "author_sketch": 100, "author_counts": 100, "search_tsv": 1}
+    conn, log, copied = _ingest_connection((3, 1, 1, 101), watermarks)
+    monkeypatch.setattr(api_service, "ROLLUP_BATCH_SIZE", 10)
+    monkeypatch.setattr(api_service, "INGEST_TOKEN", "secret")
+    _use_pool(monkeypatch, conn)
+
+    body = "url,author,received_at\nhttp://a,x,2023-01-01 12:00\nhttp://a,x,2023-01-01 12:00\n,y,\n"
+    response = client.post("/api/ingest", content=body, headers={"content-type": "text/csv", "x-ingest-token": "secret"})
+    assert response.status_code == 200
+    data = response.json()
+    assert (data['received'], data['inserted'], data['duplicates'], data['rejected']) == (3, 1, 1, 1)
+    assert data['rollups'] == {"daily": 101, "hourly": 101, "author_sketch": 101, "author_counts": 101}
+
+    assert copied[0][0] == "COPY kwatch_ingest_staging (url, author, received_at) FROM STDIN WITH (FORMAT csv)"
+    assert copied[0][1].startswith("http://a,x,")
+    assert ("UPDATE rollup_watermarks SET last_id = %s, updated_at = CURRENT_TIMESTAMP WHERE name = %s", (101, "daily")) in log
+    assert not any(params == (101, "search_tsv") for _, params in log)
+    conn.commit.assert_called_once()
+
+def test_ingest_rejects_bad_header_and_token(client, monkeypatch):
+    import api_service
+    conn, _, _ = _ingest_connection((0, 0, 0, None), {})
+    pool = _use_pool(monkeypatch, conn)
+    # No token configured: the endpoint is off rather than open
+    monkeypatch.setattr(api_service, "INGEST_TOKEN", None)
+    assert client.post("/api/ingest", content='{"url": "http://a"}').status_code == 403
+    assert not pool.getconn.called
+
+    monkeypatch.setattr(api_service, "INGEST_TOKEN", "secret")
+    response = client.post("/api/ingest?format=csv", content="link,author\nhttp://a,x\n", headers={"x-ingest-token": "secret"})
+    assert response.status_code == 400
+    assert "url" in response.json()['detail']
+    assert client.post("/api/ingest", content="{}").status_code == 401
+    ok = client.post("/api/ingest", content='{"url": "http://a"}', headers={"x-ingest-token": "secret"})
+    assert ok.status_code == 200
+    assert ok.json()['rollups'] == {}
+
+def test_lexicon_scorer_negation_and_engines_agree(monkeypatch):
+    import api_service
+    texts = ["No nausea at all, I love it", "Terrible nausea and vomiting \U0001f62d", "Started my dose today",
+             None, "don\u2019t feel great", "", "not sick. never worse. happy"]
+    expected = ["positive", "negative", "neutral", "neutral", "negative", "neutral", "positive"]
+    assert api_service.LexiconScorer().label(texts) == expected
+    monkeypatch.setattr(api_service, "np", None)
+    assert api_service.LexiconScorer().label(texts) == expected
+
+def test_backfill_sentiment_resumes_from_checkpoint(monkeypatch):
+    import api_service
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    chunks = [[(11, "love it"), (12, "awful nausea")], [(15, None)], []]
+    log, written = [], []
+
+    def execute(query, params=None):
+        log.append((" ".join(query.split()), params))
+        if "FROM rollup_watermarks WHERE name = 'sentiment_backfill'" in query:
+            cursor.fetchone.return_value = (10,)
+        elif "WHERE sentiment IS NULL" in query:
+            cursor.fetchall.return_value = chunks.pop(0)
+
+    cursor.execute.side_effect = execute
+    monkeypatch.setattr(api_service.extras, "execute_values", lambda cur, sql, rows, **kw: written.append((sql, rows)))
+
+    result = api_service.backfill_sentiment(conn, chunk_size=2)
+    assert result["labeled"] == 3 and result["checkpoint"] == 15
+    assert result["labels"] == {"positive": 1, "negative": 1, "neutral": 1}
+    assert [rows for _, rows in written] == [[(11, "positive"), (12, "negative")], [(15, "neutral")]]
+    assert "kwatch_daily_rollup" in written[0][0]
+    fetches = [params for q, params in log if "WHERE sentiment IS NULL" in q]
+    assert fetches == [(10, 2), (12, 2), (15, 2)]
+    checkpoints = [params for q, params in log if q.startswith("UPDATE rollup_watermarks")]
+    assert checkpoints == [(12,), (15,)]
+
+def test_search_mentions_ranked_with_snippets(client, mock_db_cursor):
+    response = client.get("/api/search?q=nausea&keyword=Ozempic&limit=1")
+    assert response.status_code == 200
+    data = response.json()
+    assert data['results'][0]['snippet'] == '<mark>Test</mark> content'
+    assert data['next_cursor']
+
+    response = client.get(f"/api/search?q=nausea&keyword=Ozempic&limit=1&cursor={data['next_cursor']}")
+    assert response.status_code == 200
+    query, params = mock_db_cursor.execute.call_args[0]
+    assert "content_tsv @@ websearch_to_tsquery" in query
+    assert "ORDER BY rank DESC, id DESC" in query
+    assert params[-3:] == (0.5, 1, 1)
+
+def _with_rule_and_llm_cache(mock_db_cursor, instruction):
+    """Extend the fixture cursor with saved rule(s) and an in-memory llm_translation_cache table."""
+    store = {}
+    original = mock_db_cursor.execute.side_effect
+
+    def execute(query, params=None):
+        query_str = query.strip().upper()
+        if "FROM SAVED_RULES WHERE ID" in query_str:
+            text = instruction[params[0]] if isinstance(instruction, dict) else instruction
+            mock_db_cursor.fetchone.return_value = {'instruction': text}
+        elif query_str.startswith("UPDATE SAVED_RULES"):
+            title, new_instruction, is_chaining, rule_id = params
+            mock_db_cursor.fetchone.return_value = {
+                'id': rule_id, 'title': title, 'instruction': new_instruction,
+                'is_chaining': is_chaining, 'created_at': datetime(2023, 1, 1)
+            }
+        elif query_str.startswith("UPDATE LLM_TRANSLATION_CACHE"):
+            mock_db_cursor.fetchone.return_value = (store[params[0]],) if params[0] in store else None
+        elif query_str.startswith("INSERT INTO LLM_TRANSLATION_CACHE"):
+            store[params[0]] = params[5].adapted
+        elif query_str.startswith("DELETE FROM LLM_TRANSLATION_CACHE"):
+            store.clear()
+        else:
+            original(query, params)
+
+    mock_db_cursor.execute.side_effect = execute
+    return store
+
+def test_execute_rule_reuses_cached_translation(client, mock_db_cursor, monkeypatch):
+    import api_service
+    fake = api_service.FakeOpenAIClient()
+    monkeypatch.setattr(api_service, "client", fake)
+    store = _with_rule_and_llm_cache(mock_db_cursor, r"\Read latest Ozempic posts")
+
+    body = {"rule_id": 1, "keywords": ["Wegovy", "Ozempic"]}
+    first = client.post("/api/rules/execute", json=body).json()
+    assert first['status'] == "success"
+    assert first['cached'] is False
+    assert len(store) == 1
+
+    # Same instruction, same keywords in a different order: no second LLM call
+    second = client.post("/api/rules/execute", json={"rule_id": 1, "keywords": ["Ozempic", "Wegovy"]}).json()
+    assert second['cached'] is True
+    assert second['sql'] == first['sql']
+    assert len(fake.calls) == 1
+
+def test_updating_rule_invalidates_cached_translation(client, mock_db_cursor, monkeypatch):
+    import api_service
+    fake = api_service.FakeOpenAIClient()
+    monkeypatch.setattr(api_service, "client", fake)
+    store = _with_rule_and_llm_cache(mock_db_cursor, r"\Read latest posts")
+
+    client.post("/api/rules/execute", json={"rule_id": 1})
+    assert len(store) == 1
+    client.post("/api/rules?id=1", json={"title": "t", "instruction": r"\Read latest posts"})
+    assert store == {}
+    client.post("/api/rules/execute", json={"rule_id": 1})
+    assert len(fake.calls) == 2
+
+def _wait_for_job(client, job_id, timeout=5):
+    import time
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/rules/jobs/{job_id}").json()
+        if job['status'] in ("succeeded", "failed", "cancelled", "timed_out"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError("job did not finish")
+
+def test_rule_job_runs_in_background(client, mock_db_connection, mock_db_cursor, monkeypatch):
+    import api_service
+    pool = _use_pool(monkeypatch, mock_db_connection)
+    monkeypatch.setattr(api_service, "client", api_service.FakeOpenAIClient())
+    _with_rule_and_llm_cache(mock_db_cursor, r"\Read latest posts")
+
+    submitted = client.post("/api/rules/jobs", json={"rule_id": 1})
+    assert submitted.status_code == 202
+    job = _wait_for_job(client, submitted.json()['job_id'])
+    assert job['status'] == "succeeded"
+    assert job['result']['type'] == "read"
+    # Every DB step checked out and returned its own connection
+    assert pool.getconn.call_count == pool.putconn.call_count >= 3
+
+    events = client.get(f"/api/rules/jobs/{job['job_id']}/events")
+    assert "event: result" in events.text
+    assert events.headers["x-accel-buffering"] == "no"
+
+def test_rule_job_cancel_during_llm_call(client, mock_db_connection, mock_db_cursor, monkeypatch):
+    import threading
+    import api_service
+    _use_pool(monkeypatch, mock_db_connection)
+    _with_rule_and_llm_cache(mock_db_cursor, r"\Read latest posts")
+    entered, release = threading.Event(), threading.Event()
+
+    class SlowClient(api_service.FakeOpenAIClient):
+        def create(self, *args, **kwargs):
+            entered.set()
+            release.wait(5)
+            return super().create(*args, **kwargs)
+
+    monkeypatch.setattr(api_service, "client", SlowClient())
+    job_id = client.post("/api/rules/jobs", json={"rule_id": 1}).json()['job_id']
+    assert entered.wait(5)
+    client.delete(f"/api/rules/jobs/{job_id}")
+    release.set()
+    assert _wait_for_job(client, job_id)['status'] == "cancelled"
+
+def test_rule_job_unknown_id(client):
+    assert client.get("/api/rules/jobs/nope").status_code == 404
+
+def test_rule_chain_runs_server_side(client, mock_db_connection, mock_db_cursor, monkeypatch):
+    import api_service
+    _use_pool(monkeypatch, mock_db_connection)
+    monkeypatch.setattr(api_service, "client", api_service.FakeOpenAIClient())
+    _with_rule_and_llm_cache(mock_db_cursor, {1: r"\Read latest posts", 2: r"\Process keep ids", 3: r"\Show table"})
+
+    response = client.post("/api/rules/chain", json={"rule_ids": [1, 2, 3], "limit": 10})
+    assert response.status_code == 200
+    data = response.json()
+    assert data['status'] == "success"
+    assert [step['type'] for step in data['steps']] == ["read", "process", "show"]
+    assert data['data'] == [{"id": 1}]
+    assert data['total_rows'] == 1
+
+    # Intermediate results are addressable by handle
+    read_handle = data['steps'][0]['handle']
+    stored = client.get(f"/api/results/{read_handle}?limit=1").json()
+    assert stored['data'][0]['author'] == 'user1'
+
+def test_execute_rule_with_previous_handle(client, mock_db_cursor, monkeypatch):
+    import api_service
+    handle = api_service.result_store.put({"status": "success", "data": [{"id": 7}]})
+    _with_rule_and_llm_cache(mock_db_cursor, r"\Show table")
+
+    data = client.post("/api/rules/execute", json={"rule_id": 3, "previous_handle": handle}).json()
+    assert data['data'] == [{"id": 7}]
+    assert client.post("/api/rules/execute", json={"rule_id": 3, "previous_handle": "gone"}).status_code == 410
+
+def test_execute_rule_keeps_result_only_when_chained_from(client, mock_db_cursor, monkeypatch):
+    import api_service
+    monkeypatch.setattr(api_service, "client", api_service.FakeOpenAIClient())
+    _with_rule_and_llm_cache(mock_db_cursor, r"\Read latest posts")
+    monkeypatch.setattr(api_service, "result_store", api_service.ResultStore())
+
+    data = client.post("/api/rules/execute", json={"rule_id": 1}).json()
+    assert data['status'] == "success" and "handle" not in data
+    data = client.post("/api/rules/execute", json={"rule_id": 1, "keep_result": True}).json()
+    assert api_service.result_store.get(data['handle'])['data'][0]['id'] == data['data'][0]['id']
+
+def test_result_store_evicts_by_total_bytes():
+    import api_service
+    store = api_service.ResultStore(max_bytes=250)
+    rows = {"status": "success", "data": [{"content": "x" * 80}]}
+    first, second = store.put(rows), store.put(rows)
+    assert store.get(first) and store.get(second)
+    third = store.put(rows)  # over 250 bytes: the least recently used entry goes
+    with pytest.raises(api_service.HTTPException):
+        store.get(first)
+    assert store.get(second) and store.get(third)
+    assert store.put({"data": ["x" * 300]}) is None
+
+def test_process_batches_by_token_budget_and_merges_by_id(client, mock_db_cursor, monkeypatch):
+    import api_service
+    fake = api_service.FakeOpenAIClient()
+    monkeypatch.setattr(api_service, "client", fake)
+    monkeypatch.setattr(api_service, "PROCESS_BATCH_TOKENS", 200)
+    _with_rule_and_llm_cache(mock_db_cursor, r"\Process keep everything")
+
+    rows = [{"id": i, "content": "x" * 100} for i in range(40)]
+    data = client.post("/api/rules/execute", json={"rule_id": 2, "previous_result": {"data": rows}}).json()
+    assert data['status'] == "success"
+    assert len(fake.calls) == len(data['batches']) > 1
+    # Nothing is truncated and the output follows input order
+    assert [r['id'] for r in data['data']] == list(range(40))
+
+def test_process_reports_failed_batches(client, mock_db_cursor, monkeypatch):
+    import api_service
+
+    class FlakyClient(api_service.FakeOpenAIClient):
+        def create(self, *args, messages, **kwargs):
+            if '"id": 0' in messages[-1]['content']:
+                raise RuntimeError("rate limited")
+            return super().create(*args, messages=messages, **kwargs)
+
+    monkeypatch.setattr(api_service, "client", FlakyClient())
+    monkeypatch.setattr(api_service, "PROCESS_BATCH_TOKENS", 50)
+    _with_rule_and_llm_cache(mock_db_cursor, r"\Process keep everything")
+
+    rows = [{"id": i, "content": "x" * 100} for i in range(3)]
+    data = client.post("/api/rules/execute", json={"rule_id": 2, "previous_result": {"data": rows}}).json()
+    assert data['status'] == "success"
+    assert [b['status'] for b in data['batches']] == ["failed", "ok", "ok"]
+    assert [r['id'] for r in data['data']] == [1, 2]
+    assert "1 of 3 batches failed" in data['message']
+
+def test_generated_sql_guard_rejects_non_select():
+    import api_service
+    wrapped = api_service.guard_generated_sql("SELECT id FROM kwatch_alert_results;", 10)
+    assert wrapped.endswith("AS rule_query LIMIT 11")
+    for bad in ["DELETE FROM saved_rules", "SELECT 1; DROP TABLE saved_rules", "COMMIT; SELECT 1", ""]:
+        with pytest.raises(api_service.SqlGuardError):
+            api_service.guard_generated_sql(bad, 10)
+
+def test_generated_sql_runs_read_only_and_truncates(client, mock_db_cursor, monkeypatch):
+    import api_service
+    monkeypatch.setattr(api_service, "client", api_service.FakeOpenAIClient())
+    _with_rule_and_llm_cache(mock_db_cursor, r"\Read latest posts")
+
+    data = client.post("/api/rules/execute", json={"rule_id": 1}).json()
+    assert data['status'] == "success"
+    assert len(data['data']) == 1
+    assert data['truncated'] is False
+
+    monkeypatch.setattr(api_service, "RULE_SQL_MAX_ROWS", 0)
+    data = client.post("/api/rules/execute", json={"rule_id": 1}).json()
+    assert data['data'] == []
+    assert data['truncated'] is True
+    executed = [c.args[0] for c in mock_db_cursor.execute.call_args_list]
+    assert "SET TRANSACTION READ ONLY" in executed
+    assert any(q.startswith("EXPLAIN (FORMAT JSON)") and q.endswith("LIMIT 1") for q in executed)
+
+def test_generated_sql_rejected_over_cost_budget(client, mock_db_cursor, monkeypatch):
+    import api_service
+    monkeypatch.setattr(api_service, "client", api_service.FakeOpenAIClient())
+    monkeypatch.setattr(api_service, "RULE_SQL_MAX_COST", 1.0)
+    _with_rule_and_llm_cache(mock_db_cursor, r"\Read latest posts")
+
+    data = client.post("/api/rules/execute", json={"rule_id": 1}).json()
+    assert data['status'] == "error"
+    assert "exceeds the budget" in data['message']
+    executed = [c.args[0] for c in mock_db_cursor.execute.call_args_list]
+    assert not any(q.startswith("SELECT * FROM (") for q in executed)
+
+def test_generated_sql_rejected_over_plan_rows_limit(client, mock_db_cursor, monkeypatch):
+    import api_service
+    monkeypatch.setattr(api_service, "client", api_service.FakeOpenAIClient())
+    monkeypatch.setattr(api_service, "RULE_SQL_MAX_PLAN_ROWS", 1000)
+    _with_rule_and_llm_cache(mock_db_cursor, r"\Read latest posts")
+    # Cheap by cost, but the scan under the LIMIT expects far more rows than allowed
+    plan = [{"Plan": {"Node Type": "Limit", "Total Cost": 10.0, "Plan Rows": 5001, "Plans": [
+        {"Node Type": "Seq Scan", "Total Cost": 9.0, "Plan Rows": 2000000}]}}]
+    execute = mock_db_cursor.execute.side_effect
+
+    def execute_with_plan(query, params=None):
+        result = execute(query, params) if execute else None
+        if query.startswith("EXPLAIN (FORMAT JSON)"):
+            mock_db_cursor.fetchone.return_value = (plan,)
+        return result
+    mock_db_cursor.execute.side_effect = execute_with_plan
+
+    data = client.post("/api/rules/execute", json={"rule_id": 1}).json()
+    assert data['status'] == "error"
+    assert "exceeds the limit of 1,000" in data['message']
+    executed = [c.args[0] for c in mock_db_cursor.execute.call_args_list]
+    assert not any(q.startswith("SELECT * FROM (") for q in executed)
+
+def _migration_connection(applied_versions):
+    """Connection double that records statements and serves schema_migrations from a set."""
+    conn = MagicMock()
+    conn.autocommit = False
+    log = []
+    cursor = conn.cursor.return_value.__enter__.return_value
+
+    def execute(query, params=None):
+        log.append((" ".join(query.split()), params, conn.autocommit))
+        if query.startswith("INSERT INTO schema_migrations"):
+            applied_versions.add(params[0])
+        elif query.startswith("SELECT version FROM schema_migrations"):
+            cursor.fetchall.return_value = [(v,) for v in applied_versions]
+        elif "FROM pg_index" in query:
+            cursor.fetchone.return_value = (False,)  # interrupted earlier build
+
+    cursor.execute.side_effect = execute
+    return conn, log
+
+def test_migrations_apply_once_and_build_indexes_concurrently():
+    import api_service
+    versions = set()
+    conn, log = _migration_connection(versions)
+    applied = api_service.run_migrations(conn)
+    assert applied == [v for v, _, _ in api_service.MIGRATIONS]
+    assert versions == set(applied)
+
+    concurrent = [(q, autocommit) for q, _, autocommit in log if "CONCURRENTLY" in q]
+    assert concurrent and all(autocommit for _, autocommit in concurrent)
+    assert any(q.startswith("DROP INDEX CONCURRENTLY idx_kwatch_alert_results_keyword_received_id") for q, _ in concurrent)
+    # The lock is waited for outside a transaction, so a waiting instance holds no snapshot
+    locks = [(q, autocommit) for q, _, autocommit in log if q.startswith("SELECT pg_advisory")]
+    assert locks == [("SELECT pg_advisory_lock(%s)", True), ("SELECT pg_advisory_unlock(%s)", True)]
+    assert conn.autocommit is False
+    assert log[-1][0] == "SELECT pg_advisory_unlock(%s)"
+
+    conn, log = _migration_connection(versions)
+    assert api_service.run_migrations(conn) == []
+    assert not any("CREATE INDEX" in q for q, _, _ in log)
+
+def test_explain_hot_paths_flags_sequential_scans():
+    import api_service
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchone.side_effect = [("Ozempic",)] + [
+        ([{"Plan": {"Node Type": "Limit", "Total Cost": 5.0, "Plan Rows": 50, "Plans": [
+            {"Node Type": "Index Scan", "Index Name": "idx_kwatch_alert_results_keyword_received_id"}]}}],),
+        ([{"Plan": {"Node Type": "Aggregate", "Total Cost": 900.0, "Plan Rows": 1, "Plans": [
+            {"Node Type": "Seq Scan", "Relation Name": "kwatch_alert_results"}]}}],),
+    ] * 10
+    report = api_service.explain_hot_paths(conn)
+    assert len(report) == len(api_service.hot_path_queries("Ozempic"))
+    assert report[0]["indexes"] == ["idx_kwatch_alert_results_keyword_received_id"]
+    assert report[1]["seq_scans"] == ["kwatch_alert_results"]
+    assert cursor.execute.call_args_list[2].args[1] == (("Ozempic",),)
+
+def test_metrics_endpoint_reports_routes_and_phases(client):
+    client.get("/api/mentions/1")
+    client.get("/api/stats/sentiment")
+    text = client.get("/api/metrics").text
+    assert 'kwatch_http_requests_total{method="GET",route="/api/mentions/{mention_id}",status="200"} 1' in text
+    assert 'kwatch_http_request_duration_seconds_count{method="GET",route="/api/stats/sentiment"} 1' in text
+    assert 'kwatch_request_phase_seconds_count{phase="serialize",route="/api/stats/sentiment"} 1' in text
+    assert "# TYPE kwatch_http_request_duration_seconds histogram" in text
+
+def test_timed_cursor_records_rows_and_slow_queries(monkeypatch):
+    import api_service
+    api_service.metrics.clear()
+    api_service.slow_queries.clear()
+    monkeypatch.setattr(api_service, "SLOW_QUERY_MS", 0.0001)
+
+    class FakeCursor:
+        name = None
+        description = [("id",)]
+        rowcount = 3
+        def execute(self, query, vars=None):
+            pass
+
+    cur = api_service.timed_cursor_class(FakeCursor)()
+    cur.execute("SELECT id  FROM kwatch_alert_results\n WHERE keyword = 'Ozempic' AND id > 10 AND author = %s", ("bob",))
+    fp = api_service.query_fingerprint("SELECT id FROM kwatch_alert_results WHERE keyword = ? AND id > ? AND author = %s")
+    assert api_service.slow_queries[-1]["query"] == fp
+    assert api_service.slow_queries[-1]["params"] == "('bob',)"
+    text = api_service.metrics.render()
+    assert f'kwatch_db_rows_total{{query="{fp}"}} 3' in text
+    assert f'kwatch_db_query_duration_seconds_count{{query="{fp}"}} 1' in text
+
+def test_fast_json_encodes_rows_like_the_default_path(client):
+    import api_service
+    from decimal import Decimal
+    from datetime import date
+    data = client.get("/api/mentions?keyword=Ozempic").json()
+    assert data['mentions'][0]['date'] == "2023-01-01T12:00:00"
+    assert client.get("/api/stats/counts-by-day").json() == [{"date": "2023-01-01", "count": 10, "sentiment": None, "keyword": None}]
+
+    encoded = api_service.dumps_json({"n": Decimal("2"), "x": Decimal("1.5"), "d": date(2023, 1, 2), "t": datetime(2023, 1, 2, 3, 4, 5)})
+    assert json.loads(encoded) == {"n": 2, "x": 1.5, "d": "2023-01-02", "t": "2023-01-02T03:04:05"}
+
+def test_ensure_db_pool_backs_off_after_failure(monkeypatch):
+    import api_service
+    monkeypatch.setattr(api_service, "db_pool", None)
+    monkeypatch.setattr(api_service, "db_state", api_service.DatabaseState())
+    attempts = []
+
+    def create():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise api_service.psycopg2.OperationalError("connection refused")
+        return "pool"
+
+    monkeypatch.setattr(api_service, "create_db_pool", create)
+    assert api_service.ensure_db_pool() is None
+    assert "connection refused" in api_service.db_state.error
+    # Still inside the backoff window: no new attempt, requests get a 503
+    assert api_service.ensure_db_pool() is None
+    with pytest.raises(api_service.HTTPException) as exc:
+        next(api_service.get_db_connection())
+    assert exc.value.status_code == 503
+    assert len(attempts) == 1
+
+    api_service.db_state.next_attempt = 0
+    assert api_service.ensure_db_pool() == "pool"
+    assert api_service.db_state.error is None
+
+def test_startup_does_not_block_on_database(monkeypatch):
+    import threading
+    import time
+    import api_service
+    from fastapi.testclient import TestClient
+    monkeypatch.setattr(api_service, "db_pool", None)
+    monkeypatch.setattr(api_service, "db_state", api_service.DatabaseState())
+
+    def unreachable():
+        time.sleep(0.2)
+        raise api_service.psycopg2.OperationalError("timeout expired")
+
+    monkeypatch.setattr(api_service, "create_db_pool", unreachable)
+    started = time.monotonic()
+    with TestClient(api_service.app) as c:
+        assert time.monotonic() - started < 0.2
+        assert c.get("/api/health").status_code == 200
+        ready = c.get("/api/ready")
+        assert ready.status_code == 503
+        assert ready.json()['db']['ready'] is False
+        assert ready.json()['llm']['ready'] is True
+    assert api_service.db_state.stop.is_set()
+    # Shutdown waits for the startup thread instead of leaking it past this test's monkeypatches
+    assert not any(t.name == "db-startup" for t in threading.enumerate())
+
+def test_ready_once_database_answers_and_migrations_ran(monkeypatch):
+    import api_service
+    pool = _use_pool(monkeypatch, _fake_connection())
+    monkeypatch.setattr(api_service, "db_state", api_service.DatabaseState())
+    from fastapi.testclient import TestClient
+    c = TestClient(api_service.app)
+
+    api_service.db_state.migrations = "running"
+    assert c.get("/api/ready").status_code == 503
+    api_service.db_state.migrations = "done"
+    data = c.get("/api/ready").json()
+    assert data['ready'] is True and data['db']['migrations'] == "done"
+    assert pool.getconn.call_count == pool.putconn.call_count == 2
+
+def _feed_row(mention_id, keyword):
+    return (mention_id, 'user1', 'Test content', datetime(2023, 1, 1, 12, 0, 0), 'http://test.com', None, keyword)
+
+def test_mention_feed_fans_out_by_keyword_and_overflows(monkeypatch):
+    import asyncio
+    import api_service
+    monkeypatch.setattr(api_service, "FEED_QUEUE_SIZE", 2)
+    feed = api_service.MentionFeed()
+    monkeypatch.setattr(feed, "_run", lambda: None)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        ozempic = api_service.FeedSubscriber(loop, ["Ozempic"], 0)
+        everything = api_service.FeedSubscriber(loop, ["All"], 0)
+        feed.subscribe(ozempic, 0)
+        feed.subscribe(everything, 0)
+        feed.dispatch([_feed_row(1, 'Ozempic'), _feed_row(2, 'Wegovy')])
+        await asyncio.sleep(0)
+        assert [r[0] for r in ozempic.buffer] == [1]
+        assert [r[0] for r in everything.buffer] == [1, 2] and not everything.overflowed
+
+        # A third buffered row exceeds FEED_QUEUE_SIZE: the backlog is dropped for a table catch-up
+        feed.dispatch([_feed_row(3, 'Wegovy')])
+        await asyncio.sleep(0)
+        assert everything.overflowed and not everything.buffer
+        assert [r[0] for r in ozempic.buffer] == [1]
+        feed.unsubscribe(ozempic)
+        feed.unsubscribe(everything)
+        assert feed.stats()['subscribers'] == 0
+
+    asyncio.run(scenario())
+
+def test_mention_feed_streams_rows_that_commit_late(monkeypatch):
+    import api_service
+    feed = api_service.MentionFeed()
+    feed.last_id = 0
+    dispatched = []
+    monkeypatch.setattr(feed, "dispatch", dispatched.append)
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    # id 2 is still uncommitted while 1 and 3 are visible; it commits before the next notification
+    cursor.fetchall.side_effect = [
+        [_feed_row(1, 'Ozempic'), _feed_row(3, 'Ozempic')],
+        [_feed_row(2, 'Ozempic')], [_feed_row(4, 'Ozempic')],
+    ]
+
+    feed._catch_up(conn)
+    assert feed.last_id == 3 and list(feed.gaps) == [2]
+    feed._catch_up(conn)
+    assert [[r[0] for r in rows] for rows in dispatched] == [[1, 3], [2], [4]]
+    assert cursor.execute.call_args_list[1][0][1] == ([2],)
+    assert not feed.gaps
+
+    # Subscribers send the late row once, without moving the resume point back
+    sub = api_service.FeedSubscriber(None, ["All"], 0)
+    assert sub.remember(3) and not sub.remember(3) and sub.remember(2)
+    event = api_service.feed_event(_feed_row(2, 'Ozempic'), resume=False)
+    assert event.startswith("event: mention\n") and "id: " not in event
+
+def test_mention_stream_resumes_from_last_event_id(monkeypatch):
+    import asyncio
+    from types import SimpleNamespace
+    import api_service
+    feed = api_service.MentionFeed()
+    monkeypatch.setattr(feed, "_run", lambda: None)
+    monkeypatch.setattr(api_service, "mention_feed", feed)
+    monkeypatch.setattr(api_service, "FEED_HEARTBEAT", 0.01)
+    monkeypatch.setattr(api_service, "FEED_REPLAY_LIMIT", 2)
+    table = [_feed_row(i, 'Ozempic') for i in range(1, 8)]
+    reads = []
+
+    def read_feed(after_id, keywords, limit):
+        reads.append((after_id, keywords, limit))
+        if after_id is None:
+            return table[-1][0]
+        return [r for r in table if r[0] > after_id][:limit]
+
+    monkeypatch.setattr(api_service, "_read_feed", read_feed)
+
+    def collect(last_event_id):
+        # Called directly: TestClient buffers the whole body and the stream never ends
+        async def read():
+            request = SimpleNamespace(headers={"last-event-id": last_event_id})
+            response = await api_service.stream_mentions(request, keyword=["Ozempic"], after_id=None)
+            assert response.media_type == "text/event-stream"
+            lines = []
+            try:
+                async for chunk in response.body_iterator:
+                    if chunk == ": keepalive\n\n":
+                        return lines
+                    lines += chunk.splitlines()
+            finally:
+                await response.body_iterator.aclose()
+        return asyncio.run(read())
+
+    # Two rows behind: replayed in id order, then the stream idles on keepalives
+    lines = collect("5")
+    assert [l for l in lines if l.startswith("id: ")] == ["id: 6", "id: 7"]
+    assert "event: mention" in lines and "event: reset" not in lines
+    assert reads[1] == (5, ["Ozempic"], 3)
+    assert feed.stats()['subscribers'] == 0
+
+    # Further behind than FEED_REPLAY_LIMIT: replay stops and the client is told to reload
+    lines = collect("1")
+    assert not [l for l in lines if l.startswith("id: ")]
+    assert "event: reset" in lines and 'data: {"last_id":7}' in lines
+
+def test_conditional_get_answers_304_without_endpoint_sql(client, mock_db_cursor):
+    import api_service
+    first = client.get("/api/mentions?keyword=Wegovy&keyword=Ozempic&limit=10")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"') and first.headers["last-modified"] == "Sun, 01 Jan 2023 12:00:00 GMT"
+    assert first.headers["cache-control"].startswith("public, max-age=")
+
+    # Keyword order and repeats don't change the representation
+    mock_db_cursor.execute.reset_mock()
+    again = client.get("/api/mentions?limit=10&keyword=Ozempic&keyword=Wegovy&keyword=Ozempic",
+                       headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["etag"] == etag
+    assert mock_db_cursor.execute.call_count == 0  # watermark still fresh, endpoint never ran
+
+    assert client.get("/api/mentions?keyword=Ozempic&limit=10", headers={"If-None-Match": etag}).status_code == 200
+    assert client.get("/api/stats/sentiment", headers={"If-None-Match": etag}).headers["etag"] != etag
+
+    # New data moves the watermark and with it every ETag
+    api_service.analytics_cache.clear()
+    mock_db_cursor.execute.side_effect = None
+    mock_db_cursor.fetchone.return_value = (2, datetime(2023, 1, 1, 12, 5, 0), 2)
+    mock_db_cursor.fetchall.return_value = []
+    assert client.get("/api/keywords").status_code == 200
+    changed = client.get("/api/mentions?keyword=Ozempic&keyword=Wegovy&limit=10", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+
+def test_rules_etag_follows_saved_rules_version(client, mock_db_cursor):
+    mock_db_cursor.execute.side_effect = None
+    mock_db_cursor.fetchone.return_value = (3, datetime(2023, 1, 2))
+    mock_db_cursor.fetchall.return_value = []
+    etag = client.get("/api/rules").headers["etag"]
+    assert client.get("/api/rules", headers={"If-None-Match": f'"x", {etag}'}).status_code == 304
+
+    mock_db_cursor.fetchone.return_value = (4, datetime(2023, 1, 3))
+    response = client.get("/api/rules", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["cache-control"] == "no-cache"
+    assert response.headers["etag"] != etag
+
+def test_reads_follow_replica_health(monkeypatch):
+    import api_service
+    primary = _fake_connection()
+    _use_pool(monkeypatch, primary)
+    replica = _fake_connection()
+    replica_pool = MagicMock()
+    replica_pool.getconn.return_value = replica
+    monkeypatch.setattr(api_service, "replica_pool", replica_pool)
+    monkeypatch.setattr(api_service, "replica_state", api_service.ReplicaState())
+    monkeypatch.setattr(api_service, "DB_REPLICA_MAX_LAG", 10.0)
+    api_service.metrics.clear()
+    lag = replica.cursor.return_value.__enter__.return_value
+
+    def routed():
+        with api_service.read_connection() as conn:
+            return conn
+
+    assert routed() is primary  # until the first lag check succeeds
+    lag.fetchone.return_value = (0.4,)
+    assert api_service.check_replica() is True
+    assert routed() is replica
+    replica_pool.putconn.assert_called_with(replica)
+
+    lag.fetchone.return_value = (42.0,)
+    assert api_service.check_replica() is False
+    assert "42.0s behind" in api_service.replica_state.error
+    assert routed() is primary
+
+    # Down between checks: this read and the following ones use the primary
+    lag.fetchone.return_value = (0.0,)
+    api_service.check_replica()
+    replica_pool.getconn.side_effect = api_service.psycopg2.OperationalError("server closed the connection")
+    assert routed() is primary and api_service.replica_state.healthy is False
+
+    rendered = api_service.metrics.render([])
+    assert 'kwatch_db_reads_total{pool="replica"} 1' in rendered
+    assert 'kwatch_db_reads_total{pool="primary"} 3' in rendered
+
+def test_rule_sql_runs_on_read_connection(client, mock_db_connection, mock_db_cursor, monkeypatch):
+    import api_service
+    monkeypatch.setattr(api_service, "client", api_service.FakeOpenAIClient())
+    _with_rule_and_llm_cache(mock_db_cursor, r"\Read latest posts")
+    read_conn = MagicMock()
+    read_conn.cursor.return_value.__enter__.return_value = mock_db_cursor
+    checkouts = []
+
+    @contextlib.contextmanager
+    def connect(conn):
+        checkouts.append(conn)
+        yield conn
+
+    api_service.app.dependency_overrides[api_service.get_connector] = lambda: lambda: connect(mock_db_connection)
+    api_service.app.dependency_overrides[api_service.get_read_connector] = lambda: lambda: connect(read_conn)
+
+    assert client.post("/api/rules/execute", json={"rule_id": 1}).json()['status'] == "success"
+    # saved_rules and the translation cache stay on the primary; the generated SQL streams from the replica
+    assert any("name" in c.kwargs for c in read_conn.cursor.call_args_list)
+    assert not any("name" in c.kwargs for c in mock_db_connection.cursor.call_args_list)
+    # One short checkout per step: rule lookup, translation cache read and write, then the SQL
+    assert checkouts[-1] is read_conn and mock_db_connection in checkouts[:-1]
+
+def test_data_validators_release_their_connection_before_the_endpoint(client, mock_db_connection, mock_db_cursor, monkeypatch):
+    import api_service
+    del api_service.app.dependency_overrides[api_service.get_read_connector]
+    pool = _use_pool(monkeypatch, mock_db_connection)
+    returned_before_query = []
+    validate = mock_db_cursor.execute.side_effect
+
+    def execute(query, params=None):
+        if "GROUP BY sentiment" in query:
+            returned_before_query.append(pool.putconn.call_count)
+        return validate(query, params)
+
+    mock_db_cursor.execute.side_effect = execute
+    assert client.get("/api/stats/sentiment").status_code == 200
+    assert pool.getconn.call_count == 1 and returned_before_query == [1]
+
+    # A fresh watermark needs no connection at all
+    assert client.get("/api/stats/sentiment?keyword=Ozempic").status_code == 200
+    assert pool.getconn.call_count == 1